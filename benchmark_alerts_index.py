@@ -0,0 +1,137 @@
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmark_latency import import_bot_in_directory
+
+
+# Measures the crossing check of the bot (sorted prices of each pair, see "add_alert_to_cache" and "process_price_tick") against a brute-force scan
+# of every alert of the pair at each tick, as the bot did before, on the same random walk. Both must trigger the same alerts.
+# The memory used per alert by both layouts is reported as well (list of [alert ID, price] lists, against two arrays of doubles and integers).
+#
+# Usage:   python benchmark_alerts_index.py                      (runs every number of alerts of BENCHMARK_ALERTS_NUMBERS)
+#          python benchmark_alerts_index.py --alerts 100000 --ticks 500
+
+
+BENCHMARK_ALERTS_NUMBERS = [10, 1_000, 100_000]
+BRUTE_FORCE_CHECKED_ALERTS_PER_RUN = 20_000_000  # The number of ticks is chosen so that the brute-force scan stays under a few seconds
+MIN_TICKS_NUMBER = 200
+MAX_TICKS_NUMBER = 100_000
+
+PAIR_BASE_CURRENCY = "BTC"
+PAIR_QUOTE_CURRENCY = "USDT"
+START_PRICE = 100_000.0
+ALERTS_HALF_BAND = 5_000.0
+PRICE_STEP_STANDARD_DEVIATION = 5.0
+
+
+def get_random_walk(ticks_number: int) -> list:
+    ticks_prices = [START_PRICE]
+    for _ in range(ticks_number - 1):
+        ticks_prices.append(ticks_prices[-1] + random.gauss(0, PRICE_STEP_STANDARD_DEVIATION))
+    return ticks_prices
+
+
+def get_list_of_lists_bytes_per_alert(alerts_prices: list) -> float:
+    # Every alert is a list holding an int and a float object, all of them allocated separately
+    tracemalloc.start()
+    remaining_alerts = [[alert_id, float(alert_price)] for alert_id, alert_price in enumerate(alerts_prices, start=1)]
+    allocated_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del remaining_alerts
+    return allocated_bytes / len(alerts_prices)
+
+
+def get_sorted_index_bytes_per_alert(crypto_alerts_bot) -> float:
+    # The arrays of the pair, as grown by the bot (including the room kept for the next alerts)
+    sorted_alert_prices, sorted_alert_ids, _ = crypto_alerts_bot.active_alerts_cache[f"{PAIR_BASE_CURRENCY}{PAIR_QUOTE_CURRENCY}"]
+    return (sys.getsizeof(sorted_alert_prices) + sys.getsizeof(sorted_alert_ids)) / len(sorted_alert_prices)
+
+
+def run_brute_force(alerts_prices: list, ticks_prices: list) -> tuple:
+    remaining_alerts = [[alert_id, alert_price] for alert_id, alert_price in enumerate(alerts_prices, start=1)]
+    triggered_alert_ids = set()
+
+    start_time = time.perf_counter()
+    previous_price = ticks_prices[0]
+    for current_price in ticks_prices[1:]:
+        for alert in remaining_alerts[:]:
+            alert_id, alert_price = alert
+            if previous_price >= alert_price >= current_price or previous_price <= alert_price <= current_price:
+                triggered_alert_ids.add(alert_id)
+                remaining_alerts.remove(alert)
+        previous_price = current_price
+
+    return time.perf_counter() - start_time, triggered_alert_ids
+
+
+def run_sorted_index(crypto_alerts_bot, alerts_prices: list, ticks_prices: list) -> tuple:
+    for state in (crypto_alerts_bot.active_alerts_cache, crypto_alerts_bot.alerts_infos_by_id, crypto_alerts_bot.pairs_metadata, crypto_alerts_bot.last_known_prices,
+                  crypto_alerts_bot.pairs_subscribers, crypto_alerts_bot.users_alert_ids):
+        state.clear()
+
+    for alert_id, alert_price in enumerate(alerts_prices, start=1):
+        crypto_alerts_bot.register_alert(alert_id, crypto_alerts_bot.MY_USER_ID, PAIR_BASE_CURRENCY, PAIR_QUOTE_CURRENCY, alert_price)
+
+    pair_name = f"{PAIR_BASE_CURRENCY}{PAIR_QUOTE_CURRENCY}"
+    sorted_index_bytes_per_alert = get_sorted_index_bytes_per_alert(crypto_alerts_bot)  # Before the triggered alerts are removed
+    triggered_alert_ids = set()
+
+    start_time = time.perf_counter()
+    for current_price in ticks_prices:
+        triggered_alerts = crypto_alerts_bot.process_price_tick(pair_name, current_price)
+        if triggered_alerts:
+            triggered_alert_ids.update(triggered_alert[crypto_alerts_bot.TRIGGERED_ALERT_ID_INDEX] for triggered_alert in triggered_alerts)
+
+    return time.perf_counter() - start_time, triggered_alert_ids, sorted_index_bytes_per_alert
+
+
+def run_benchmark(crypto_alerts_bot, alerts_number: int, ticks_number: int) -> dict:
+    alerts_prices = sorted(round(random.uniform(START_PRICE - ALERTS_HALF_BAND, START_PRICE + ALERTS_HALF_BAND), 2) for _ in range(alerts_number))
+    ticks_prices = get_random_walk(ticks_number)
+
+    brute_force_seconds, brute_force_alert_ids = run_brute_force(alerts_prices, ticks_prices)
+    sorted_index_seconds, sorted_index_alert_ids, sorted_index_bytes_per_alert = run_sorted_index(crypto_alerts_bot, alerts_prices, ticks_prices)
+
+    if sorted_index_alert_ids != brute_force_alert_ids:
+        raise RuntimeError(f"The sorted index and the brute-force scan triggered different alerts ({alerts_number} alerts)")
+
+    return {
+        "alerts": alerts_number,
+        "ticks": ticks_number,
+        "triggered": len(sorted_index_alert_ids),
+        "brute_force_us": brute_force_seconds / (ticks_number - 1) * 1e6,
+        "sorted_index_us": sorted_index_seconds / ticks_number * 1e6,
+        "list_of_lists_bytes": get_list_of_lists_bytes_per_alert(alerts_prices),
+        "sorted_index_bytes": sorted_index_bytes_per_alert,
+    }
+
+
+def print_results(all_results: list):
+    print(f"{'alerts':>8} {'ticks':>7} {'triggered':>10} {'brute force us/tick':>20} {'sorted index us/tick':>21} {'speedup':>8} "
+          f"{'lists B/alert':>14} {'arrays B/alert':>15}")
+    for results in all_results:
+        print(f"{results['alerts']:>8} {results['ticks']:>7} {results['triggered']:>10} {results['brute_force_us']:>20.2f} {results['sorted_index_us']:>21.2f} "
+              f"{results['brute_force_us'] / results['sorted_index_us']:>7.1f}x {results['list_of_lists_bytes']:>14.1f} {results['sorted_index_bytes']:>15.1f}")
+
+
+if __name__ == "__main__":
+    arguments_parser = argparse.ArgumentParser()
+    arguments_parser.add_argument("--alerts", type=int, help="Number of alerts on the benchmarked pair")
+    arguments_parser.add_argument("--ticks", type=int, help="Number of ticks of the random walk (chosen from the number of alerts by default)")
+    arguments = arguments_parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as benchmark_directory:
+        crypto_alerts_bot = import_bot_in_directory(benchmark_directory)
+
+        all_results = []
+        for alerts_number in [arguments.alerts] if arguments.alerts else BENCHMARK_ALERTS_NUMBERS:
+            ticks_number = arguments.ticks or min(MAX_TICKS_NUMBER, max(MIN_TICKS_NUMBER, BRUTE_FORCE_CHECKED_ALERTS_PER_RUN // alerts_number))
+            all_results.append(run_benchmark(crypto_alerts_bot, alerts_number, ticks_number))
+
+        print_results(all_results)
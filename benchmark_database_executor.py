@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import sqlite3
+import tempfile
+import time
+
+from benchmark_latency import EVENT_LOOP_PROBE_SECONDS, import_bot_in_directory
+
+
+# Measures how many triggered alerts per second the event loop can delete from the database, before and after the database executor:
+# * before: each triggered alert is deleted and committed on the event loop, in the default journal mode of SQLite (as the bot did before)
+# * after: the deletions are grouped by "schedule_alerts_deletion" and committed at once by "database_executor", in WAL mode
+# The event loop lag shows how long the reading of the prices would have been blocked meanwhile.
+#
+# Usage:   python benchmark_database_executor.py
+#          python benchmark_database_executor.py --triggers 5000 --burst 10
+
+
+DEFAULT_TRIGGERS_NUMBER = 2_000
+DEFAULT_TRIGGERS_PER_BURST = 20  # Alerts triggered by the same tick, the event loop running other tasks between two bursts
+BEFORE_EXECUTOR_DATABASE_FILENAME = "before_executor.db"
+
+
+def insert_benchmark_alerts(crypto_alerts_bot, triggers_number: int) -> list:
+    crypto_alerts_bot.database_cursor.executemany(crypto_alerts_bot.INSERT_ALERT_QUERY, [("BTC", "USDT", float(alert_index), "", crypto_alerts_bot.MY_USER_ID,
+                                                                                          crypto_alerts_bot.PRICE_ALERT_TYPE, None, None) for alert_index in range(triggers_number)])
+    crypto_alerts_bot.database_connection.commit()
+    return [alert_id for alert_id, in crypto_alerts_bot.database_cursor.execute(f"SELECT {crypto_alerts_bot.ALERT_ID_DATABASE_FIELD} FROM {crypto_alerts_bot.DATABASE_NAME}")]
+
+
+def count_remaining_alerts(database_connection: sqlite3.Connection, crypto_alerts_bot) -> int:
+    return database_connection.execute(f"SELECT COUNT(*) FROM {crypto_alerts_bot.DATABASE_NAME}").fetchone()[0]
+
+
+async def measure_triggers(delete_triggered_alerts, alert_ids: list, triggers_per_burst: int, wait_for_deletions=None) -> tuple:
+    event_loop_lags = []
+
+    async def event_loop_probe():
+        while True:
+            probe_start_time = time.perf_counter()
+            await asyncio.sleep(EVENT_LOOP_PROBE_SECONDS)
+            event_loop_lags.append(time.perf_counter() - probe_start_time - EVENT_LOOP_PROBE_SECONDS)
+
+    probe_task = asyncio.create_task(event_loop_probe())
+    await asyncio.sleep(0)
+
+    start_time = time.perf_counter()
+    for burst_start in range(0, len(alert_ids), triggers_per_burst):
+        await delete_triggered_alerts(alert_ids[burst_start:burst_start + triggers_per_burst])
+        await asyncio.sleep(0)  # The next tick
+
+    if wait_for_deletions is not None:
+        await wait_for_deletions()
+
+    probe_task.cancel()
+    return time.perf_counter() - start_time, max(event_loop_lags, default=0.0)
+
+
+async def run_benchmark(crypto_alerts_bot, triggers_number: int, triggers_per_burst: int) -> list:
+    alert_ids = insert_benchmark_alerts(crypto_alerts_bot, triggers_number)
+
+    # Before: same alerts, in a copy of the database using the default journal mode, deleted on the event loop
+    before_connection = sqlite3.connect(BEFORE_EXECUTOR_DATABASE_FILENAME)
+    crypto_alerts_bot.database_connection.backup(before_connection)
+    before_connection.execute("PRAGMA journal_mode=DELETE")
+    before_connection.execute("PRAGMA synchronous=FULL")
+
+    async def delete_on_event_loop(triggered_alert_ids: list):
+        for alert_id in triggered_alert_ids:
+            before_connection.execute(crypto_alerts_bot.DELETE_ALERT_QUERY, (alert_id,))
+            before_connection.commit()
+
+    before_seconds, before_lag = await measure_triggers(delete_on_event_loop, alert_ids, triggers_per_burst)
+    before_remaining_alerts = count_remaining_alerts(before_connection, crypto_alerts_bot)
+    before_connection.close()
+
+    # After: the deletions are handed over to the database executor, and the measure ends once they are all committed
+    async def delete_in_database_thread(triggered_alert_ids: list):
+        crypto_alerts_bot.schedule_alerts_deletion(triggered_alert_ids)
+
+    after_seconds, after_lag = await measure_triggers(delete_in_database_thread, alert_ids, triggers_per_burst, crypto_alerts_bot.wait_for_alerts_group_commit)
+    after_remaining_alerts = await crypto_alerts_bot.run_in_database_thread(count_remaining_alerts, crypto_alerts_bot.database_connection, crypto_alerts_bot)
+
+    if before_remaining_alerts or after_remaining_alerts:
+        raise RuntimeError(f"Alerts were not deleted ({before_remaining_alerts} before, {after_remaining_alerts} after)")
+
+    return [("commit per alert on the event loop", triggers_number / before_seconds, before_lag),
+            ("group commit in database_executor", triggers_number / after_seconds, after_lag)]
+
+
+def print_results(triggers_number: int, triggers_per_burst: int, all_results: list):
+    print(f"{triggers_number} triggered alerts, {triggers_per_burst} per tick")
+    print(f"{'':36} {'triggers/s':>11} {'lag max ms':>11}")
+    for method_name, triggers_per_second, event_loop_lag in all_results:
+        print(f"{method_name:36} {triggers_per_second:>11,.0f} {event_loop_lag * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    arguments_parser = argparse.ArgumentParser()
+    arguments_parser.add_argument("--triggers", type=int, default=DEFAULT_TRIGGERS_NUMBER, help="Number of triggered alerts to delete")
+    arguments_parser.add_argument("--burst", type=int, default=DEFAULT_TRIGGERS_PER_BURST, help="Number of alerts triggered by each tick")
+    arguments = arguments_parser.parse_args()
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as benchmark_directory:
+        crypto_alerts_bot = import_bot_in_directory(benchmark_directory)
+        print_results(arguments.triggers, arguments.burst, asyncio.run(run_benchmark(crypto_alerts_bot, arguments.triggers, arguments.burst)))
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmark_latency import import_bot_in_directory
+
+
+# Measures every installed decoder of the Binance messages (see FRAME_DECODERS) over the same corpus, read from a recording made with
+# FRAMES_RECORDING_FILENAME. Without a recording, a corpus of bookTicker messages is generated and recorded first. A decoder which does
+# not return the same pair names, prices and update IDs as the json one is reported instead of measured (e.g. "raw" expects the compact
+# JSON sent by Binance).
+#
+# Usage:   python benchmark_decoders.py                              (generated corpus of DEFAULT_FRAMES_NUMBER messages)
+#          python benchmark_decoders.py --recording recording.bin     (messages recorded from Binance)
+#          python benchmark_decoders.py --frames 1000000 --repeat 5
+
+
+DEFAULT_FRAMES_NUMBER = 200_000
+DEFAULT_REPEATS_NUMBER = 3  # The best run of each decoder is kept
+GENERATED_RECORDING_FILENAME = "generated_recording.bin"
+GENERATED_SYMBOLS = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "BNBUSDT", "XRPUSDT", "DOGEUSDT", "PEPEUSDT", "ADAUSDT"]
+CONTROL_ANSWERS_INTERVAL = 1_000  # Answers to the control messages are mixed with the prices, as on the real combined streams
+
+
+def write_generated_recording(crypto_alerts_bot, frames_number: int):
+    crypto_alerts_bot.FRAMES_RECORDING_FILENAME = GENERATED_RECORDING_FILENAME
+    received_at = time.time()
+
+    for frame_index in range(frames_number):
+        if frame_index % CONTROL_ANSWERS_INTERVAL == 0:
+            websocket_message = json.dumps({"result": None, "id": frame_index})
+        else:
+            symbol = random.choice(GENERATED_SYMBOLS)
+            bid_price = random.uniform(0.00001, 100_000)
+            websocket_message = json.dumps({"stream": f"{symbol.lower()}@bookTicker",
+                                            "data": {"u": random.randint(1, 10 ** 11), "s": symbol, "b": f"{bid_price:.8f}", "B": f"{random.uniform(0, 100):.8f}",
+                                                     "a": f"{bid_price * 1.0001:.8f}", "A": f"{random.uniform(0, 100):.8f}"}}, separators=(",", ":"))
+        crypto_alerts_bot.record_frame(websocket_message, received_at + frame_index / 1000)
+
+    crypto_alerts_bot.flush_frames_recording()
+    crypto_alerts_bot.disk_io_executor.submit(int).result()  # The recording is written in order by a single thread, so it is complete after this no-op
+
+
+def run_benchmark(crypto_alerts_bot, recording_filename: str, repeats_number: int) -> tuple:
+    websocket_messages = [websocket_message for _, websocket_message in crypto_alerts_bot.read_frames_recording(recording_filename)]
+    expected_frames = [crypto_alerts_bot.decode_frame_with_json(websocket_message) for websocket_message in websocket_messages]
+
+    all_results = []
+    for decoder_name, decode_frame in crypto_alerts_bot.FRAME_DECODERS.items():
+        if [decode_frame(websocket_message) for websocket_message in websocket_messages] != expected_frames:
+            all_results.append((decoder_name, None, decode_frame is crypto_alerts_bot.decode_binance_frame))
+            continue
+
+        best_seconds = float("inf")
+        for _ in range(repeats_number):
+            start_time = time.perf_counter()
+            for websocket_message in websocket_messages:
+                decode_frame(websocket_message)
+            best_seconds = min(best_seconds, time.perf_counter() - start_time)
+
+        all_results.append((decoder_name, len(websocket_messages) / best_seconds, decode_frame is crypto_alerts_bot.decode_binance_frame))
+
+    return len(websocket_messages), all_results
+
+
+def print_results(frames_number: int, all_results: list):
+    print(f"{frames_number} messages")
+    print(f"{'decoder':>8} {'frames/s':>12} {'speedup':>8}")
+    json_frames_per_second = next(frames_per_second for decoder_name, frames_per_second, _ in all_results if decoder_name == "json")
+    for decoder_name, frames_per_second, is_default_decoder in all_results:
+        if frames_per_second is None:
+            print(f"{decoder_name:>8}   decodes the messages differently than json")
+            continue
+        print(f"{decoder_name:>8} {frames_per_second:>12,.0f} {frames_per_second / json_frames_per_second:>7.2f}x{'  (used by default)' if is_default_decoder else ''}")
+
+
+if __name__ == "__main__":
+    arguments_parser = argparse.ArgumentParser()
+    arguments_parser.add_argument("--recording", help="Recording made with FRAMES_RECORDING_FILENAME (a corpus is generated otherwise)")
+    arguments_parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES_NUMBER, help="Number of messages of the generated corpus")
+    arguments_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEATS_NUMBER, help="Number of runs of each decoder")
+    arguments = arguments_parser.parse_args()
+
+    recording_filename = os.path.abspath(arguments.recording) if arguments.recording else GENERATED_RECORDING_FILENAME  # Before the working directory changes
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as benchmark_directory:
+        crypto_alerts_bot = import_bot_in_directory(benchmark_directory)
+        if not arguments.recording:
+            write_generated_recording(crypto_alerts_bot, arguments.frames)
+
+        print_results(*run_benchmark(crypto_alerts_bot, recording_filename, arguments.repeat))
@@ -0,0 +1,381 @@
+import asyncio
+import bisect
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import argparse
+
+import websockets
+from aiohttp import web
+
+
+# Runs the real "main()" of the bot against a local fake Binance (combined streams WebSocket) and a local fake Telegram Bot API,
+# so that the tick-to-notification latency can be measured entirely offline, e.g. to track regressions between releases.
+#
+# Usage:   python benchmark_latency.py                     (runs every scenario of BENCHMARK_SCENARIOS)
+#          python benchmark_latency.py --pairs 10 --alerts 1000 --rate 5000 --duration 10
+#          python benchmark_latency.py --feed-workers 4           (sharded mode, see FEED_WORKERS_NUMBER)
+#          python benchmark_latency.py --conflation 0.05          (see TICK_CONFLATION_SECONDS)
+#          python benchmark_latency.py --redundancy --drop-every 2  (see WEBSOCKET_REDUNDANCY, a connection is dropped every 2 seconds)
+#          python benchmark_latency.py --uvloop                   (see UVLOOP_ENABLED, the default asyncio event loop is used otherwise)
+
+
+FAKE_BINANCE_PORT = 18765
+FAKE_TELEGRAM_PORT = 18766
+FAKE_BOT_TOKEN = "123456789:BenchmarkBenchmarkBenchmarkBenchmark"
+FAKE_USER_ID = 1
+FAKE_LOG_CHANNEL_ID = -1001
+FAKE_EXCHANGE_INFO_FILENAME = "exchange_info.json"  # Stand-in for the exchangeInfo of Binance, listing the pairs of the scenario
+FAKE_TICK_SIZE = "0.00010000"  # The emitted prices have 4 decimals
+
+BENCHMARK_SCENARIOS = [  # (pairs, total alerts)
+    (1, 10),
+    (1, 1_000),
+    (1, 100_000),
+    (10, 1_000),
+    (100, 10_000),
+    (1_000, 100_000),
+]
+DEFAULT_TICKS_PER_SECOND = 5_000
+DEFAULT_DURATION_SECONDS = 10
+
+EMISSION_STEP_SECONDS = 0.01
+START_PRICE = 10_000.0
+PRICE_STEP_STANDARD_DEVIATION = 0.1
+MIN_ALERTS_HALF_BAND = 10.0
+ALERTS_PER_PRICE_UNIT = 100  # Density of the alerts around the start price
+
+EVENT_LOOP_PROBE_SECONDS = 0.01
+
+ALERT_LINE_REGEX = re.compile(r"^(\w+) : (\S+) (\w+) \(")
+
+
+def get_pair_names(pairs_number: int) -> list:
+    # Alphabetic base currencies, so that they look like real ones to the bot
+    pair_names = []
+    for pair_index in range(pairs_number):
+        base_currency = "".join(chr(ord("A") + (pair_index // 26 ** power) % 26) for power in range(3))
+        pair_names.append((base_currency, "USDT"))
+    return pair_names
+
+
+def write_fake_exchange_info(exchange_info_filename: str, pairs_number: int):
+    fake_symbols = [
+        {"symbol": f"{base_currency}{quote_currency}", "status": "TRADING", "baseAsset": base_currency, "quoteAsset": quote_currency,
+         "filters": [{"filterType": "PRICE_FILTER", "tickSize": FAKE_TICK_SIZE}]}
+        for base_currency, quote_currency in get_pair_names(pairs_number)
+    ]
+    with open(exchange_info_filename, "w") as exchange_info_file:
+        json.dump({"symbols": fake_symbols}, exchange_info_file)
+
+
+def import_bot_in_directory(bot_directory: str):
+    # For the micro-benchmarks, which run the bot functions in their own process: the bot reads its configuration from the environment
+    # when it is imported, and its database is opened in the working directory
+    os.environ.update(BOT_TOKEN=FAKE_BOT_TOKEN, MY_USER_ID=str(FAKE_USER_ID), LOG_CHANNEL_ID=str(FAKE_LOG_CHANNEL_ID), PRICES_SNAPSHOT_FILENAME="")
+    os.chdir(bot_directory)
+
+    import crypto_alerts_bot
+    crypto_alerts_bot.open_alerts_database(crypto_alerts_bot.ALERTS_DATABASE_FILENAME)
+    crypto_alerts_bot.websocket_subscriptions_event = asyncio.Event()  # Set when alerts are registered
+    return crypto_alerts_bot
+
+
+def get_alerts_prices(alerts_per_pair: int) -> list:
+    alerts_half_band = max(MIN_ALERTS_HALF_BAND, alerts_per_pair / ALERTS_PER_PRICE_UNIT / 2)
+    return sorted(round(random.uniform(START_PRICE - alerts_half_band, START_PRICE + alerts_half_band), 4) for _ in range(alerts_per_pair))
+
+
+def percentile(sorted_values: list, percentile_rank: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile_rank))]
+
+
+async def run_scenario(pairs_number: int, alerts_number: int, ticks_per_second: int, duration_seconds: float, drop_seconds_interval: float) -> dict:
+    import crypto_alerts_bot  # Imported here, because the bot reads its configuration from the environment when it is imported
+
+    # Our own rate limiter would otherwise dominate the measure, and alerts would be held back to be grouped
+    crypto_alerts_bot.TELEGRAM_GLOBAL_MESSAGES_PER_SECOND = crypto_alerts_bot.TELEGRAM_PRIVATE_CHAT_MESSAGES_PER_SECOND = crypto_alerts_bot.TELEGRAM_GROUP_CHAT_MESSAGES_PER_SECOND = 1e9
+    crypto_alerts_bot.TELEGRAM_CHAT_BURST_MESSAGES = 1e9
+    crypto_alerts_bot.NOTIFICATION_COALESCING_SECONDS = 0
+
+    pair_names = get_pair_names(pairs_number)
+    alerts_per_pair = max(1, alerts_number // pairs_number)
+
+    pending_alerts_prices = {}  # Mirror of the alerts of the bot, to know which tick crossed which alert
+    for base_currency, quote_currency in pair_names:
+        alerts_prices = get_alerts_prices(alerts_per_pair)
+        pending_alerts_prices[f"{base_currency}{quote_currency}"] = alerts_prices
+        crypto_alerts_bot.database_cursor.executemany(crypto_alerts_bot.INSERT_ALERT_QUERY, [(base_currency, quote_currency, alert_price, "", crypto_alerts_bot.MY_USER_ID, crypto_alerts_bot.PRICE_ALERT_TYPE, None, None) for alert_price in alerts_prices])
+    crypto_alerts_bot.database_connection.commit()
+
+    crossing_ticks_times = {}  # (base currency, formatted alert price) -> time at which the crossing tick was sent
+    notification_latencies = []
+    processed_ticks = [0]
+    lost_ticks = [0]
+    event_loop_lags = []
+    emitted_prices = {}
+    emitted_update_ids = {}
+
+    # With redundant connections, the ticks received twice are only processed once, so the sent ticks are counted instead of the decoded ones
+    is_sent_ticks_counted = crypto_alerts_bot.FEED_WORKERS_NUMBER or crypto_alerts_bot.IS_WEBSOCKET_REDUNDANCY_ENABLED
+
+    # ---------------- Fake Binance ---------------- #
+    fake_binance_connections = {}  # WebSocket -> streams it subscribed to, the oldest connection first
+    followed_streams = set()  # The market keeps moving while a connection is down
+
+    async def emit_ticks():  # Every tick of a stream is sent to all the connections subscribed to it, as Binance does
+        next_emission_time = time.perf_counter()
+        while True:
+            next_emission_time += EMISSION_STEP_SECONDS
+            await asyncio.sleep(max(next_emission_time - time.perf_counter(), 0))
+
+            streams = list(followed_streams)
+            if not streams:
+                continue
+
+            ticks_number = max(1, int(ticks_per_second * EMISSION_STEP_SECONDS * len(streams) / pairs_number))
+            for _ in range(ticks_number):
+                pair_name = random.choice(streams).split("@")[0].upper()
+
+                previous_price = emitted_prices.get(pair_name)
+                current_price = (previous_price or START_PRICE) + random.gauss(0, PRICE_STEP_STANDARD_DEVIATION)
+                emitted_prices[pair_name] = current_price
+
+                if previous_price is not None:
+                    alerts_prices = pending_alerts_prices[pair_name]
+                    start_index = bisect.bisect_left(alerts_prices, min(previous_price, current_price))
+                    end_index = bisect.bisect_right(alerts_prices, max(previous_price, current_price))
+                    emission_time = time.perf_counter()
+                    for alert_price in alerts_prices[start_index:end_index]:
+                        crossing_ticks_times[(pair_name[:-4], crypto_alerts_bot.format_pair_price(pair_name, alert_price))] = emission_time
+                    del alerts_prices[start_index:end_index]
+
+                emitted_update_ids[pair_name] = emitted_update_ids.get(pair_name, 0) + 1
+                stream_name = f"{pair_name.lower()}@bookTicker"
+                tick_message = json.dumps({"stream": stream_name, "data": {"u": emitted_update_ids[pair_name], "s": pair_name, "a": f"{current_price:.4f}"}})
+
+                is_tick_sent = False
+                for websocket, subscribed_streams in list(fake_binance_connections.items()):
+                    if stream_name in subscribed_streams:
+                        try:
+                            await websocket.send(tick_message)
+                            is_tick_sent = True
+                        except websockets.ConnectionClosed:
+                            fake_binance_connections.pop(websocket, None)
+
+                if not is_tick_sent:  # Received by none of the connections of the bot
+                    lost_ticks[0] += 1
+                elif is_sent_ticks_counted:
+                    processed_ticks[0] += 1
+
+    async def drop_connections(drop_seconds_interval: float):  # Simulates network failures, the oldest connection being dropped first
+        while True:
+            await asyncio.sleep(drop_seconds_interval)
+            if fake_binance_connections:
+                dropped_websocket = next(iter(fake_binance_connections))
+                fake_binance_connections.pop(dropped_websocket)
+                dropped_websocket.transport.abort()  # No closing handshake, as when the network fails
+
+    async def fake_binance_handler(websocket):
+        subscribed_streams = fake_binance_connections[websocket] = set()
+        if emission_task is None:
+            start_emission()
+        try:
+            async for control_message in websocket:
+                control_message = json.loads(control_message)
+                if control_message["method"] == "SUBSCRIBE":
+                    subscribed_streams.update(control_message["params"])
+                    followed_streams.update(control_message["params"])
+                else:
+                    subscribed_streams.difference_update(control_message["params"])
+                await websocket.send(json.dumps({"result": None, "id": control_message["id"]}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            fake_binance_connections.pop(websocket, None)
+
+    emission_task = None
+
+    def start_emission():
+        nonlocal emission_task
+        emission_task = asyncio.create_task(emit_ticks())
+
+    # ---------------- Fake Telegram ---------------- #
+    fake_message_ids = [0]
+
+    def get_fake_message(chat_id, text: str) -> dict:
+        fake_message_ids[0] += 1
+        return {"message_id": fake_message_ids[0], "date": int(time.time()), "chat": {"id": int(chat_id), "type": "private"}, "text": text,
+                "from": {"id": 1, "is_bot": True, "first_name": "Benchmark"}}
+
+    async def fake_telegram_handler(request):
+        received_at = time.perf_counter()
+        method_name = request.match_info["method_name"].lower()
+        parameters = await request.post()
+
+        if method_name == "getupdates":
+            await asyncio.sleep(1)
+            result = []
+        elif method_name == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        elif method_name == "getchat":
+            result = {"id": int(parameters["chat_id"]), "type": "private"}
+        elif method_name in ("sendmessage", "editmessagetext"):
+            for message_line in parameters.get("text", "").splitlines():
+                alert_line_match = ALERT_LINE_REGEX.match(message_line)
+                if alert_line_match and (alert_line_match[1], alert_line_match[2]) in crossing_ticks_times:
+                    notification_latencies.append(received_at - crossing_ticks_times.pop((alert_line_match[1], alert_line_match[2])))
+            result = get_fake_message(parameters["chat_id"], parameters.get("text", ""))
+        else:
+            result = True
+
+        return web.json_response({"ok": True, "result": result})
+
+    fake_telegram_application = web.Application(client_max_size=1 << 30)
+    fake_telegram_application.router.add_post("/bot{token}/{method_name}", fake_telegram_handler)
+    fake_telegram_runner = web.AppRunner(fake_telegram_application)
+    await fake_telegram_runner.setup()
+    await web.TCPSite(fake_telegram_runner, "127.0.0.1", FAKE_TELEGRAM_PORT).start()
+
+    fake_binance_server = await websockets.serve(fake_binance_handler, "127.0.0.1", FAKE_BINANCE_PORT)
+
+    # ---------------- Measures ---------------- #
+    original_decode_binance_frame = crypto_alerts_bot.decode_binance_frame
+
+    def counted_decode_binance_frame(websocket_message):  # Every received tick is decoded, even when the ticks are conflated
+        processed_ticks[0] += 1
+        return original_decode_binance_frame(websocket_message)
+
+    if not is_sent_ticks_counted:
+        crypto_alerts_bot.decode_binance_frame = counted_decode_binance_frame
+
+    async def event_loop_probe():
+        while True:
+            sleep_start = time.perf_counter()
+            await asyncio.sleep(EVENT_LOOP_PROBE_SECONDS)
+            event_loop_lags.append(time.perf_counter() - sleep_start - EVENT_LOOP_PROBE_SECONDS)
+
+    bot_task = asyncio.create_task(crypto_alerts_bot.main())
+    probe_task = asyncio.create_task(event_loop_probe())
+
+    while len(crypto_alerts_bot.feed_workers_statuses) < crypto_alerts_bot.FEED_WORKERS_NUMBER:  # Feed worker processes take a while to start
+        await asyncio.sleep(0.1)
+
+    await asyncio.sleep(1)  # Startup and subscriptions are not measured
+    if drop_seconds_interval > 0:
+        drop_task = asyncio.create_task(drop_connections(drop_seconds_interval))
+    processed_ticks[0] = 0
+    lost_ticks[0] = 0
+    event_loop_lags.clear()
+    measure_start = time.perf_counter()
+    cpu_measure_start = time.process_time()
+
+    await asyncio.sleep(duration_seconds)
+
+    measure_duration = time.perf_counter() - measure_start
+    cpu_usage = (time.process_time() - cpu_measure_start) / measure_duration  # Includes the fake servers, which cost the same in every mode
+    sustained_ticks_per_second = processed_ticks[0] / measure_duration
+
+    probe_task.cancel()
+    if drop_seconds_interval > 0:
+        drop_task.cancel()
+    emission_task.cancel()
+    bot_task.cancel()
+    await crypto_alerts_bot.bot.session.close()
+    fake_binance_server.close()
+    await fake_telegram_runner.cleanup()
+
+    notification_latencies.sort()
+    event_loop_lags.sort()
+
+    return {
+        "pairs": pairs_number,
+        "alerts": alerts_per_pair * pairs_number,
+        "ticks_per_second": sustained_ticks_per_second,
+        "cpu_percent": cpu_usage * 100,
+        "lost_ticks": lost_ticks[0],
+        "notifications": len(notification_latencies),
+        "latency_p50_ms": percentile(notification_latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(notification_latencies, 0.99) * 1000,
+        "latency_p999_ms": percentile(notification_latencies, 0.999) * 1000,
+        "loop_lag_p50_ms": percentile(event_loop_lags, 0.5) * 1000,
+        "loop_lag_p99_ms": percentile(event_loop_lags, 0.99) * 1000,
+        "loop_lag_max_ms": (event_loop_lags[-1] if event_loop_lags else float("nan")) * 1000,
+    }
+
+
+def run_scenario_in_subprocess(pairs_number: int, alerts_number: int, ticks_per_second: int, duration_seconds: float, feed_workers_number: int, tick_conflation_seconds: float,
+                               is_redundancy_enabled: bool, drop_seconds_interval: float, is_uvloop_enabled: bool) -> dict:
+    # Each scenario runs in its own process and its own temporary directory (the bot uses module-level state and a database in the working directory)
+    with tempfile.TemporaryDirectory() as scenario_directory:
+        write_fake_exchange_info(os.path.join(scenario_directory, FAKE_EXCHANGE_INFO_FILENAME), pairs_number)
+
+        scenario_environment = dict(os.environ,
+                                    BOT_TOKEN=FAKE_BOT_TOKEN,
+                                    MY_USER_ID=str(FAKE_USER_ID),
+                                    LOG_CHANNEL_ID=str(FAKE_LOG_CHANNEL_ID),
+                                    BINANCE_STREAMS_WEBSOCKET_URL=f"ws://127.0.0.1:{FAKE_BINANCE_PORT}",
+                                    BINANCE_EXCHANGE_INFO_URL=FAKE_EXCHANGE_INFO_FILENAME,
+                                    TELEGRAM_API_SERVER_URL=f"http://127.0.0.1:{FAKE_TELEGRAM_PORT}",
+                                    FEED_WORKERS_NUMBER=str(feed_workers_number),
+                                    TICK_CONFLATION_SECONDS=str(tick_conflation_seconds),
+                                    WEBSOCKET_REDUNDANCY="1" if is_redundancy_enabled else "0",
+                                    UVLOOP_ENABLED="1" if is_uvloop_enabled else "0",
+                                    PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+
+        scenario_process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--scenario-run",
+             "--pairs", str(pairs_number), "--alerts", str(alerts_number), "--rate", str(ticks_per_second), "--duration", str(duration_seconds),
+             "--drop-every", str(drop_seconds_interval)],
+            cwd=scenario_directory, env=scenario_environment, capture_output=True, text=True
+        )
+
+    if scenario_process.returncode != 0:
+        raise RuntimeError(f"Scenario ({pairs_number} pairs, {alerts_number} alerts) failed:\n{scenario_process.stderr}")
+
+    return json.loads(scenario_process.stdout.strip().splitlines()[-1])
+
+
+def print_results(all_results: list):
+    print(f"{'pairs':>6} {'alerts':>8} {'ticks/s':>9} {'cpu %':>6} {'lost':>6} {'notifs':>7} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'lag p50':>8} {'lag p99':>8} {'lag max':>8}")
+    for results in all_results:
+        print(f"{results['pairs']:>6} {results['alerts']:>8} {results['ticks_per_second']:>9.0f} {results['cpu_percent']:>6.1f} {results['lost_ticks']:>6} {results['notifications']:>7} "
+              f"{results['latency_p50_ms']:>8.2f} {results['latency_p99_ms']:>8.2f} {results['latency_p999_ms']:>8.2f} "
+              f"{results['loop_lag_p50_ms']:>8.2f} {results['loop_lag_p99_ms']:>8.2f} {results['loop_lag_max_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    arguments_parser = argparse.ArgumentParser()
+    arguments_parser.add_argument("--pairs", type=int)
+    arguments_parser.add_argument("--alerts", type=int, help="Total number of alerts, spread over the pairs")
+    arguments_parser.add_argument("--rate", type=int, default=DEFAULT_TICKS_PER_SECOND, help="Ticks per second sent by the fake Binance")
+    arguments_parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_SECONDS)
+    arguments_parser.add_argument("--feed-workers", type=int, default=0, help="Number of feed worker processes (0 for the single-process mode)")
+    arguments_parser.add_argument("--conflation", type=float, default=-1, help="TICK_CONFLATION_SECONDS of the bot (negative disables the conflation)")
+    arguments_parser.add_argument("--redundancy", action="store_true", help="Two connections per shard (WEBSOCKET_REDUNDANCY)")
+    arguments_parser.add_argument("--drop-every", type=float, default=0, help="The fake Binance drops a connection every this number of seconds (0 never drops them)")
+    arguments_parser.add_argument("--uvloop", action="store_true", help="Runs the bot with uvloop (UVLOOP_ENABLED), which must be installed")
+    arguments_parser.add_argument("--scenario-run", action="store_true", help=argparse.SUPPRESS)  # Used internally to run a single scenario in a subprocess
+    arguments = arguments_parser.parse_args()
+
+    if arguments.scenario_run:
+        import crypto_alerts_bot  # The environment of the scenario is already set
+        crypto_alerts_bot.open_alerts_database(crypto_alerts_bot.ALERTS_DATABASE_FILENAME)
+        random.seed(0)
+        print(json.dumps(crypto_alerts_bot.run_event_loop(run_scenario(arguments.pairs, arguments.alerts, arguments.rate, arguments.duration, arguments.drop_every))))
+        sys.exit()
+
+    if arguments.pairs and arguments.alerts:
+        scenarios = [(arguments.pairs, arguments.alerts)]
+    else:
+        scenarios = BENCHMARK_SCENARIOS
+
+    print_results([run_scenario_in_subprocess(pairs_number, alerts_number, arguments.rate, arguments.duration, arguments.feed_workers, arguments.conflation,
+                                              arguments.redundancy, arguments.drop_every, arguments.uvloop) for pairs_number, alerts_number in scenarios])
@@ -0,0 +1,147 @@
+import argparse
+import random
+import tempfile
+import time
+
+from benchmark_latency import import_bot_in_directory
+
+
+# Measures the crossing check of a pair whose alerts are rolling-window alerts (move, rise, drop, breakout) or trailing stops, against the same
+# number of price alerts, on the same random walk at a given tick rate. The time is simulated, so the hours of the windows are replayed in seconds.
+# Each alert mix is run tick by tick ("process_price_tick") and with the ticks conflated by windows ("process_price_window", which replays the extremes).
+# The conflated runs can trigger a few different rolling alerts, because every tick of a conflation window takes the time of its last tick.
+#
+# Usage:   python benchmark_rolling_alerts.py
+#          python benchmark_rolling_alerts.py --alerts 10000 --rate 500 --duration 7200 --conflation 0.2
+
+
+DEFAULT_ALERTS_NUMBER = 1_000
+DEFAULT_TICKS_PER_SECOND = 100
+DEFAULT_DURATION_SECONDS = 3_600  # Simulated, so that the longest windows fill up
+DEFAULT_CONFLATION_SECONDS = 0.1
+
+PAIR_BASE_CURRENCY = "BTC"
+PAIR_QUOTE_CURRENCY = "USDT"
+START_PRICE = 100_000.0
+PRICE_STEP_RELATIVE_DEVIATION = 0.0002
+ALERTS_HALF_BAND = 0.05  # Price alerts within 5% of the start price
+MIN_ALERT_PERCENT = 1.0
+MAX_ALERT_PERCENT = 20.0
+ALERTS_WINDOWS_SECONDS = [60, 900, 3_600, 14_400, 86_400]
+
+ALERTS_MIXES = {
+    "price": ["price"],
+    "rolling": ["move", "rise", "drop", "breakout"],
+    "trail": ["trail"],
+    "all": ["price", "move", "rise", "drop", "breakout", "trail"],
+}
+
+
+def get_random_walk(ticks_number: int) -> list:
+    ticks_prices = [START_PRICE]
+    for _ in range(ticks_number - 1):
+        ticks_prices.append(ticks_prices[-1] * (1 + random.gauss(0, PRICE_STEP_RELATIVE_DEVIATION)))
+    return ticks_prices
+
+
+def get_random_alerts(alerts_types: list, alerts_number: int) -> list:
+    # (type, price, percentage, window) of each alert, as parsed by "parse_alert_condition"
+    random_alerts = []
+    for _ in range(alerts_number):
+        alert_type = random.choice(alerts_types)
+        if alert_type == "price":
+            random_alerts.append((alert_type, round(START_PRICE * random.uniform(1 - ALERTS_HALF_BAND, 1 + ALERTS_HALF_BAND), 2), None, None))
+        elif alert_type == "breakout":
+            random_alerts.append((alert_type, 0.0, None, random.choice(ALERTS_WINDOWS_SECONDS)))
+        elif alert_type == "trail":
+            random_alerts.append((alert_type, 0.0, round(random.uniform(MIN_ALERT_PERCENT, MAX_ALERT_PERCENT), 2), None))
+        else:
+            random_alerts.append((alert_type, 0.0, round(random.uniform(MIN_ALERT_PERCENT, MAX_ALERT_PERCENT), 2), random.choice(ALERTS_WINDOWS_SECONDS)))
+
+    return random_alerts
+
+
+def register_random_alerts(crypto_alerts_bot, random_alerts: list):
+    for state in (crypto_alerts_bot.active_alerts_cache, crypto_alerts_bot.alerts_infos_by_id, crypto_alerts_bot.pairs_rolling_alerts, crypto_alerts_bot.pairs_metadata,
+                  crypto_alerts_bot.last_known_prices, crypto_alerts_bot.pairs_subscribers, crypto_alerts_bot.users_alert_ids, crypto_alerts_bot.raised_trailing_stops_pairs):
+        state.clear()
+
+    for alert_id, (alert_type, alert_price, alert_percent, window_seconds) in enumerate(sorted(random_alerts, key=lambda random_alert: random_alert[1]), start=1):
+        crypto_alerts_bot.register_alert(alert_id, crypto_alerts_bot.MY_USER_ID, PAIR_BASE_CURRENCY, PAIR_QUOTE_CURRENCY, alert_price, alert_type, alert_percent, window_seconds)
+
+
+def run_tick_by_tick(crypto_alerts_bot, ticks_prices: list, ticks_per_second: int) -> tuple:
+    pair_name = f"{PAIR_BASE_CURRENCY}{PAIR_QUOTE_CURRENCY}"
+    triggered_alerts_number = 0
+
+    start_time = time.perf_counter()
+    for tick_index, current_price in enumerate(ticks_prices):
+        triggered_alerts = crypto_alerts_bot.process_price_tick(pair_name, current_price, tick_index / ticks_per_second)
+        if triggered_alerts:
+            triggered_alerts_number += len(triggered_alerts)
+
+    return time.perf_counter() - start_time, triggered_alerts_number
+
+
+def run_conflated(crypto_alerts_bot, ticks_prices: list, ticks_per_second: int, conflation_seconds: float) -> tuple:
+    pair_name = f"{PAIR_BASE_CURRENCY}{PAIR_QUOTE_CURRENCY}"
+    ticks_per_window = max(1, round(conflation_seconds * ticks_per_second))
+    triggered_alerts_number = 0
+    processing_seconds = 0.0
+
+    for window_start in range(0, len(ticks_prices), ticks_per_window):
+        # The ticks of the window are conflated as they arrive (which is part of the measure), then checked at once
+        start_time = time.perf_counter()
+        for current_price in ticks_prices[window_start:window_start + ticks_per_window]:
+            crypto_alerts_bot.conflate_price_tick(pair_name, current_price)
+
+        window_price_ticks = crypto_alerts_bot.conflated_price_ticks
+        crypto_alerts_bot.conflated_price_ticks = {}
+        window_end_time = (min(window_start + ticks_per_window, len(ticks_prices)) - 1) / ticks_per_second  # Time of the last tick of the window
+        triggered_alerts = crypto_alerts_bot.process_conflated_price_ticks(window_price_ticks, window_end_time)
+        processing_seconds += time.perf_counter() - start_time
+
+        triggered_alerts_number += len(triggered_alerts)
+
+    return processing_seconds, triggered_alerts_number
+
+
+def run_benchmark(crypto_alerts_bot, alerts_number: int, ticks_per_second: int, duration_seconds: int, conflation_seconds: float) -> list:
+    ticks_prices = get_random_walk(ticks_per_second * duration_seconds)
+    all_results = []
+
+    for mix_name, alerts_types in ALERTS_MIXES.items():
+        random_alerts = get_random_alerts(alerts_types, alerts_number)
+
+        register_random_alerts(crypto_alerts_bot, random_alerts)
+        tick_by_tick_seconds, tick_by_tick_triggered = run_tick_by_tick(crypto_alerts_bot, ticks_prices, ticks_per_second)
+        all_results.append((mix_name, "tick by tick", tick_by_tick_triggered, tick_by_tick_seconds / len(ticks_prices)))
+
+        register_random_alerts(crypto_alerts_bot, random_alerts)
+        conflated_seconds, conflated_triggered = run_conflated(crypto_alerts_bot, ticks_prices, ticks_per_second, conflation_seconds)
+        all_results.append((mix_name, f"conflated {conflation_seconds:g}s", conflated_triggered, conflated_seconds / len(ticks_prices)))
+
+    return all_results
+
+
+def print_results(alerts_number: int, ticks_per_second: int, duration_seconds: int, all_results: list):
+    print(f"{alerts_number} alerts, {ticks_per_second} ticks/s for {duration_seconds} simulated seconds ({ticks_per_second * duration_seconds} ticks)")
+    print(f"{'alerts':>8} {'mode':>16} {'triggered':>10} {'us/tick':>9} {'max ticks/s':>12} {'CPU at rate':>12}")
+    for mix_name, mode_name, triggered_alerts_number, seconds_per_tick in all_results:
+        print(f"{mix_name:>8} {mode_name:>16} {triggered_alerts_number:>10} {seconds_per_tick * 1e6:>9.2f} {1 / seconds_per_tick:>12,.0f} "
+              f"{seconds_per_tick * ticks_per_second * 100:>11.2f}%")
+
+
+if __name__ == "__main__":
+    arguments_parser = argparse.ArgumentParser()
+    arguments_parser.add_argument("--alerts", type=int, default=DEFAULT_ALERTS_NUMBER, help="Number of alerts on the benchmarked pair")
+    arguments_parser.add_argument("--rate", type=int, default=DEFAULT_TICKS_PER_SECOND, help="Ticks per second of the pair")
+    arguments_parser.add_argument("--duration", type=int, default=DEFAULT_DURATION_SECONDS, help="Simulated duration, in seconds")
+    arguments_parser.add_argument("--conflation", type=float, default=DEFAULT_CONFLATION_SECONDS, help="Duration of the conflation windows, in seconds")
+    arguments = arguments_parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as benchmark_directory:
+        crypto_alerts_bot = import_bot_in_directory(benchmark_directory)
+        print_results(arguments.alerts, arguments.rate, arguments.duration,
+                      run_benchmark(crypto_alerts_bot, arguments.alerts, arguments.rate, arguments.duration, arguments.conflation))
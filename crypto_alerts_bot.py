@@ -1,16 +1,53 @@
 import asyncio
+import bisect
+import concurrent.futures
 import logging
 import sqlite3
 import os
+import sys
 import json
 import traceback
 import datetime
+import time
+import struct
+import mmap
+import argparse
+import multiprocessing
+import queue
+import random
+import threading
+import signal
+import math
+import csv
+import tempfile
+from array import array
+from collections import deque
 import websockets
 import dotenv
+import aiohttp
+
+try:
+    import orjson  # Optional, faster decoding of the Binance messages
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec  # Optional, even faster decoding of the Binance messages
+except ImportError:
+    msgspec = None
+
+try:
+    import uvloop  # Optional, faster event loop
+except ImportError:
+    uvloop = None
 
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
 from aiogram.filters import Command
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, BufferedInputFile
 
 
 dotenv.load_dotenv()
@@ -20,51 +57,256 @@ dotenv.load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 MY_USER_ID = int(os.getenv("MY_USER_ID"))
 LOG_CHANNEL_ID = int(os.getenv("LOG_CHANNEL_ID"))
+ALLOWED_USER_IDS = {MY_USER_ID} | {int(user_id) for user_id in os.getenv("ALLOWED_USER_IDS", "").split(",") if user_id.strip()}  # Traders allowed to use the bot, besides the owner
+TELEGRAM_API_SERVER_URL = os.getenv("TELEGRAM_API_SERVER_URL", "")  # Can be set to point the bot at a local Bot API server (e.g. the fake one of the benchmarks)
+IS_UVLOOP_ENABLED = os.getenv("UVLOOP_ENABLED", "1") == "1"  # uvloop is used when installed, "0" keeps the default asyncio event loop (e.g. to compare them)
 # ------------------------------------------------------------------------------------- #*
 
-BINANCE_STREAMS_WEBSOCKET_URL = "wss://stream.binance.com:9443/stream?streams="
+BINANCE_STREAMS_WEBSOCKET_URL = os.getenv("BINANCE_STREAMS_WEBSOCKET_URL", "wss://stream.binance.com:9443/stream")  # Can be overridden to point the bot at a local fake server
 BINANCE_BOOKTICKER_STREAM_NAME = "@bookTicker"
+BINANCE_SUBSCRIBE_METHOD = "SUBSCRIBE"
+BINANCE_UNSUBSCRIBE_METHOD = "UNSUBSCRIBE"
+MAX_STREAMS_PER_WEBSOCKET_CONNECTION = 1024  # Binance limit for a single connection
+MAX_STREAMS_PER_CONTROL_MESSAGE = 200
+CONTROL_MESSAGES_SECONDS_DELAY = 0.25  # Binance accepts at most 5 incoming messages per second on each connection
 PING_SECONDS_DELAY = 20
 PONG_SECONDS_TIMEOUT = 10
 
+IS_WEBSOCKET_REDUNDANCY_ENABLED = os.getenv("WEBSOCKET_REDUNDANCY", "0") == "1"  # Two connections per shard, whose ticks are deduplicated with their update ID, so that losing one of them costs no tick
+BINANCE_STANDBY_STREAMS_WEBSOCKET_URL = os.getenv("BINANCE_STANDBY_STREAMS_WEBSOCKET_URL", BINANCE_STREAMS_WEBSOCKET_URL)  # Endpoint of the second connection (e.g. "wss://stream.binance.com:443/stream")
+BINANCE_STREAMS_WEBSOCKET_URLS = [BINANCE_STREAMS_WEBSOCKET_URL, BINANCE_STANDBY_STREAMS_WEBSOCKET_URL] if IS_WEBSOCKET_REDUNDANCY_ENABLED else [BINANCE_STREAMS_WEBSOCKET_URL]  # One per leg of each shard
+PLANNED_RECONNECTION_SECONDS = float(os.getenv("WEBSOCKET_PLANNED_RECONNECTION_SECONDS", str(23 * 3600)))  # Binance closes the connections after 24 hours, so they are replaced before
+PLANNED_RECONNECTION_JITTER = 0.05  # The lifetimes are shortened by up to 5%, so that the connections are not all replaced at the same time
+HANDOVER_POLL_SECONDS = 0.1
+HANDOVER_OVERLAP_SECONDS = 2  # Once its successor is subscribed, a replaced connection is still read during this delay
+HANDOVER_MAX_SECONDS = 30  # A replaced connection is closed after this delay, even if its successor is not subscribed yet
+RECONNECTION_BASE_SECONDS = 0.5
+RECONNECTION_MAX_SECONDS = 30
+
+BINANCE_EXCHANGE_INFO_URL = os.getenv("BINANCE_EXCHANGE_INFO_URL", "https://api.binance.com/api/v3/exchangeInfo")  # Can also be the path of a local exchangeInfo file (e.g. for offline tests)
+SYMBOLS_REGISTRY_FILENAME = os.getenv("SYMBOLS_REGISTRY_FILENAME", "symbols_registry.json")  # Cache of the symbols listed by Binance, so that the pairs are validated at startup without waiting for Binance
+SYMBOLS_REGISTRY_REFRESH_SECONDS = 6 * 3600
+SYMBOLS_REGISTRY_RETRY_SECONDS = 60
+SYMBOLS_REGISTRY_REQUEST_SECONDS_TIMEOUT = 30
+SYMBOLS_REGISTRY_BASE_CURRENCY_INDEX = 0
+SYMBOLS_REGISTRY_QUOTE_CURRENCY_INDEX = 1
+SYMBOLS_REGISTRY_TICK_SIZE_INDEX = 2
+SYMBOLS_REGISTRY_TICK_DECIMALS_INDEX = 3
+
+FRAMES_RECORDING_FILENAME = os.getenv("FRAMES_RECORDING_FILENAME", "")  # When set, every message received from Binance is appended to this file, so that it can be replayed later
+RECORDED_FRAME_HEADER = struct.Struct("<dI")  # Receive timestamp, then length of the message that follows
+FRAMES_RECORDING_FLUSH_BYTES = 1 << 20
+FRAMES_RECORDING_FLUSH_SECONDS = 1
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"  # When disabled, the instrumentation of the price updates only costs a few boolean checks
+METRICS_HTTP_PORT = int(os.getenv("METRICS_HTTP_PORT", "0"))  # Serves the metrics in the Prometheus format on 127.0.0.1 ("0" disables it)
+METRICS_PREFIX = "crypto_alerts_"
+METRICS_HISTOGRAM_BUCKETS_SECONDS = tuple(float(f"{multiplier}e{exponent}") for exponent in range(-6, 1) for multiplier in (1, 2, 5)) + (10,)  # From 1 µs to 10 s
+EVENT_LOOP_LAG_PROBE_SECONDS = 0.5
+
+TICK_CONFLATION_SECONDS = float(os.getenv("TICK_CONFLATION_SECONDS", "-1"))  # Groups the ticks of each pair over this window before checking the crossings, "0" for once per event loop iteration (negative disables it)
+IS_TICK_CONFLATION_ENABLED = TICK_CONFLATION_SECONDS >= 0
+CONFLATED_CURRENT_PRICE_INDEX = 0
+CONFLATED_LOWEST_PRICE_INDEX = 1
+CONFLATED_HIGHEST_PRICE_INDEX = 2
+CONFLATED_IS_HIGHEST_LAST_INDEX = 3  # Whether the highest price of the window was reached after the lowest one
+
+PRICES_SNAPSHOT_FILENAME = os.getenv("PRICES_SNAPSHOT_FILENAME", "prices_snapshot.bin")  # Last known prices, reloaded at startup so that the crossings that happened while the bot was down are not missed ("" disables it)
+PRICES_SNAPSHOT_HEADER = struct.Struct("<dI")  # Snapshot timestamp, then number of prices
+PRICES_SNAPSHOT_ENTRY = struct.Struct("<ddB")  # Price, timestamp of the snapshot where it was first seen, then length of the pair name that follows
+PRICES_SNAPSHOT_SECONDS = 5
+PRICES_SNAPSHOT_MAX_AGE_SECONDS = 24 * 3600  # Older snapshots are ignored, their prices would trigger every alert added since then
+
+PRICE_HISTORY_FILENAME = os.getenv("PRICE_HISTORY_FILENAME", "price_history.bin")  # Recent prices of each followed pair, memory-mapped so that they survive restarts without being loaded ("" disables it)
+PRICE_HISTORY_SAMPLING_SECONDS = 1
+PRICE_HISTORY_SECONDS_BUCKETS = 900  # Last 15 minutes, one price per second
+PRICE_HISTORY_MINUTES_BUCKETS = 1440  # Last 24 hours, lowest / highest / last price of each minute
+PRICE_HISTORY_FILE_HEADER = struct.Struct("<8sII")  # Magic, number of seconds buckets, number of minutes buckets (the file is recreated if they change)
+PRICE_HISTORY_FILE_MAGIC = b"PRICEHST"
+PRICE_HISTORY_PAIR_NAME_BYTES = 24
+# Each pair has a slot of doubles: its name (padded with zeros), the time of its last sample, then the two rings of buckets.
+# A bucket is only valid if the second (or minute) it stores is the one expected at its position, so the rings never need to be cleared
+PRICE_HISTORY_LAST_SAMPLE_TIME_INDEX = PRICE_HISTORY_PAIR_NAME_BYTES // 8
+PRICE_HISTORY_SECONDS_OFFSET = PRICE_HISTORY_LAST_SAMPLE_TIME_INDEX + 1
+PRICE_HISTORY_SECOND_BUCKET_DOUBLES = 2  # Second, price
+PRICE_HISTORY_MINUTES_OFFSET = PRICE_HISTORY_SECONDS_OFFSET + PRICE_HISTORY_SECONDS_BUCKETS * PRICE_HISTORY_SECOND_BUCKET_DOUBLES
+PRICE_HISTORY_MINUTE_BUCKET_DOUBLES = 4  # Minute, lowest, highest, last price
+PRICE_HISTORY_SLOT_DOUBLES = PRICE_HISTORY_MINUTES_OFFSET + PRICE_HISTORY_MINUTES_BUCKETS * PRICE_HISTORY_MINUTE_BUCKET_DOUBLES
+PRICE_HISTORY_SLOT_BYTES = PRICE_HISTORY_SLOT_DOUBLES * 8
+PRICE_HISTORY_GROWTH_SLOTS = 16  # The file grows by this number of pairs when it is full
+PRICE_HISTORY_UNUSED_SLOT_SECONDS = 24 * 3600  # The slot of a pair that is no longer followed can be reused once its history is entirely outdated
+PRICE_HISTORY_SPARKLINE_LENGTH = 12  # One character per 2 hours
+SPARKLINE_CHARACTERS = "▁▂▃▄▅▆▇█"
+
+PROFILER_SAMPLING_SECONDS = 0.002  # The stacks of all threads are sampled by a timer signal, only while "/profile" runs
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 300
+PROFILE_TOP_FUNCTIONS_NUMBER = 25
+PROFILE_REPORT_FILENAME = "profile_report.txt"
+PROFILE_STACKS_FILENAME = "profile_stacks.txt"  # "Collapsed" stacks, read by flamegraph.pl or speedscope
+PROFILE_IDLE_CATEGORY = "Idle"
+PROFILE_OTHER_CATEGORY = "Other"
+PROFILE_SQLITE_CATEGORY = "SQLite"
+PROFILE_CATEGORIES_FUNCTIONS = {  # A sample belongs to the first category having a function in its stack
+    "Frame decoding": {"decode_frame_with_json", "decode_frame_with_orjson", "decode_frame_with_msgspec", "decode_frame_with_raw_extractor"},
+    "Crossing checks": {"process_price_tick", "process_price_window", "process_conflated_price_ticks"},
+}
+PROFILE_CATEGORIES_PACKAGES = {  # Or the first category having a module of this package in its stack
+    "Telegram calls": ("aiogram", "aiohttp"),
+    "WebSocket": ("websockets",),
+}
+PROFILE_IDLE_FUNCTIONS = {("selectors.py", "select"), ("thread.py", "_worker"), ("threading.py", "wait"), ("runners.py", "run")}  # Top frames of the threads waiting for work
+
+FEED_WORKERS_NUMBER = int(os.getenv("FEED_WORKERS_NUMBER", "0"))  # Processes sharing the pairs (WebSocket, decoding and crossing checks), "0" keeps everything in a single process
+FEED_WORKER_STATUS_SECONDS = 1
+FEED_QUEUES_POLL_SECONDS = 0.5  # The threads waiting on the feed queues wake up regularly, so that the bot can exit
+FEED_WORKERS_MAX_PAIRS_SPREAD = 4  # Pairs are moved between feed workers beyond this difference of pairs, moving a pair restarting its rolling windows
+REGISTER_ALERT_FEED_COMMAND = 0
+UNREGISTER_ALERT_FEED_COMMAND = 1
+SET_LAST_PRICES_FEED_COMMAND = 2
+SET_SYNTHETIC_PAIRS_FEED_COMMAND = 3
+SET_SYMBOLS_REGISTRY_FEED_COMMAND = 4
+TRIGGERED_ALERTS_FEED_EVENT = 0
+FEED_WORKER_STATUS_FEED_EVENT = 1
+TRAILING_STOPS_ANCHORS_FEED_EVENT = 2
+INBOX_MESSAGE_FEED_EVENT = 3
+
+FRAMES_RECEIVED_METRIC = "frames_received_total"
+ALERTS_TRIGGERED_METRIC = "alerts_triggered_total"
+WEBSOCKET_RECONNECTIONS_METRIC = "websocket_reconnections_total"
+TELEGRAM_ERRORS_METRIC = "telegram_errors_total"
+FRAME_DECODING_METRIC = "frame_decoding_seconds"
+CROSSING_CHECK_METRIC = "crossing_check_seconds"
+DATABASE_QUERY_METRIC = "database_query_seconds"
+TELEGRAM_REQUEST_METRIC = "telegram_request_seconds"
+EVENT_LOOP_LAG_METRIC = "event_loop_lag_seconds"
+DUPLICATE_FRAMES_METRIC = "duplicate_frames_total"
+
+METRICS_LABELS_NAMES = {FRAMES_RECEIVED_METRIC: "pair", TELEGRAM_ERRORS_METRIC: "error"}
+
 ALERTS_DATABASE_FILENAME = "crypto_alerts.db"
+DATABASE_GROUP_COMMIT_SECONDS = 0.05  # Deletions of triggered alerts (and anchors of trailing stops) requested during this window are written with a single commit
+TRAILING_STOPS_ANCHORS_SAVING_SECONDS = 1  # The highest prices reached by the trailing stops are saved at most this often, so that they survive a restart
+ALERTS_LOADING_BATCH_SIZE = 10_000
+DATABASE_THREAD_NAME_PREFIX = "database"
 
 DATABASE_NAME = "alerts"
+USERS_DATABASE_NAME = "users"
+SYNTHETIC_PAIRS_DATABASE_NAME = "synthetic_pairs"
 
 ALERT_ID_DATABASE_FIELD = "alert_id"
+USER_ID_DATABASE_FIELD = "user_id"
+NOTIFICATION_CHAT_ID_DATABASE_FIELD = "notification_chat_id"
 BASE_CURRENCY_DATABASE_FIELD = "base_currency"
 QUOTE_CURRENCY_DATABASE_FIELD = "quote_currency"
 ALERT_PRICE_DATABASE_FIELD = "alert_price"
 CREATED_AT_DATABASE_FIELD = "created_at"
+ALERT_TYPE_DATABASE_FIELD = "alert_type"
+ALERT_PERCENT_DATABASE_FIELD = "alert_percent"
+WINDOW_SECONDS_DATABASE_FIELD = "window_seconds"
+SYNTHETIC_EXPRESSION_DATABASE_FIELD = "expression"
+
+# Besides the crossing of a fixed price, an alert can watch a rolling window ("move", "rise", "drop" and "breakout"), or follow the highest price reached ("trail")
+PRICE_ALERT_TYPE = "price"
+MOVE_ALERT_TYPE = "move"  # The price moved by the percentage (up or down) within the window
+RISE_ALERT_TYPE = "rise"
+DROP_ALERT_TYPE = "drop"
+BREAKOUT_ALERT_TYPE = "breakout"  # The price went above the highest or below the lowest price of the window
+TRAILING_STOP_ALERT_TYPE = "trail"  # The price fell by the percentage from the highest price reached since the alert was added
+BREAKOUT_ALERT_KEYWORD = "breakout"
+TRAILING_STOP_ALERT_KEYWORD = "trail"
+PERCENT_SUFFIX = "%"
+DURATION_UNITS_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+MAX_ROLLING_WINDOW_SECONDS = 7 * 86400
+ROLLING_WINDOW_MAX_BUCKETS = 1440  # Prices are grouped by buckets of window / 1440 seconds (at least 1), which bounds the memory used by each window
+
+ROLLING_WINDOW_BUCKET_SECONDS_INDEX = 0
+ROLLING_WINDOW_HIGHEST_PRICES_INDEX = 1
+ROLLING_WINDOW_LOWEST_PRICES_INDEX = 2
+ROLLING_WINDOW_START_TIME_INDEX = 3
+ROLLING_WINDOW_RISE_ALERTS_INDEX = 4
+ROLLING_WINDOW_DROP_ALERTS_INDEX = 5
+ROLLING_WINDOW_BREAKOUT_ALERTS_INDEX = 6
+TRAILING_STOP_GROUP_ANCHOR_INDEX = 0
+TRAILING_STOP_GROUP_ALERTS_INDEX = 1
+PAIR_ROLLING_WINDOWS_INDEX = 0
+PAIR_TRAILING_STOP_GROUPS_INDEX = 1
+PAIR_HIGHEST_STOP_PRICE_INDEX = 2
 
 WARNING_EMOJI = "⚠️"
 CROSS_UP_EMOJI = "📈"
 CROSS_DOWN_EMOJI = "📉"
 TRASH_EMOJI = "🗑️"
 CLOCK_EMOJI = "🕑"
+HISTORY_EMOJI = "📊"
 ONLINE_EMOJI = "🟢"
 OFFLINE_EMOJI = "🔴"
 
 NO_ACTIVE_ALERTS_TEXT = "💤 No active alerts"
+DASHBOARD_MAX_ALERTS_BUTTONS = 99  # Telegram refuses messages with more than 100 buttons, the last one is kept to indicate the hidden alerts
 ALERT_ALREADY_REMOVED_MESSAGE = "The alert has already been removed."
 WEBSOCKET_STATUS_TEXT = "🔌  WebSocket Status:  "
 
 CONFIRM_TEXT_BUTTON = "✅ Confirm"
 CANCEL_TEXT_BUTTON = "❌ Cancel"
 
-BINANCE_WEBSOCKET_PAIRS_DELIMITER = "/"
-
 PRICE_DATA_KEY_DICT = "data"
+ERROR_KEY_DICT = "error"
 PAIR_NAME_KEY_DICT = "s"
 ASK_PRICE_KEY_DICT = "a"
+UPDATE_ID_KEY_DICT = "u"
+EXCHANGE_INFO_SYMBOLS_KEY_DICT = "symbols"
+EXCHANGE_INFO_SYMBOL_KEY_DICT = "symbol"
+EXCHANGE_INFO_STATUS_KEY_DICT = "status"
+EXCHANGE_INFO_BASE_ASSET_KEY_DICT = "baseAsset"
+EXCHANGE_INFO_QUOTE_ASSET_KEY_DICT = "quoteAsset"
+EXCHANGE_INFO_FILTERS_KEY_DICT = "filters"
+EXCHANGE_INFO_FILTER_TYPE_KEY_DICT = "filterType"
+EXCHANGE_INFO_TICK_SIZE_KEY_DICT = "tickSize"
+EXCHANGE_INFO_PRICE_FILTER_TYPE = "PRICE_FILTER"
+EXCHANGE_INFO_TRADING_STATUS = "TRADING"  # The other symbols (e.g. "BREAK") send no prices
+RAW_PAIR_NAME_PREFIX = f'"{PAIR_NAME_KEY_DICT}":"'
+RAW_ASK_PRICE_PREFIX = f'"{ASK_PRICE_KEY_DICT}":"'
+RAW_UPDATE_ID_PREFIX = f'"{UPDATE_ID_KEY_DICT}":'
+
+BINANCE_FRAME_DECODER = os.getenv("BINANCE_FRAME_DECODER", "")  # "raw", "msgspec", "orjson" or "json" (the fastest installed one is used by default)
 
 START_BOT_COMMAND_NAME = "start"
 ADD_ALERT_COMMAND_NAME = "add"
+STATS_COMMAND_NAME = "stats"
+PROFILE_COMMAND_NAME = "profile"
+TARGET_COMMAND_NAME = "target"
+IMPORT_COMMAND_NAME = "import"
+EXPORT_COMMAND_NAME = "export"
+SYNTHETIC_COMMAND_NAME = "synthetic"
 
 PAIR_ARGS_SEPARATOR = "/"
 
-SYNTAX_MESSAGE = "❌ The command arguments are incorrect.\n\n💡 Usage:   `/add BASE/QUOTE PRICE`\nExample:   `/add BTC/USD 100000`"
+SYNTHETIC_MULTIPLY_OPERATOR = "*"
+SYNTHETIC_DIVIDE_OPERATOR = "/"
+SYNTHETIC_MAX_LEGS = 4
+SYNTHETIC_PAIR_EXPRESSION_INDEX = 2
+SYNTHETIC_PAIR_FACTOR_INDEX = 3
+SYNTHETIC_PAIR_LEGS_INDEX = 4
+
+SYNTAX_MESSAGE = ("❌ The command arguments are incorrect.\n\n💡 Usage:   `/add BASE/QUOTE PRICE`\nExample:   `/add BTC/USDT 100000`\n\n"
+                  "Moves within a window:   `/add BASE/QUOTE [+|-]PERCENT% DURATION`  (e.g. `5% 1h`, `+3% 15m`, `-10% 1d`)\n"
+                  "Breakout of the window range:   `/add BASE/QUOTE breakout DURATION`\n"
+                  "Trailing stop:   `/add BASE/QUOTE trail PERCENT%`")
+UNLISTED_PAIR_MESSAGE = "❌ `{}` is not listed on Binance (nor defined with `/synthetic`)."
+TARGET_SYNTAX_MESSAGE = "❌ The command arguments are incorrect.\n\n💡 Usage:   `/target [CHAT_ID]`\nWithout argument, the alerts are sent to the current chat."
+TARGET_UNREACHABLE_MESSAGE = "❌ The bot cannot send messages to <code>{}</code>, or you are not a member of this chat."
+IMPORT_SYNTAX_MESSAGE = ("❌ Nothing to import.\n\n💡 Usage:   `/import` followed by one alert per line, or as the caption of a CSV file (up to 1 MB)\n"
+                         "Each line holds the arguments of `/add`, separated by spaces or commas (e.g. `BTC/USDT,100000` or `ETH/USDT -5% 1h`), as written by `/export`.")
+SYNTHETIC_SYNTAX_MESSAGE = ("❌ The command arguments are incorrect.\n\n💡 Usage:   `/synthetic BASE/QUOTE EXPRESSION`\nExample:   `/synthetic SOL/ETH SOLUSDT/ETHUSDT`\n\n"
+                            f"The expression multiplies or divides up to {SYNTHETIC_MAX_LEGS} Binance symbols (and numbers). "
+                            "`/synthetic BASE/QUOTE` alone removes the pair, and `/synthetic` alone lists them.")
+PROFILE_SYNTAX_MESSAGE = f"❌ The command arguments are incorrect.\n\n💡 Usage:   `/profile [SECONDS]`\nThe duration is {PROFILE_DEFAULT_SECONDS} seconds by default, and at most {PROFILE_MAX_SECONDS} seconds."
 MESSAGE_SECONDS_TIMEOUT = 10
+MAX_IMPORT_FILE_BYTES = 1 << 20
+MAX_REPORTED_IMPORT_ERRORS = 10
+IMPORT_FILE_TOO_LARGE_MESSAGE = f"❌ Nothing has been imported, the file is too large (max {MAX_IMPORT_FILE_BYTES >> 20} MB)."
+ALERTS_EXPORT_FILENAME = "alerts.csv"
 
 ALERT_CALLBACK_SEPARATOR = "_"
 ASK_ALERT_DELETION_PREFIX_CALLBACK = f"askdel{ALERT_CALLBACK_SEPARATOR}"
@@ -72,42 +314,389 @@ CONFIRM_ALERT_DELETION_PREFIX_CALLBACK = f"confirm{ALERT_CALLBACK_SEPARATOR}"
 BACK_TO_DASHBOARD_CALLBACK = "back_to_dashboard"
 ALERT_ID_INDEX = 1
 
-ACTIVE_ALERTS_CACHE_ALERT_ID_INDEX = 0
+ACTIVE_ALERTS_CACHE_PRICES_INDEX = 0
+ACTIVE_ALERTS_CACHE_TOMBSTONES_INDEX = 2
+TOMBSTONE_ALERT_ID = 0  # Alert IDs given by SQLite start at 1
+MIN_TOMBSTONES_BEFORE_COMPACTION = 64
 
 INBOX_MESSAGE_HEADER = "[Crypto Alerts Bot]\n\n"
 
 SUBSCRIPT_MAP = {str(digit): "₀₁₂₃₄₅₆₇₈₉"[digit] for digit in range(10)}
 
 SYNC_STEP_MINUTES = 5
+DASHBOARD_MIN_SECONDS_INTERVAL = 2  # The dashboard of a chat is edited at most once during this interval when alerts change
+
+NOTIFICATION_QUEUE_MAX_SIZE = 10_000
+NOTIFICATION_WORKERS_NUMBER = 1  # The workers only group the alerts into messages, which are then sent by one task per chat: more workers would split the alerts that could have been sent together
+NOTIFICATION_COALESCING_SECONDS = float(os.getenv("NOTIFICATION_COALESCING_SECONDS", "0"))  # Alerts triggered during this window are sent in the same message (by default, only the alerts already waiting are)
+MAX_ALERTS_PER_NOTIFICATION = 50
+TRIGGERED_ALERT_ID_INDEX = 0
+TRIGGERED_ALERT_USER_ID_INDEX = 1
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+# Telegram limits: about 30 messages per second overall, 1 message per second in a private chat and 20 messages per minute in a group or channel
+TELEGRAM_GLOBAL_MESSAGES_PER_SECOND = 30
+TELEGRAM_PRIVATE_CHAT_MESSAGES_PER_SECOND = 1
+TELEGRAM_GROUP_CHAT_MESSAGES_PER_SECOND = 20 / 60
+TELEGRAM_CHAT_BURST_MESSAGES = 3
+TELEGRAM_MAX_SEND_ATTEMPTS = 3
+
 
+def parse_command_line_arguments():
+    arguments_parser = argparse.ArgumentParser()
+    arguments_parser.add_argument("--replay", metavar="RECORDING_FILE", help="Replays a recording made with FRAMES_RECORDING_FILENAME and prints the alerts that would have been triggered")
+    arguments_parser.add_argument("--realtime", action="store_true", help="Replays the recording at the speed at which it was recorded")
+    return arguments_parser.parse_args()
+
+
+def copy_alerts_database(database_filename: str, copy_directory: str) -> str:
+    # Copied through a read-only connection, which neither migrates the database nor waits for the running bot
+    database_copy_filename = os.path.join(copy_directory, os.path.basename(database_filename))
+    database_copy_connection = sqlite3.connect(database_copy_filename)
+
+    if os.path.exists(database_filename):
+        read_only_connection = sqlite3.connect(f"file:{database_filename}?mode=ro", uri=True)
+        read_only_connection.backup(database_copy_connection)
+        read_only_connection.close()
+
+    database_copy_connection.close()
+    return database_copy_filename
+
+
+command_line_arguments = parse_command_line_arguments() if __name__ == "__main__" else None  # Not parsed by the feed workers, nor when the bot is imported
+is_replay_mode = command_line_arguments is not None and command_line_arguments.replay is not None
 
 logging.basicConfig(level=logging.INFO)
-bot = Bot(token=BOT_TOKEN)
+bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER_URL)) if TELEGRAM_API_SERVER_URL else None)
 message_dispatcher = Dispatcher()
 
-database_connection = sqlite3.connect(ALERTS_DATABASE_FILENAME)
-database_cursor = database_connection.cursor()
-database_cursor.execute(f"""
-    CREATE TABLE IF NOT EXISTS {DATABASE_NAME} (
-        {ALERT_ID_DATABASE_FIELD} INTEGER PRIMARY KEY AUTOINCREMENT,
-        {BASE_CURRENCY_DATABASE_FIELD} TEXT, 
-        {QUOTE_CURRENCY_DATABASE_FIELD} TEXT,
-        {ALERT_PRICE_DATABASE_FIELD} REAL,
-        {CREATED_AT_DATABASE_FIELD} TEXT
-    )
-""")
-database_connection.commit()
+database_connection = None  # Only opened by the coordinator process (see "open_alerts_database"): the feed workers never touch the database
+database_cursor = None
+
+
+def open_alerts_database(database_filename: str):
+    # Opens the database, creating or migrating its tables if needed.
+    # The connection is only used by "database_executor" once the bot is running, so that no disk I/O ever blocks the event loop
+    global database_connection, database_cursor
+
+    database_connection = sqlite3.connect(database_filename, check_same_thread=False)
+    database_cursor = database_connection.cursor()
+    database_cursor.execute("PRAGMA journal_mode=WAL")  # Readers no longer wait for writers, and a commit only appends to the WAL file
+    database_cursor.execute("PRAGMA synchronous=NORMAL")  # With WAL, the database stays consistent even if a crash loses the last commits
+    database_cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DATABASE_NAME} (
+            {ALERT_ID_DATABASE_FIELD} INTEGER PRIMARY KEY AUTOINCREMENT,
+            {BASE_CURRENCY_DATABASE_FIELD} TEXT, 
+            {QUOTE_CURRENCY_DATABASE_FIELD} TEXT,
+            {ALERT_PRICE_DATABASE_FIELD} REAL,
+            {CREATED_AT_DATABASE_FIELD} TEXT,
+            {USER_ID_DATABASE_FIELD} INTEGER,
+            {ALERT_TYPE_DATABASE_FIELD} TEXT DEFAULT '{PRICE_ALERT_TYPE}',
+            {ALERT_PERCENT_DATABASE_FIELD} REAL,
+            {WINDOW_SECONDS_DATABASE_FIELD} INTEGER
+        )
+    """)
+    database_cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {USERS_DATABASE_NAME} (
+            {USER_ID_DATABASE_FIELD} INTEGER PRIMARY KEY,
+            {NOTIFICATION_CHAT_ID_DATABASE_FIELD} INTEGER
+        )
+    """)
+    database_cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SYNTHETIC_PAIRS_DATABASE_NAME} (
+            {BASE_CURRENCY_DATABASE_FIELD} TEXT,
+            {QUOTE_CURRENCY_DATABASE_FIELD} TEXT,
+            {SYNTHETIC_EXPRESSION_DATABASE_FIELD} TEXT,
+            PRIMARY KEY ({BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD})
+        )
+    """)
+
+    alerts_table_columns = [column_infos[1] for column_infos in database_cursor.execute(f"PRAGMA table_info({DATABASE_NAME})")]
+    if USER_ID_DATABASE_FIELD not in alerts_table_columns:  # Databases created when the bot only had one user: their alerts belong to the owner
+        database_cursor.execute(f"ALTER TABLE {DATABASE_NAME} ADD COLUMN {USER_ID_DATABASE_FIELD} INTEGER")
+        database_cursor.execute(f"UPDATE {DATABASE_NAME} SET {USER_ID_DATABASE_FIELD} = ?", (MY_USER_ID,))
+    if ALERT_TYPE_DATABASE_FIELD not in alerts_table_columns:  # Databases created when only price alerts existed
+        database_cursor.execute(f"ALTER TABLE {DATABASE_NAME} ADD COLUMN {ALERT_TYPE_DATABASE_FIELD} TEXT DEFAULT '{PRICE_ALERT_TYPE}'")
+        database_cursor.execute(f"ALTER TABLE {DATABASE_NAME} ADD COLUMN {ALERT_PERCENT_DATABASE_FIELD} REAL")
+        database_cursor.execute(f"ALTER TABLE {DATABASE_NAME} ADD COLUMN {WINDOW_SECONDS_DATABASE_FIELD} INTEGER")
+
+    database_connection.commit()
+
+
+database_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=DATABASE_THREAD_NAME_PREFIX)  # A single thread, because the connection must not be used concurrently
+
+# The queries are always the same strings, so that sqlite3 reuses their prepared statements from its cache
+INSERT_ALERT_QUERY = f"""
+    INSERT INTO {DATABASE_NAME} 
+    ({BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}, {ALERT_PRICE_DATABASE_FIELD}, {CREATED_AT_DATABASE_FIELD}, {USER_ID_DATABASE_FIELD},
+     {ALERT_TYPE_DATABASE_FIELD}, {ALERT_PERCENT_DATABASE_FIELD}, {WINDOW_SECONDS_DATABASE_FIELD}) 
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+DELETE_ALERT_QUERY = f"""
+    DELETE FROM {DATABASE_NAME}
+    WHERE {ALERT_ID_DATABASE_FIELD} = ?
+"""
+UPDATE_ALERT_PRICE_QUERY = f"""
+    UPDATE {DATABASE_NAME}
+    SET {ALERT_PRICE_DATABASE_FIELD} = ?
+    WHERE {ALERT_ID_DATABASE_FIELD} = ?
+"""
+SELECT_ALL_ALERTS_QUERY = f"""
+    SELECT {ALERT_ID_DATABASE_FIELD}, {USER_ID_DATABASE_FIELD}, {BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}, {ALERT_PRICE_DATABASE_FIELD},
+           {ALERT_TYPE_DATABASE_FIELD}, {ALERT_PERCENT_DATABASE_FIELD}, {WINDOW_SECONDS_DATABASE_FIELD}
+    FROM {DATABASE_NAME}
+    ORDER BY {ALERT_PRICE_DATABASE_FIELD}
+"""
+UPSERT_USER_QUERY = f"""
+    INSERT OR REPLACE INTO {USERS_DATABASE_NAME}
+    ({USER_ID_DATABASE_FIELD}, {NOTIFICATION_CHAT_ID_DATABASE_FIELD})
+    VALUES (?, ?)
+"""
+SELECT_LAST_ALERT_ID_QUERY = f"""
+    SELECT MAX({ALERT_ID_DATABASE_FIELD})
+    FROM {DATABASE_NAME}
+"""
+SELECT_ALERT_IDS_AFTER_QUERY = f"""
+    SELECT {ALERT_ID_DATABASE_FIELD}
+    FROM {DATABASE_NAME}
+    WHERE {ALERT_ID_DATABASE_FIELD} > ?
+    ORDER BY {ALERT_ID_DATABASE_FIELD}
+"""
+SELECT_USER_ALERTS_QUERY = f"""
+    SELECT {BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}, {ALERT_PRICE_DATABASE_FIELD},
+           {ALERT_TYPE_DATABASE_FIELD}, {ALERT_PERCENT_DATABASE_FIELD}, {WINDOW_SECONDS_DATABASE_FIELD}
+    FROM {DATABASE_NAME}
+    WHERE {USER_ID_DATABASE_FIELD} = ?
+    ORDER BY {ALERT_ID_DATABASE_FIELD}
+"""
+SELECT_ALL_USERS_QUERY = f"""
+    SELECT {USER_ID_DATABASE_FIELD}, {NOTIFICATION_CHAT_ID_DATABASE_FIELD}
+    FROM {USERS_DATABASE_NAME}
+"""
+UPSERT_SYNTHETIC_PAIR_QUERY = f"""
+    INSERT OR REPLACE INTO {SYNTHETIC_PAIRS_DATABASE_NAME}
+    ({BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}, {SYNTHETIC_EXPRESSION_DATABASE_FIELD})
+    VALUES (?, ?, ?)
+"""
+DELETE_SYNTHETIC_PAIR_QUERY = f"""
+    DELETE FROM {SYNTHETIC_PAIRS_DATABASE_NAME}
+    WHERE {BASE_CURRENCY_DATABASE_FIELD} = ? AND {QUOTE_CURRENCY_DATABASE_FIELD} = ?
+"""
+SELECT_ALL_SYNTHETIC_PAIRS_QUERY = f"""
+    SELECT {BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}, {SYNTHETIC_EXPRESSION_DATABASE_FIELD}
+    FROM {SYNTHETIC_PAIRS_DATABASE_NAME}
+"""
+
+disk_io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-io")  # Every file written in the background (recording, prices snapshot, symbols registry cache), a single thread keeping the recorded messages in order
+feed_queues_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="feed")  # Waits on the inter-process queues, which have no asyncio interface
+frames_recording_buffer = bytearray()
+
+pending_deleted_alert_ids = []
+pending_trailing_stops_anchors = {}  # Alert ID -> highest price reached by the trailing stop, stored in its (otherwise unused) price
+alerts_group_commit_task = None
+raised_trailing_stops_pairs = set()  # Pairs whose trailing stops have a new anchor since it was last saved
 
 pinned_dashboard_ids = {}
+checked_pinned_dashboard_chat_ids = set()
+dashboard_contents_hashes = {}  # Hash of the last text and buttons sent for each dashboard
+dashboard_last_render_times = {}
+dashboard_refresh_tasks = {}
+dashboard_locks = {}
 last_known_prices = {}
+conflated_price_ticks = {}  # Pair name -> [current, lowest, highest price] received since the crossings were last checked
+prices_snapshot_entries = {}  # Pair name -> [price, timestamp] as written in the last snapshot
+is_prices_snapshot_loaded = False  # The snapshot must not be overwritten before having been read
+price_history_memory_map = None
+price_history_slots_pairs = []  # Slot index -> pair name, or None if the slot is free
+price_history_slots_views = {}  # Pair name -> its slot, seen as an array of doubles
+price_history_summaries = {}  # Pair name -> [minute, summary], computed at most once per minute
 pairs_metadata = {}
 active_alerts_cache = {}
+alerts_infos_by_id = {}  # Alert ID -> [user ID, base currency, quote currency, alert price, alert type, alert percent, window seconds], mirrors the database so that handlers never need to read it
+pairs_rolling_alerts = {}  # Pair name -> [{window seconds: rolling window}, trailing stop groups, highest stop price], only for the pairs having such alerts
+users_alert_ids = {}  # User ID -> IDs of their alerts, to render each dashboard without browsing the alerts of the other users
+pairs_subscribers = {}  # Pair name -> {user ID: number of alerts of this user on the pair}, the pair is followed as long as it has a subscriber
+pairs_last_update_ids = {}  # Pair name -> update ID of the last processed tick, the older ones being duplicates received on another connection
+users_notification_chat_ids = {}  # User ID -> chat where their triggered alerts are sent, when it is not the default one
+synthetic_pairs = {}  # Pair name -> [base currency, quote currency, expression, constant factor, [(leg pair name, is divided)]], for the pairs computed from other pairs
+legs_synthetic_pairs = {}  # Leg pair name -> names of the synthetic pairs using it, so that a tick only recomputes the synthetic pairs depending on it
+synthetic_legs_prices = {}  # Leg pair name -> last price received, kept while a followed synthetic pair uses it
+symbols_registry = {}  # Pair name -> [base currency, quote currency, tick size, tick size decimals] of the symbols trading on Binance, empty until it is first loaded
+symbols_registry_updated_at = 0.0
+reported_unlisted_pair_names = set()
 
 is_websocket_dead = False
 
-websocket_task = None
+notification_queue = None  # Created in "main", like the other asyncio primitives
+chats_notification_messages = {}  # Chat ID -> messages waiting to be sent to this chat, in order
+chats_notification_tasks = {}  # Chat ID -> task sending the waiting messages of this chat, only while there are some
+
+metrics_start_time = time.time()
+metrics_counters = {}  # (metric name, label) -> value, the label being for example the pair name, or None
+metrics_histograms = {}  # Metric name -> [count of each bucket (the last one being for the values above all buckets), sum of the values, number of values]
+
+profile_stacks_samples = None  # (Thread name, stack) -> number of samples, while "/profile" runs
+profile_samples_number = 0
+profiled_threads_names = {}  # Thread ID -> name
+
+telegram_rate_limiter_buckets = {}  # Bucket key (chat ID, or None for the global limit) -> [available tokens, last refill time]
+
+# Each WebSocket connection ("shard") follows at most MAX_STREAMS_PER_WEBSOCKET_CONNECTION streams.
+# In redundant mode, each shard has one connection ("leg") per endpoint, so the connections are identified by (shard ID, leg ID)
+websocket_shards_streams = {}  # Streams that each shard should follow
+websocket_shards_subscribed_streams = {}  # Streams that are actually subscribed on the current connection of each leg
+websocket_shards_connections = {}
+websocket_shards_tasks = {}
+next_websocket_shard_id = 0
+next_control_message_id = 0
+
+websocket_subscriptions_event = None  # Created in "main", because an asyncio.Event must be created inside the running event loop
+
+# Sharded mode: each feed worker process owns the pairs for which "get_pair_feed_worker_id" returns its ID (their WebSocket connections and sorted alerts)
+feed_worker_id = None  # Only set inside a feed worker process
+feed_workers_processes = []
+pairs_feed_worker_ids = {}  # Pair name -> feed worker owning it, chosen when the pair gets its first alert
+feed_workers_pairs_numbers = []  # Number of pairs owned by each feed worker
+feed_workers_commands_queues = []  # Alerts to register or unregister, sent by the coordinator to each feed worker (empty in single-process mode)
+feed_workers_events_queue = None  # Triggered alerts and statuses, sent by the feed workers to the coordinator
+feed_workers_statuses = {}  # Feed worker ID -> [is its WebSocket dead, number of WebSocket connections]
+feed_workers_last_known_prices = {}  # Feed worker ID -> last known prices of its pairs, only used for the snapshots
 
 is_owner_filter = F.from_user.id == MY_USER_ID
+is_allowed_user_filter = F.from_user.id.in_(ALLOWED_USER_IDS)
+
+
+def insert_alert_into_database(user_id: int, base_currency: str, quote_currency: str, alert_price: float,
+                               alert_type: str = PRICE_ALERT_TYPE, alert_percent: float = None, window_seconds: int = None) -> int:
+    database_cursor.execute(INSERT_ALERT_QUERY, (base_currency, quote_currency, alert_price, datetime.datetime.now().isoformat(), user_id, alert_type, alert_percent, window_seconds))
+    database_connection.commit()
+
+    return database_cursor.lastrowid  # Allows to immediately retrieve the ID that was just created by the last "INSERT" statement
+
+
+def insert_alerts_into_database(user_id: int, imported_alerts: list) -> list:
+    # Inserts all the alerts with a single commit, and returns their IDs in the same order.
+    # The database is only written by its own thread, so the IDs above the last one are exactly the new alerts
+    database_cursor.execute(SELECT_LAST_ALERT_ID_QUERY)
+    last_alert_id = database_cursor.fetchone()[0] or 0
+
+    created_at = datetime.datetime.now().isoformat()
+    database_cursor.executemany(INSERT_ALERT_QUERY, [
+        (base_currency, quote_currency, alert_price, created_at, user_id, alert_type, alert_percent, window_seconds)
+        for base_currency, quote_currency, alert_type, alert_price, alert_percent, window_seconds in imported_alerts
+    ])
+    database_cursor.execute(SELECT_ALERT_IDS_AFTER_QUERY, (last_alert_id,))
+    new_alert_ids = [alert_id for alert_id, in database_cursor.fetchall()]
+    database_connection.commit()
+
+    return new_alert_ids
+
+
+def write_user_alerts_export(user_id: int, export_filename: str) -> int:
+    # Streams the alerts of the user by batches from the database to the file, returns the number of exported alerts
+    alerts_cursor = database_connection.execute(SELECT_USER_ALERTS_QUERY, (user_id,))
+    exported_alerts_number = 0
+
+    with open(export_filename, "w", newline="") as export_file:
+        csv_writer = csv.writer(export_file)
+        while alerts_batch := alerts_cursor.fetchmany(ALERTS_LOADING_BATCH_SIZE):
+            csv_writer.writerows(get_alert_command_args(*alert_row) for alert_row in alerts_batch)
+            exported_alerts_number += len(alerts_batch)
+
+    return exported_alerts_number
+
+
+def delete_alerts_from_database(alert_ids: list, trailing_stops_anchors: dict = None):
+    if trailing_stops_anchors:  # Before the deletions, which make the updates of the triggered trailing stops no-ops
+        database_cursor.executemany(UPDATE_ALERT_PRICE_QUERY, [(anchor_price, alert_id) for alert_id, anchor_price in trailing_stops_anchors.items()])
+    database_cursor.executemany(DELETE_ALERT_QUERY, [(alert_id,) for alert_id in alert_ids])
+    database_connection.commit()
+
+
+def open_all_alerts_cursor() -> sqlite3.Cursor:
+    return database_connection.execute(SELECT_ALL_ALERTS_QUERY)  # Own cursor, so that other queries can run between two batches
+
+
+def fetch_alerts_batch(alerts_cursor: sqlite3.Cursor) -> list:
+    return alerts_cursor.fetchmany(ALERTS_LOADING_BATCH_SIZE)
+
+
+def save_user_notification_chat_id(user_id: int, notification_chat_id: int):
+    database_cursor.execute(UPSERT_USER_QUERY, (user_id, notification_chat_id))
+    database_connection.commit()
+
+
+def fetch_all_users_from_database() -> list:
+    return database_cursor.execute(SELECT_ALL_USERS_QUERY).fetchall()
+
+
+def save_synthetic_pair(base_currency: str, quote_currency: str, synthetic_expression: str):
+    database_cursor.execute(UPSERT_SYNTHETIC_PAIR_QUERY, (base_currency, quote_currency, synthetic_expression))
+    database_connection.commit()
+
+
+def delete_synthetic_pair_from_database(base_currency: str, quote_currency: str):
+    database_cursor.execute(DELETE_SYNTHETIC_PAIR_QUERY, (base_currency, quote_currency))
+    database_connection.commit()
+
+
+def fetch_all_synthetic_pairs_from_database() -> list:
+    return database_cursor.execute(SELECT_ALL_SYNTHETIC_PAIRS_QUERY).fetchall()
+
+
+async def run_in_database_thread(database_function, *database_function_args):
+    if not METRICS_ENABLED:
+        return await asyncio.get_running_loop().run_in_executor(database_executor, database_function, *database_function_args)
+
+    query_start_time = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(database_executor, database_function, *database_function_args)
+    finally:
+        observe_metric(DATABASE_QUERY_METRIC, time.perf_counter() - query_start_time)
+
+
+async def flush_alerts_group_commit():
+    global alerts_group_commit_task
+
+    await asyncio.sleep(DATABASE_GROUP_COMMIT_SECONDS)
+
+    deleted_alert_ids = pending_deleted_alert_ids[:]
+    pending_deleted_alert_ids.clear()
+    trailing_stops_anchors = pending_trailing_stops_anchors.copy()
+    pending_trailing_stops_anchors.clear()
+    alerts_group_commit_task = None
+
+    try:
+        await run_in_database_thread(delete_alerts_from_database, deleted_alert_ids, trailing_stops_anchors)
+    except Exception:
+        await send_inbox_message(traceback.format_exc(), level="ERROR")
+
+
+async def wait_for_alerts_group_commit():
+    # The deletions grouped by "schedule_alerts_deletion" are committed before the alerts are read back from the database
+    while alerts_group_commit_task is not None:
+        await asyncio.shield(alerts_group_commit_task)  # The commit goes on if the waiting command is cancelled
+
+
+def schedule_alerts_deletion(alert_ids: list):
+    global alerts_group_commit_task
+
+    pending_deleted_alert_ids.extend(alert_ids)
+
+    if alerts_group_commit_task is None:
+        alerts_group_commit_task = asyncio.create_task(flush_alerts_group_commit())
+
+
+def schedule_trailing_stops_anchors_saving(trailing_stops_anchors: list):
+    global alerts_group_commit_task
+
+    for anchor_price, alert_id in trailing_stops_anchors:
+        if alert_id in alerts_infos_by_id:  # Otherwise already triggered or deleted
+            pending_trailing_stops_anchors[alert_id] = anchor_price
+            alerts_infos_by_id[alert_id][3] = anchor_price  # Also sent again to a restarted feed worker
+
+    if pending_trailing_stops_anchors and alerts_group_commit_task is None:
+        alerts_group_commit_task = asyncio.create_task(flush_alerts_group_commit())
 
 
 def format_alert_price(price: float) -> str:
@@ -129,45 +718,299 @@ def format_alert_price(price: float) -> str:
     return f"{price:g}"  # Prices between 0.0001 and 0.(9) are displayed simply.
 
 
-async def send_inbox_message(message: str, level="INFO"):
+def round_pair_price(pair_name: str, price: float) -> float:
+    # Rounds to the tick size of the pair on Binance, e.g. for the prices computed by the rolling-window alerts or typed with too many decimals
+    symbol_infos = symbols_registry.get(pair_name)
+    if symbol_infos is None or not symbol_infos[SYMBOLS_REGISTRY_TICK_SIZE_INDEX]:  # Synthetic pairs have no tick size
+        return price
+
+    tick_size = symbol_infos[SYMBOLS_REGISTRY_TICK_SIZE_INDEX]
+    return round(round(price / tick_size) * tick_size, symbol_infos[SYMBOLS_REGISTRY_TICK_DECIMALS_INDEX])
+
+
+def format_pair_price(pair_name: str, price: float) -> str:
+    # Displays every decimal of the tick size, which ":g" would cut beyond 6 significant digits (e.g. 100000.12 BTCUSDT)
+    symbol_infos = symbols_registry.get(pair_name)
+    if symbol_infos is None or not symbol_infos[SYMBOLS_REGISTRY_TICK_SIZE_INDEX]:
+        return format_alert_price(price)
+
+    return f"{round_pair_price(pair_name, price):.{symbol_infos[SYMBOLS_REGISTRY_TICK_DECIMALS_INDEX]}f}"
+
+
+def increment_metric(metric_name: str, label=None, amount=1):
+    metric_key = (metric_name, label)
+    metrics_counters[metric_key] = metrics_counters.get(metric_key, 0) + amount
+
+
+def observe_metric(metric_name: str, observed_seconds: float):
+    if metric_name not in metrics_histograms:
+        metrics_histograms[metric_name] = [[0] * (len(METRICS_HISTOGRAM_BUCKETS_SECONDS) + 1), 0.0, 0]
+
+    metric_histogram = metrics_histograms[metric_name]
+    metric_histogram[0][bisect.bisect_left(METRICS_HISTOGRAM_BUCKETS_SECONDS, observed_seconds)] += 1
+    metric_histogram[1] += observed_seconds
+    metric_histogram[2] += 1
+
+
+def merge_metrics(added_counters: dict, added_histograms: dict):  # Adds the metrics measured by a feed worker to the ones of the coordinator
+    for metric_key, metric_value in added_counters.items():
+        metrics_counters[metric_key] = metrics_counters.get(metric_key, 0) + metric_value
+
+    for metric_name, (buckets_counts, values_sum, values_number) in added_histograms.items():
+        if metric_name not in metrics_histograms:
+            metrics_histograms[metric_name] = [[0] * (len(METRICS_HISTOGRAM_BUCKETS_SECONDS) + 1), 0.0, 0]
+
+        metric_histogram = metrics_histograms[metric_name]
+        metric_histogram[0] = [bucket_count + added_bucket_count for bucket_count, added_bucket_count in zip(metric_histogram[0], buckets_counts)]
+        metric_histogram[1] += values_sum
+        metric_histogram[2] += values_number
+
+
+def get_metric_total(metric_name: str) -> int:
+    return sum(metric_value for (counter_name, _), metric_value in metrics_counters.items() if counter_name == metric_name)
+
+
+def get_histogram_quantile(metric_name: str, quantile: float) -> float:
+    # Upper bound of the bucket containing the quantile, which is precise enough to spot a problem
+    if metric_name not in metrics_histograms:
+        return None
+
+    buckets_counts, _, values_number = metrics_histograms[metric_name]
+
+    cumulated_count = 0
+    for bucket_index, bucket_count in enumerate(buckets_counts):
+        cumulated_count += bucket_count
+        if cumulated_count >= quantile * values_number:
+            return METRICS_HISTOGRAM_BUCKETS_SECONDS[min(bucket_index, len(METRICS_HISTOGRAM_BUCKETS_SECONDS) - 1)]
+
+    return 0.0
+
+
+def format_window_duration(window_seconds: int) -> str:  # "90m" rather than "1.5h", the largest unit dividing the duration
+    for unit, unit_seconds in reversed(DURATION_UNITS_SECONDS.items()):  # From the largest unit
+        if window_seconds % unit_seconds == 0:
+            return f"{window_seconds // unit_seconds}{unit}"
+
+
+def get_alert_condition_text(alert_type: str, alert_percent: float, window_seconds: int) -> str:
+    if alert_type == MOVE_ALERT_TYPE:
+        return f"±{alert_percent:g}% in {format_window_duration(window_seconds)}"
+    if alert_type == RISE_ALERT_TYPE:
+        return f"+{alert_percent:g}% in {format_window_duration(window_seconds)}"
+    if alert_type == DROP_ALERT_TYPE:
+        return f"-{alert_percent:g}% in {format_window_duration(window_seconds)}"
+    if alert_type == BREAKOUT_ALERT_TYPE:
+        return f"{format_window_duration(window_seconds)} breakout"
+    if alert_type == TRAILING_STOP_ALERT_TYPE:
+        return f"trailing {alert_percent:g}%"
+
+    return ""
+
+
+def format_duration(duration_seconds: float) -> str:
+    if duration_seconds is None:  # Nothing has been measured yet
+        return "-"
+    if duration_seconds < 0.001:
+        return f"{round(duration_seconds * 1_000_000, 3):g} µs"
+    if duration_seconds < 1:
+        return f"{round(duration_seconds * 1000, 3):g} ms"
+    return f"{duration_seconds:g} s"
+
+
+def get_gauges() -> dict:
+    return {
+        "notification_queue_depth": notification_queue.qsize() if notification_queue is not None else 0,
+        "notification_messages_waiting": sum(len(chat_messages) for chat_messages in chats_notification_messages.values()),
+        "active_alerts": len(alerts_infos_by_id),
+        "active_pairs": len(pairs_metadata),
+        "websocket_connections": len(websocket_shards_connections) + sum(connections_number for _, connections_number in feed_workers_statuses.values()),
+    }
+
+
+def get_prometheus_metrics() -> str:
+    prometheus_lines = []
+
+    for counter_name in sorted({counter_name for counter_name, _ in metrics_counters}):
+        prometheus_lines.append(f"# TYPE {METRICS_PREFIX}{counter_name} counter")
+        for (metric_name, label), metric_value in metrics_counters.items():
+            if metric_name == counter_name:
+                label_text = f'{{{METRICS_LABELS_NAMES[counter_name]}="{label}"}}' if label is not None else ""
+                prometheus_lines.append(f"{METRICS_PREFIX}{counter_name}{label_text} {metric_value}")
+
+    for metric_name, (buckets_counts, values_sum, values_number) in metrics_histograms.items():
+        prometheus_lines.append(f"# TYPE {METRICS_PREFIX}{metric_name} histogram")
+        cumulated_count = 0
+        for bucket_upper_bound, bucket_count in zip(METRICS_HISTOGRAM_BUCKETS_SECONDS, buckets_counts):
+            cumulated_count += bucket_count
+            prometheus_lines.append(f'{METRICS_PREFIX}{metric_name}_bucket{{le="{bucket_upper_bound}"}} {cumulated_count}')
+        prometheus_lines.append(f'{METRICS_PREFIX}{metric_name}_bucket{{le="+Inf"}} {values_number}')
+        prometheus_lines.append(f"{METRICS_PREFIX}{metric_name}_sum {values_sum}")
+        prometheus_lines.append(f"{METRICS_PREFIX}{metric_name}_count {values_number}")
+
+    for gauge_name, gauge_value in get_gauges().items():
+        prometheus_lines.append(f"# TYPE {METRICS_PREFIX}{gauge_name} gauge")
+        prometheus_lines.append(f"{METRICS_PREFIX}{gauge_name} {gauge_value}")
+
+    return "\n".join(prometheus_lines) + "\n"
+
+
+async def handle_metrics_http_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while (await reader.readline()).strip():  # Whatever the path, the request only gets the metrics
+            pass
+
+        response_body = get_prometheus_metrics().encode()
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: text/plain; version=0.0.4\r\n"
+                     b"Content-Length: " + str(len(response_body)).encode() + b"\r\n"
+                     b"Connection: close\r\n\r\n" + response_body)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def event_loop_lag_monitor():
+    while True:
+        sleep_start_time = time.perf_counter()
+        await asyncio.sleep(EVENT_LOOP_LAG_PROBE_SECONDS)
+        observe_metric(EVENT_LOOP_LAG_METRIC, time.perf_counter() - sleep_start_time - EVENT_LOOP_LAG_PROBE_SECONDS)
+
+
+def get_token_bucket_waiting_time(bucket_key, refill_rate: float, capacity: float, current_time: float) -> float:
+    if bucket_key not in telegram_rate_limiter_buckets:
+        telegram_rate_limiter_buckets[bucket_key] = [capacity, current_time]
+
+    bucket = telegram_rate_limiter_buckets[bucket_key]
+    available_tokens, last_refill_time = bucket
+
+    bucket[0] = min(capacity, available_tokens + (current_time - last_refill_time) * refill_rate)
+    bucket[1] = current_time
+
+    return 0 if bucket[0] >= 1 else (1 - bucket[0]) / refill_rate
+
+
+async def wait_for_telegram_rate_limit(chat_id: int):
+    chat_messages_per_second = TELEGRAM_PRIVATE_CHAT_MESSAGES_PER_SECOND if chat_id > 0 else TELEGRAM_GROUP_CHAT_MESSAGES_PER_SECOND  # Group and channel IDs are negative
+
+    while True:
+        current_time = asyncio.get_running_loop().time()
+
+        global_waiting_time = get_token_bucket_waiting_time(None, TELEGRAM_GLOBAL_MESSAGES_PER_SECOND, TELEGRAM_GLOBAL_MESSAGES_PER_SECOND, current_time)
+        chat_waiting_time = get_token_bucket_waiting_time(chat_id, chat_messages_per_second, TELEGRAM_CHAT_BURST_MESSAGES, current_time)
+
+        if global_waiting_time == 0 and chat_waiting_time == 0:
+            # There is no "await" between the check and the consumption of the tokens, so concurrent senders cannot both take the last token
+            telegram_rate_limiter_buckets[None][0] -= 1
+            telegram_rate_limiter_buckets[chat_id][0] -= 1
+            return
+
+        await asyncio.sleep(max(global_waiting_time, chat_waiting_time))
+
+
+async def send_telegram_request(telegram_method, chat_id: int, **telegram_method_kwargs):
+    # Every message sent or edited by the bot goes through here, so that Telegram limits are respected and "Too Many Requests" errors are retried
+    for attempt_number in range(1, TELEGRAM_MAX_SEND_ATTEMPTS + 1):
+        await wait_for_telegram_rate_limit(chat_id)
+
+        request_start_time = time.perf_counter()
+
+        try:
+            return await telegram_method(chat_id=chat_id, **telegram_method_kwargs)
+
+        except TelegramRetryAfter as retry_after_error:
+            if METRICS_ENABLED:
+                increment_metric(TELEGRAM_ERRORS_METRIC, type(retry_after_error).__name__)
+
+            if attempt_number == TELEGRAM_MAX_SEND_ATTEMPTS:
+                raise
+
+            await asyncio.sleep(retry_after_error.retry_after)
+
+        except Exception as telegram_error:
+            if METRICS_ENABLED:
+                increment_metric(TELEGRAM_ERRORS_METRIC, type(telegram_error).__name__)
+            raise
+
+        finally:
+            if METRICS_ENABLED:
+                observe_metric(TELEGRAM_REQUEST_METRIC, time.perf_counter() - request_start_time)
+
+
+async def send_inbox_message(message: str, level="INFO", chat_id: int = LOG_CHANNEL_ID):
+    if feed_worker_id is not None:  # Only the coordinator process talks to Telegram, so that every message goes through the same rate limits
+        feed_workers_events_queue.put((INBOX_MESSAGE_FEED_EVENT, feed_worker_id, message, level, chat_id))
+        return
+
     try:
         if level == "INFO":
-            await bot.send_message(chat_id=LOG_CHANNEL_ID,
-                                   text=f"{INBOX_MESSAGE_HEADER}{message}",
-                                   parse_mode="HTML")
+            await send_telegram_request(bot.send_message,
+                                        chat_id,
+                                        text=f"{INBOX_MESSAGE_HEADER}{message}",
+                                        parse_mode="HTML")
             
         else:
-            await bot.send_message(chat_id=LOG_CHANNEL_ID,
-                                   text=f"{INBOX_MESSAGE_HEADER}"
-                                        f"{WARNING_EMOJI} <b>ERROR:</b>\n"
-                                        f"<pre>\n{message}</pre>\n",
-                                   parse_mode="HTML")
+            await send_telegram_request(bot.send_message,
+                                        LOG_CHANNEL_ID,
+                                        text=f"{INBOX_MESSAGE_HEADER}"
+                                             f"{WARNING_EMOJI} <b>ERROR:</b>\n"
+                                             f"<pre>\n{message}</pre>\n",
+                                        parse_mode="HTML")
 
     except Exception as e:
         print(f"CRITICAL: {e}")
 
 
 async def refresh_dashboard(chat_id: int):
-    alerts_infos_query_result = database_cursor.execute(f"""
-        SELECT {ALERT_ID_DATABASE_FIELD}, {BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}, {ALERT_PRICE_DATABASE_FIELD}
-        FROM {DATABASE_NAME}
-        ORDER BY {BASE_CURRENCY_DATABASE_FIELD}
-    """)
-    all_alerts_infos = alerts_infos_query_result.fetchall()
+    async with dashboard_locks.setdefault(chat_id, asyncio.Lock()):  # Two concurrent refreshes could otherwise both send a new dashboard
+        await render_dashboard(chat_id)
 
-    dashboard_layout = []
+
+async def render_dashboard(chat_id: int):
+    all_alerts_infos = sorted(
+        ((alert_id, alerts_infos_by_id[alert_id]) for alert_id in users_alert_ids.get(chat_id, ())),  # Dashboards live in the private chat of their user
+        key=lambda alert_infos: alert_infos[1][1]  # Sorted by base currency
+    )
+
+    dashboard_buttons = []
 
     if not all_alerts_infos:  # If there are no alerts in the database
-        dashboard_layout.append([InlineKeyboardButton(text=NO_ACTIVE_ALERTS_TEXT, callback_data="none")])
+        dashboard_buttons.append((NO_ACTIVE_ALERTS_TEXT, "none"))
     else:
-        for alert_infos in all_alerts_infos:
-            alert_id, base_currency, quote_currency, alert_price = alert_infos
-            button_text = f"{base_currency} : {format_alert_price(alert_price)} {quote_currency} ({base_currency}/{quote_currency})"
-            dashboard_layout.append([InlineKeyboardButton(text=button_text, callback_data=f"{ASK_ALERT_DELETION_PREFIX_CALLBACK}{alert_id}")])
+        for alert_id, alert_infos in all_alerts_infos[:DASHBOARD_MAX_ALERTS_BUTTONS]:
+            _, base_currency, quote_currency, alert_price, alert_type, alert_percent, window_seconds = alert_infos
+            if alert_type == PRICE_ALERT_TYPE:
+                button_text = f"{base_currency} : {format_pair_price(f'{base_currency}{quote_currency}', alert_price)} {quote_currency} ({base_currency}/{quote_currency})"
+            else:
+                button_text = f"{base_currency} : {get_alert_condition_text(alert_type, alert_percent, window_seconds)} ({base_currency}/{quote_currency})"
+
+            price_history_text = get_price_history_text(f"{base_currency}{quote_currency}")
+            if price_history_text:
+                button_text += f" {price_history_text}"
+            dashboard_buttons.append((button_text, f"{ASK_ALERT_DELETION_PREFIX_CALLBACK}{alert_id}"))
+
+        if len(all_alerts_infos) > DASHBOARD_MAX_ALERTS_BUTTONS:
+            dashboard_buttons.append((f"➕ {len(all_alerts_infos) - DASHBOARD_MAX_ALERTS_BUTTONS} more alerts", "none"))
+    
+    current_datetime = datetime.datetime.now()
+    formatted_current_date = current_datetime.strftime("%d %b")
+    formatted_current_time = current_datetime.strftime("%H:%M")
+
+    status_emoji = OFFLINE_EMOJI if is_websocket_dead else ONLINE_EMOJI
+
+    dashboard_full_title = f"{CLOCK_EMOJI}  Updated on  <code>{formatted_current_date}</code>  at  <code>{formatted_current_time}</code>\n{WEBSOCKET_STATUS_TEXT}{status_emoji}\n\n<i>Updates automatically every {SYNC_STEP_MINUTES} minutes</i>"
+
+    dashboard_last_render_times[chat_id] = asyncio.get_running_loop().time()
 
-    alerts_menu_interface = InlineKeyboardMarkup(inline_keyboard=dashboard_layout)
+    dashboard_content_hash = hash((dashboard_full_title, tuple(dashboard_buttons)))
+    if dashboard_contents_hashes.get(chat_id) == dashboard_content_hash:  # Nothing has changed since the last edit, so there is no need to call Telegram
+        return
+
+    alerts_menu_interface = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=button_text, callback_data=button_callback_data)] for button_text, button_callback_data in dashboard_buttons
+    ])
 
-    if chat_id not in pinned_dashboard_ids:  # We check whether the dashboard associated with the user is unknown (because we store pinned dashboards based on the chat ID)
+    if chat_id not in checked_pinned_dashboard_chat_ids:  # We look for a dashboard pinned before the bot started only once per chat (because we store pinned dashboards based on the chat ID)
+        checked_pinned_dashboard_chat_ids.add(chat_id)
         try:
             chat_info = await bot.get_chat(chat_id)
             if chat_info.pinned_message:
@@ -175,20 +1018,13 @@ async def refresh_dashboard(chat_id: int):
                     pinned_dashboard_ids[chat_id] = chat_info.pinned_message.message_id
         except Exception:  
             pass
-    
-    current_datetime = datetime.datetime.now()
-    formatted_current_date = current_datetime.strftime("%d %b")
-    formatted_current_time = current_datetime.strftime("%H:%M")
-
-    status_emoji = OFFLINE_EMOJI if is_websocket_dead else ONLINE_EMOJI
-
-    dashboard_full_title = f"{CLOCK_EMOJI}  Updated on  <code>{formatted_current_date}</code>  at  <code>{formatted_current_time}</code>\n{WEBSOCKET_STATUS_TEXT}{status_emoji}\n\n<i>Updates automatically every {SYNC_STEP_MINUTES} minutes</i>"
 
     is_dashboard_updated = False
     if chat_id in pinned_dashboard_ids:
         try:
-            await bot.edit_message_text(
-                chat_id=chat_id,
+            await send_telegram_request(
+                bot.edit_message_text,
+                chat_id,
                 message_id=pinned_dashboard_ids[chat_id],
                 text=dashboard_full_title,
                 reply_markup=alerts_menu_interface,
@@ -204,8 +1040,9 @@ async def refresh_dashboard(chat_id: int):
         except:
             pass
 
-        new_dashboard_message = await bot.send_message(
-            chat_id=chat_id,
+        new_dashboard_message = await send_telegram_request(
+            bot.send_message,
+            chat_id,
             text=dashboard_full_title,
             reply_markup=alerts_menu_interface,
             parse_mode="HTML"
@@ -217,276 +1054,2560 @@ async def refresh_dashboard(chat_id: int):
         except:
             pass
 
+    dashboard_contents_hashes[chat_id] = dashboard_content_hash
+
+
+async def delayed_dashboard_refresh(chat_id: int):
+    seconds_since_last_render = asyncio.get_running_loop().time() - dashboard_last_render_times.get(chat_id, float("-inf"))
+    await asyncio.sleep(max(DASHBOARD_MIN_SECONDS_INTERVAL - seconds_since_last_render, 0))
+
+    dashboard_refresh_tasks.pop(chat_id, None)  # Requests made from now on need a new render, because this one may not include their changes
+
+    try:
+        await refresh_dashboard(chat_id)
+    except Exception:
+        await send_inbox_message(traceback.format_exc(), level="ERROR")
+
+
+def request_dashboard_refresh(chat_id: int):
+    # All the requests made before the delayed refresh starts (e.g. 20 alerts triggered at once) are served by a single render
+    if chat_id not in dashboard_refresh_tasks:
+        dashboard_refresh_tasks[chat_id] = asyncio.create_task(delayed_dashboard_refresh(chat_id))
+
 
 @message_dispatcher.callback_query(F.data == "none")  # Useful for the label button indicating that no alerts have been added, so that nothing happens if it is clicked
 async def callback_none(callback: types.CallbackQuery):
     await callback.answer()
 
 
-async def trigger_websocket_restart():
-    global websocket_task
+# Every decoder returns the pair name and its ask price, or None if the message does not contain prices (e.g. answers to control messages).
+# Pair names are interned, so that the dictionaries indexed by pair name compare them by identity instead of character by character.
 
-    if websocket_task:
-        websocket_task.cancel()
+def decode_frame_with_json(websocket_message: str):
+    json_data = json.loads(websocket_message)
+    if PRICE_DATA_KEY_DICT not in json_data:  # Binance can send messages that do not contain a "data" field
+        return None
 
-    await asyncio.sleep(1)
+    price_data = json_data[PRICE_DATA_KEY_DICT]
+    return sys.intern(price_data[PAIR_NAME_KEY_DICT]), float(price_data[ASK_PRICE_KEY_DICT]), price_data.get(UPDATE_ID_KEY_DICT, 0)
 
-    websocket_task = asyncio.create_task(run_websocket_listener())
 
+def decode_frame_with_orjson(websocket_message: str):
+    json_data = orjson.loads(websocket_message)
+    if PRICE_DATA_KEY_DICT not in json_data:
+        return None
 
-async def load_pairs_metadata_from_database():
-    alerts_infos_query_result = database_cursor.execute(f"""
-        SELECT {ALERT_ID_DATABASE_FIELD}, {BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}, {ALERT_PRICE_DATABASE_FIELD}
-        FROM {DATABASE_NAME}
-    """)
+    price_data = json_data[PRICE_DATA_KEY_DICT]
+    return sys.intern(price_data[PAIR_NAME_KEY_DICT]), float(price_data[ASK_PRICE_KEY_DICT]), price_data.get(UPDATE_ID_KEY_DICT, 0)
 
-    for alert_id, base_currency, quote_currency, alert_price in alerts_infos_query_result.fetchall():
-        pair_name = f"{base_currency}{quote_currency}"
-        
-        if pair_name not in pairs_metadata:
-            pairs_metadata[pair_name] = [base_currency, quote_currency]
-            active_alerts_cache[pair_name] = []
 
-        active_alerts_cache[pair_name].append([alert_id, alert_price])
+if msgspec is not None:
+    class BookTickerData(msgspec.Struct):  # Only the fields used by the bot are decoded, the others are skipped
+        s: str
+        a: float
+        u: int = 0
 
+    class BookTickerFrame(msgspec.Struct):
+        data: BookTickerData = None
 
-async def clean_pair_metadata_if_needed(base_currency: str, quote_currency: str):  # If the deleted alert was the last one in a certain pair, we need to delete that pair from the dictionaries.
-    pair_name = f"{base_currency}{quote_currency}"
-    
-    specific_pair_remaining_alerts = active_alerts_cache.get(pair_name, [])
+    bookticker_frame_decoder = msgspec.json.Decoder(BookTickerFrame, strict=False)  # "strict=False" allows to convert the price string into a float while decoding
 
-    if not specific_pair_remaining_alerts:
-        pairs_metadata.pop(pair_name, None)
-        last_known_prices.pop(pair_name, None)
-        active_alerts_cache.pop(pair_name, None)
 
-        await trigger_websocket_restart()  # Allows to stop following pairs that are no longer useful
+def decode_frame_with_msgspec(websocket_message: str):
+    price_data = bookticker_frame_decoder.decode(websocket_message).data
+    if price_data is None:
+        return None
 
+    return sys.intern(price_data.s), price_data.a, price_data.u
 
-async def run_websocket_listener():
-    global is_websocket_dead
 
-    while True:
-        try:
-            pairs_to_check = list(pairs_metadata.keys())
+def decode_frame_with_raw_extractor(websocket_message: str):
+    # Only extracts the two fields we need, without parsing the rest of the message
+    pair_name_start = websocket_message.find(RAW_PAIR_NAME_PREFIX)
+    if pair_name_start == -1:
+        return None
 
-            if not pairs_to_check:
-                await asyncio.sleep(1)
-                continue
-            
-            websocket_stream_path = BINANCE_WEBSOCKET_PAIRS_DELIMITER.join(f"{pair_name.lower()}{BINANCE_BOOKTICKER_STREAM_NAME}" for pair_name in pairs_to_check)
-            full_websocket_url = f"{BINANCE_STREAMS_WEBSOCKET_URL}{websocket_stream_path}"
-            
-            async with websockets.connect(full_websocket_url, ping_interval=PING_SECONDS_DELAY, ping_timeout=PONG_SECONDS_TIMEOUT) as websocket:
-                async for pair_websocket_message in websocket:
-                    is_websocket_dead = False
-
-                    json_data = json.loads(pair_websocket_message)
-                    if "data" not in json_data: continue  # Binance can send messages that do not contain a "data" field
-                    
-                    price_data = json_data[PRICE_DATA_KEY_DICT]
-                    pair_name = price_data[PAIR_NAME_KEY_DICT]
-                    current_ask_price = float(price_data[ASK_PRICE_KEY_DICT])
-                    
-                    if pair_name not in pairs_metadata: 
-                        # Important to check, because if the user manually deletes an alert (and therefore it is no longer present in "pairs_metadata"),
-                        # but a message is sent at the same time for this pair, then this could cause a KeyError (accessing a key that is not present in the dictionary).
-                        continue
- 
-                    if pair_name not in last_known_prices:  # When we receive a price for the first time for this specific pair
-                        last_known_prices[pair_name] = current_ask_price
-                        continue
-
-                    previous_ask_price = last_known_prices[pair_name]
-                    last_known_prices[pair_name] = current_ask_price
-                    
-                    base_currency, quote_currency = pairs_metadata[pair_name]
-
-                    specific_pair_alerts = active_alerts_cache.get(pair_name, [])
-
-                    for alert_infos in specific_pair_alerts[:]:
-                        # It is very important to make a copy of the "specific_pair_alerts" dictionary to browse through it,
-                        # as we may need to modify this dictionary and thus cause a RuntimeError error
-                        alert_id, float_alert_price = alert_infos
-
-                        is_price_crossed_down = previous_ask_price >= float_alert_price >= current_ask_price
-                        is_price_crossed_up = previous_ask_price <= float_alert_price <= current_ask_price
-
-                        if is_price_crossed_down or is_price_crossed_up:
-                            emoji_direction = CROSS_UP_EMOJI if is_price_crossed_up else CROSS_DOWN_EMOJI
-
-                            await send_inbox_message(f"<b>An alert has been triggered!</b>\n\n"
-                                                     f"{base_currency} : {format_alert_price(float_alert_price)} {quote_currency} ({base_currency}/{quote_currency}) {emoji_direction}",
-                                                     "INFO")
-                            
-                            if alert_infos in specific_pair_alerts:  # Important to check again in case it has already been deleted manually
-                                database_cursor.execute(f"""
-                                    DELETE FROM {DATABASE_NAME}
-                                    WHERE {ALERT_ID_DATABASE_FIELD} = ?
-                                """, (alert_id,))
-                                database_connection.commit()
-
-                                specific_pair_alerts.remove(alert_infos)
-
-                                await clean_pair_metadata_if_needed(base_currency, quote_currency)
-                                await refresh_dashboard(MY_USER_ID)
-        
-        except asyncio.CancelledError:  # Thrown when the websocket is intentionally restarted (e.g. if the added alert contains a new pair)
-            break
+    pair_name_start += len(RAW_PAIR_NAME_PREFIX)
+    pair_name_end = websocket_message.index('"', pair_name_start)
 
-        except Exception:
-            is_websocket_dead = True
+    ask_price_start = websocket_message.find(RAW_ASK_PRICE_PREFIX, pair_name_end)  # Binance sends the ask price after the pair name
+    if ask_price_start == -1:
+        ask_price_start = websocket_message.index(RAW_ASK_PRICE_PREFIX)
 
-            await send_inbox_message(traceback.format_exc(), level="ERROR")
-            await asyncio.sleep(1)
+    ask_price_start += len(RAW_ASK_PRICE_PREFIX)
+    ask_price_end = websocket_message.index('"', ask_price_start)
 
+    update_id_start = websocket_message.find(RAW_UPDATE_ID_PREFIX)  # Sent before the pair name
+    if update_id_start == -1:
+        update_id = 0
+    else:
+        update_id_start += len(RAW_UPDATE_ID_PREFIX)
+        update_id = int(websocket_message[update_id_start:websocket_message.index(",", update_id_start)])
 
-@message_dispatcher.message(Command(START_BOT_COMMAND_NAME), is_owner_filter)
-async def command_start(user_message: types.Message):
-    await user_message.delete()
-    await refresh_dashboard(user_message.chat.id)
+    return sys.intern(websocket_message[pair_name_start:pair_name_end]), float(websocket_message[ask_price_start:ask_price_end]), update_id
 
 
-def is_pair_name_correct(pair_name: str) -> bool:
-    split_pair_name = pair_name.split(PAIR_ARGS_SEPARATOR)
-    if len(split_pair_name) == 2:
-        return split_pair_name[0] != "" and split_pair_name[1] != ""
-    return False
+FRAME_DECODERS = {"json": decode_frame_with_json, "raw": decode_frame_with_raw_extractor}
+if orjson is not None:
+    FRAME_DECODERS["orjson"] = decode_frame_with_orjson
+if msgspec is not None:
+    FRAME_DECODERS["msgspec"] = decode_frame_with_msgspec
 
 
-def is_currency_name_correct(currency_name: str) -> bool:
-    return currency_name.isalpha()
+def get_frame_decoder():
+    if BINANCE_FRAME_DECODER in FRAME_DECODERS:
+        return FRAME_DECODERS[BINANCE_FRAME_DECODER]
 
+    if BINANCE_FRAME_DECODER:
+        logging.warning(f"The \"{BINANCE_FRAME_DECODER}\" decoder is not available, the fastest installed one is used instead")
 
-def is_pair_price_correct(pair_price_string: str) -> bool:
-    try:
-        return float(pair_price_string) > 0
-    except ValueError:
-        return False
+    for decoder_name in ("msgspec", "orjson", "json"):
+        if decoder_name in FRAME_DECODERS:
+            return FRAME_DECODERS[decoder_name]
 
 
-@message_dispatcher.message(Command(ADD_ALERT_COMMAND_NAME), is_owner_filter)
-async def command_add(user_message: types.Message):
-    try:
-        command_args = user_message.text.split()[1:]
-        if len(command_args) != 2: raise ValueError
+decode_binance_frame = get_frame_decoder()
 
-        raw_pair = command_args[0].upper()
-        price_input = command_args[1]
 
-        if not is_pair_name_correct(raw_pair):
-            raise ValueError
+def get_tick_size_decimals(tick_size_string: str) -> int:  # "0.01000000" -> 2
+    return len(tick_size_string.rstrip("0").partition(".")[2])
 
-        base_currency, quote_currency = raw_pair.split(PAIR_ARGS_SEPARATOR)
 
-        if not is_currency_name_correct(base_currency) or not is_currency_name_correct(quote_currency) or not is_pair_price_correct(price_input):
-            raise ValueError
-        
-        float_alert_price = float(price_input)
-
-        database_cursor.execute(f"""
-            INSERT INTO {DATABASE_NAME} 
-            ({BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}, {ALERT_PRICE_DATABASE_FIELD}, {CREATED_AT_DATABASE_FIELD}) 
-            VALUES (?, ?, ?, ?)
-        """, (base_currency, quote_currency, float_alert_price, datetime.datetime.now().isoformat()))
-        database_connection.commit()
-        
-        new_alert_id = database_cursor.lastrowid  # Allows to immediately retrieve the ID that was just created by the last "INSERT" statement
+def parse_exchange_info(exchange_info_bytes: bytes) -> dict:
+    # Only keeps what the bot needs from the exchangeInfo of Binance (several MB), in the format of "symbols_registry"
+    parsed_symbols_registry = {}
 
-        await user_message.delete()
-        await refresh_dashboard(user_message.chat.id)
+    for symbol_infos in json.loads(exchange_info_bytes)[EXCHANGE_INFO_SYMBOLS_KEY_DICT]:
+        if symbol_infos.get(EXCHANGE_INFO_STATUS_KEY_DICT) != EXCHANGE_INFO_TRADING_STATUS:
+            continue
 
-        pair_name = f"{base_currency}{quote_currency}"
+        tick_size_string = next((symbol_filter[EXCHANGE_INFO_TICK_SIZE_KEY_DICT] for symbol_filter in symbol_infos.get(EXCHANGE_INFO_FILTERS_KEY_DICT, ())
+                                 if symbol_filter.get(EXCHANGE_INFO_FILTER_TYPE_KEY_DICT) == EXCHANGE_INFO_PRICE_FILTER_TYPE), "0")
 
-        if pair_name not in active_alerts_cache:
-            active_alerts_cache[pair_name] = []
+        parsed_symbols_registry[symbol_infos[EXCHANGE_INFO_SYMBOL_KEY_DICT]] = [
+            symbol_infos[EXCHANGE_INFO_BASE_ASSET_KEY_DICT],
+            symbol_infos[EXCHANGE_INFO_QUOTE_ASSET_KEY_DICT],
+            float(tick_size_string),
+            get_tick_size_decimals(tick_size_string)
+        ]
 
-        active_alerts_cache[pair_name].append([new_alert_id, float_alert_price])
+    return parsed_symbols_registry
 
-        if pair_name not in pairs_metadata:
-            pairs_metadata[pair_name] = [base_currency, quote_currency]
-            await trigger_websocket_restart()
 
-    except ValueError:
-        bot_answer = await user_message.answer(SYNTAX_MESSAGE, parse_mode="Markdown")
-        await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
-        try:
-            await user_message.delete()
-            await bot_answer.delete()
-        except:
-            pass
+def read_symbols_registry_cache():
+    # Returns the cached registry and the time it was downloaded, or None if there is no usable cache
+    try:
+        with open(SYMBOLS_REGISTRY_FILENAME, "rb") as registry_file:
+            registry_cache = json.loads(registry_file.read())
+        return registry_cache["symbols"], registry_cache["updated_at"]
 
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
 
-@message_dispatcher.callback_query(F.data.startswith(ASK_ALERT_DELETION_PREFIX_CALLBACK), is_owner_filter)
-async def callback_ask_delete(callback: types.CallbackQuery):
-    alert_id = int(callback.data.split(ALERT_CALLBACK_SEPARATOR)[ALERT_ID_INDEX])
-    alert_infos_query_result = database_cursor.execute(f"""
-        SELECT {BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}, {ALERT_PRICE_DATABASE_FIELD}
-        FROM {DATABASE_NAME}
-        WHERE {ALERT_ID_DATABASE_FIELD} = ?
-    """, (alert_id,))
-    alert_infos = alert_infos_query_result.fetchone()
-    
-    if not alert_infos:
-        await callback.answer(ALERT_ALREADY_REMOVED_MESSAGE)
-        await refresh_dashboard(callback.message.chat.id)
-        return
 
-    base_currency, quote_currency, alert_price = alert_infos
-    confirm_deletion_text = f"{TRASH_EMOJI} Are you sure you want to remove the alert for {base_currency} at {format_alert_price(alert_price)} {quote_currency} ? ({base_currency}/{quote_currency})"
-    
-    confirm_alert_deletion_layout = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text=CANCEL_TEXT_BUTTON, callback_data=BACK_TO_DASHBOARD_CALLBACK),
-            InlineKeyboardButton(text=CONFIRM_TEXT_BUTTON, callback_data=f"{CONFIRM_ALERT_DELETION_PREFIX_CALLBACK}{alert_id}"),
-        ]
-    ])
-    
-    await callback.message.edit_text(confirm_deletion_text, reply_markup=confirm_alert_deletion_layout)
-    await callback.answer()
+def write_symbols_registry_cache(cached_symbols_registry: dict, updated_at: float):
+    temporary_filename = f"{SYMBOLS_REGISTRY_FILENAME}.tmp"
+    with open(temporary_filename, "w") as registry_file:
+        json.dump({"updated_at": updated_at, "symbols": cached_symbols_registry}, registry_file)
 
+    os.replace(temporary_filename, SYMBOLS_REGISTRY_FILENAME)
 
-@message_dispatcher.callback_query(F.data == BACK_TO_DASHBOARD_CALLBACK, is_owner_filter)
+
+def read_file_bytes(filename: str) -> bytes:
+    with open(filename, "rb") as read_file:
+        return read_file.read()
+
+
+def set_symbols_registry(new_symbols_registry: dict, updated_at: float):
+    global symbols_registry, symbols_registry_updated_at
+    symbols_registry = {sys.intern(pair_name): symbol_infos for pair_name, symbol_infos in new_symbols_registry.items()}  # Same objects as the decoded pair names
+    symbols_registry_updated_at = updated_at
+
+    request_websocket_subscriptions_update()  # Pairs may have been listed or delisted
+
+    for commands_queue in feed_workers_commands_queues:
+        commands_queue.put((SET_SYMBOLS_REGISTRY_FEED_COMMAND, new_symbols_registry, updated_at))
+
+
+async def download_exchange_info() -> bytes:
+    if not BINANCE_EXCHANGE_INFO_URL.startswith(("http://", "https://")):  # Local stand-in
+        return await asyncio.get_running_loop().run_in_executor(disk_io_executor, read_file_bytes, BINANCE_EXCHANGE_INFO_URL)
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=SYMBOLS_REGISTRY_REQUEST_SECONDS_TIMEOUT)) as http_session:
+        async with http_session.get(BINANCE_EXCHANGE_INFO_URL) as exchange_info_response:
+            exchange_info_response.raise_for_status()
+            return await exchange_info_response.read()
+
+
+async def refresh_symbols_registry():
+    exchange_info_bytes = await download_exchange_info()
+    new_symbols_registry = await asyncio.get_running_loop().run_in_executor(None, parse_exchange_info, exchange_info_bytes)  # Decoded outside of the event loop
+    if not new_symbols_registry:  # Would make every pair unlisted
+        raise ValueError("The exchangeInfo of Binance does not contain any trading symbol")
+
+    updated_at = time.time()
+    set_symbols_registry(new_symbols_registry, updated_at)
+    disk_io_executor.submit(write_symbols_registry_cache, new_symbols_registry, updated_at)
+
+    await report_unlisted_pairs()
+
+
+async def load_symbols_registry():
+    # The cache is used even when outdated, the background refresh replacing it soon after
+    cached_registry = await asyncio.get_running_loop().run_in_executor(disk_io_executor, read_symbols_registry_cache)
+    if cached_registry is not None:
+        set_symbols_registry(*cached_registry)
+        return
+
+    try:
+        await refresh_symbols_registry()
+    except Exception:  # Every pair is accepted until the registry can be downloaded
+        await send_inbox_message(traceback.format_exc(), level="ERROR")
+
+
+async def symbols_registry_loop():
+    while True:
+        await asyncio.sleep(max(symbols_registry_updated_at + SYMBOLS_REGISTRY_REFRESH_SECONDS - time.time(), 0))
+
+        try:
+            await refresh_symbols_registry()
+        except Exception:
+            await send_inbox_message(traceback.format_exc(), level="ERROR")
+            await asyncio.sleep(SYMBOLS_REGISTRY_RETRY_SECONDS)
+
+
+def is_pair_listed(pair_name: str) -> bool:
+    return not symbols_registry or pair_name in symbols_registry  # Every pair is accepted until the registry is loaded
+
+
+def get_unlisted_pair_names() -> set:
+    unlisted_pair_names = set()
+    for pair_name in pairs_metadata:
+        if pair_name in synthetic_pairs:
+            unlisted_pair_names.update(leg_pair_name for leg_pair_name, _ in synthetic_pairs[pair_name][SYNTHETIC_PAIR_LEGS_INDEX] if not is_pair_listed(leg_pair_name))
+        elif not is_pair_listed(pair_name):
+            unlisted_pair_names.add(pair_name)
+
+    return unlisted_pair_names
+
+
+async def report_unlisted_pairs():
+    # E.g. alerts added before the registry existed, or pairs delisted since then: they are kept, but not subscribed
+    unlisted_pair_names = get_unlisted_pair_names()
+    newly_unlisted_pair_names = unlisted_pair_names - reported_unlisted_pair_names
+
+    reported_unlisted_pair_names.clear()
+    reported_unlisted_pair_names.update(unlisted_pair_names)
+
+    if newly_unlisted_pair_names:
+        await send_inbox_message(f"These pairs are not listed on Binance, so they are not followed: {', '.join(sorted(newly_unlisted_pair_names))}", level="ERROR")
+
+
+def get_pair_stream_name(pair_name: str) -> str:
+    return f"{pair_name.lower()}{BINANCE_BOOKTICKER_STREAM_NAME}"
+
+
+def request_websocket_subscriptions_update():
+    # Several requests made in a row (e.g. many alerts added at once) are merged into a single update by the subscriptions manager
+    websocket_subscriptions_event.set()
+
+
+async def send_websocket_control_message(websocket, method: str, streams: list):
+    global next_control_message_id
+
+    for chunk_start in range(0, len(streams), MAX_STREAMS_PER_CONTROL_MESSAGE):
+        next_control_message_id += 1
+        await websocket.send(json.dumps({
+            "method": method,
+            "params": streams[chunk_start:chunk_start + MAX_STREAMS_PER_CONTROL_MESSAGE],
+            "id": next_control_message_id
+        }))
+        await asyncio.sleep(CONTROL_MESSAGES_SECONDS_DELAY)
+
+
+def get_desired_streams() -> set:
+    desired_streams = set()
+    for pair_name in pairs_metadata:
+        # Unlisted pairs are never subscribed: Binance would reject the whole subscription message, or close the connection
+        if pair_name in synthetic_pairs:  # Followed through its legs, which are subscribed once however many synthetic pairs share them
+            desired_streams.update(get_pair_stream_name(leg_pair_name) for leg_pair_name, _ in synthetic_pairs[pair_name][SYNTHETIC_PAIR_LEGS_INDEX] if is_pair_listed(leg_pair_name))
+        elif is_pair_listed(pair_name):
+            desired_streams.add(get_pair_stream_name(pair_name))
+
+    return desired_streams
+
+
+def assign_streams_to_shards():
+    global next_websocket_shard_id
+
+    desired_streams = get_desired_streams()
+
+    assigned_streams = set()
+    for shard_id, shard_streams in websocket_shards_streams.items():
+        shard_streams &= desired_streams  # Streams of pairs that no longer have alerts
+        assigned_streams |= shard_streams
+
+    streams_to_assign = sorted(desired_streams - assigned_streams)
+
+    for shard_id, shard_streams in websocket_shards_streams.items():  # We first fill the existing connections
+        while streams_to_assign and len(shard_streams) < MAX_STREAMS_PER_WEBSOCKET_CONNECTION:
+            shard_streams.add(streams_to_assign.pop())
+
+    while streams_to_assign:  # Then we open new connections for the remaining streams
+        new_shard_streams = set()
+        while streams_to_assign and len(new_shard_streams) < MAX_STREAMS_PER_WEBSOCKET_CONNECTION:
+            new_shard_streams.add(streams_to_assign.pop())
+
+        websocket_shards_streams[next_websocket_shard_id] = new_shard_streams
+        next_websocket_shard_id += 1
+
+
+async def sync_websocket_subscriptions():
+    assign_streams_to_shards()
+
+    for shard_id in list(websocket_shards_streams):
+        shard_streams = websocket_shards_streams[shard_id]
+
+        if not shard_streams:  # The connections are no longer useful
+            websocket_shards_streams.pop(shard_id)
+            for leg_id in range(len(BINANCE_STREAMS_WEBSOCKET_URLS)):
+                websocket_shards_subscribed_streams.pop((shard_id, leg_id), None)
+                websocket_shards_tasks.pop((shard_id, leg_id)).cancel()
+            continue
+
+        for leg_id in range(len(BINANCE_STREAMS_WEBSOCKET_URLS)):
+            await sync_websocket_connection_subscriptions(shard_id, leg_id, shard_streams)
+
+
+async def sync_websocket_connection_subscriptions(shard_id: int, leg_id: int, shard_streams: set):
+    connection_key = (shard_id, leg_id)
+
+    if connection_key not in websocket_shards_tasks:
+        websocket_shards_subscribed_streams[connection_key] = set()
+        websocket_shards_tasks[connection_key] = asyncio.create_task(run_websocket_listener(shard_id, leg_id))
+        return  # The listener subscribes to its streams once it is connected
+
+    websocket = websocket_shards_connections.get(connection_key)
+    if websocket is None:  # The leg is (re)connecting, and will subscribe to its streams once connected
+        return
+
+    subscribed_streams = websocket_shards_subscribed_streams[connection_key]
+    streams_to_unsubscribe = sorted(subscribed_streams - shard_streams)
+    streams_to_subscribe = sorted(shard_streams - subscribed_streams)
+
+    try:
+        if streams_to_unsubscribe:
+            await send_websocket_control_message(websocket, BINANCE_UNSUBSCRIBE_METHOD, streams_to_unsubscribe)
+            subscribed_streams.difference_update(streams_to_unsubscribe)
+
+        if streams_to_subscribe:
+            await send_websocket_control_message(websocket, BINANCE_SUBSCRIBE_METHOD, streams_to_subscribe)
+            subscribed_streams.update(streams_to_subscribe)
+
+    except websockets.ConnectionClosed:  # The listener will reconnect and request a new synchronization
+        pass
+
+
+async def websocket_subscriptions_manager():
+    # Only this task sends control messages, so that the rate limit of each connection can easily be respected
+    while True:
+        await websocket_subscriptions_event.wait()
+        websocket_subscriptions_event.clear()
+
+        try:
+            await sync_websocket_subscriptions()
+        except Exception:
+            await send_inbox_message(traceback.format_exc(), level="ERROR")
+
+
+def add_alert_to_cache(pair_name: str, alert_id: int, alert_price: float):
+    # Each pair holds two parallel arrays sorted by price (8 bytes per value, instead of a Python object per value),
+    # so that a tick only needs two binary searches to find the crossed alerts
+    if pair_name not in active_alerts_cache:
+        active_alerts_cache[pair_name] = [array("d"), array("q"), 0]
+
+    sorted_alert_prices, sorted_alert_ids, _ = active_alerts_cache[pair_name]
+
+    insertion_index = bisect.bisect_right(sorted_alert_prices, alert_price)
+    sorted_alert_prices.insert(insertion_index, alert_price)
+    sorted_alert_ids.insert(insertion_index, alert_id)
+
+
+def compact_pair_alerts_cache(pair_name: str):
+    sorted_alert_prices, sorted_alert_ids, _ = active_alerts_cache[pair_name]
+
+    remaining_alert_indexes = [alert_index for alert_index, alert_id in enumerate(sorted_alert_ids) if alert_id != TOMBSTONE_ALERT_ID]
+
+    active_alerts_cache[pair_name] = [
+        array("d", (sorted_alert_prices[alert_index] for alert_index in remaining_alert_indexes)),
+        array("q", (sorted_alert_ids[alert_index] for alert_index in remaining_alert_indexes)),
+        0
+    ]
+
+
+def remove_alert_from_cache(pair_name: str, alert_id: int, alert_price: float) -> bool:
+    if pair_name not in active_alerts_cache:
+        return False
+
+    pair_alerts_cache = active_alerts_cache[pair_name]
+    sorted_alert_prices, sorted_alert_ids, _ = pair_alerts_cache
+
+    # Several alerts can share the same price, so we only browse the (usually tiny) slice of alerts having exactly this price
+    start_index = bisect.bisect_left(sorted_alert_prices, alert_price)
+    end_index = bisect.bisect_right(sorted_alert_prices, alert_price, start_index)
+
+    for alert_index in range(start_index, end_index):
+        if sorted_alert_ids[alert_index] == alert_id:
+            # The alert is only marked as removed, because removing a value from the middle of a big array moves all the values after it
+            sorted_alert_ids[alert_index] = TOMBSTONE_ALERT_ID
+            pair_alerts_cache[ACTIVE_ALERTS_CACHE_TOMBSTONES_INDEX] += 1
+
+            if pair_alerts_cache[ACTIVE_ALERTS_CACHE_TOMBSTONES_INDEX] > max(MIN_TOMBSTONES_BEFORE_COMPACTION, len(sorted_alert_ids) // 4):
+                compact_pair_alerts_cache(pair_name)
+
+            return True
+
+    return False  # The alert has already been removed (e.g. triggered and manually deleted at the same time)
+
+
+def get_crossed_alerts_bounds(pair_name: str, previous_ask_price: float, current_ask_price: float) -> tuple:
+    sorted_alert_prices = active_alerts_cache[pair_name][ACTIVE_ALERTS_CACHE_PRICES_INDEX]
+
+    if previous_ask_price <= current_ask_price:
+        low_price, high_price = previous_ask_price, current_ask_price
+    else:
+        low_price, high_price = current_ask_price, previous_ask_price
+
+    # Bounds are inclusive on both sides, like the "previous >= alert >= current" comparisons used before the index existed
+    start_index = bisect.bisect_left(sorted_alert_prices, low_price)
+    end_index = bisect.bisect_right(sorted_alert_prices, high_price, start_index)
+
+    return start_index, end_index
+
+
+def add_rolling_alert_to_cache(pair_name: str, alert_id: int, alert_type: str, alert_percent: float, window_seconds: int, saved_anchor_price: float = 0.0):
+    if pair_name not in pairs_rolling_alerts:
+        pairs_rolling_alerts[pair_name] = [{}, [], -math.inf]
+
+    pair_rolling_alerts = pairs_rolling_alerts[pair_name]
+    alert_fraction = (alert_percent or 0) / 100  # Breakouts have no percentage
+
+    if alert_type == TRAILING_STOP_ALERT_TYPE:
+        # The trailing stops form a stack of groups sharing the same anchor (highest price since their creation), the most recent group on top.
+        # A new alert starts from the current price, which is never above the anchors of the older groups.
+        trailing_stop_groups = pair_rolling_alerts[PAIR_TRAILING_STOP_GROUPS_INDEX]
+
+        if saved_anchor_price:  # Loaded after a restart: its group can be anywhere in the stack, whose anchors decrease from the bottom
+            group_index, end_index = 0, len(trailing_stop_groups)
+            while group_index < end_index:  # First group whose anchor is not above the saved one ("bisect" only accepts a key since Python 3.10)
+                middle_index = (group_index + end_index) // 2
+                if trailing_stop_groups[middle_index][TRAILING_STOP_GROUP_ANCHOR_INDEX] > saved_anchor_price:
+                    group_index = middle_index + 1
+                else:
+                    end_index = middle_index
+
+            if group_index < len(trailing_stop_groups) and trailing_stop_groups[group_index][TRAILING_STOP_GROUP_ANCHOR_INDEX] == saved_anchor_price:
+                bisect.insort(trailing_stop_groups[group_index][TRAILING_STOP_GROUP_ALERTS_INDEX], (alert_fraction, alert_id))
+            else:
+                trailing_stop_groups.insert(group_index, [saved_anchor_price, [(alert_fraction, alert_id)]])
+
+            update_highest_stop_price(pair_rolling_alerts)
+            return
+
+        anchor_price = last_known_prices.get(pair_name, 0.0)  # 0 until the first price, which then becomes the anchor
+        raised_trailing_stops_pairs.add(pair_name)  # So that the anchor of the new alert is saved
+
+        if trailing_stop_groups and anchor_price > trailing_stop_groups[-1][TRAILING_STOP_GROUP_ANCHOR_INDEX]:
+            raise_trailing_stops_anchor(pair_name, pair_rolling_alerts, anchor_price)
+
+        if trailing_stop_groups and anchor_price == trailing_stop_groups[-1][TRAILING_STOP_GROUP_ANCHOR_INDEX]:
+            bisect.insort(trailing_stop_groups[-1][TRAILING_STOP_GROUP_ALERTS_INDEX], (alert_fraction, alert_id))
+        else:
+            trailing_stop_groups.append([anchor_price, [(alert_fraction, alert_id)]])
+
+        update_highest_stop_price(pair_rolling_alerts)
+        return
+
+    rolling_windows = pair_rolling_alerts[PAIR_ROLLING_WINDOWS_INDEX]
+    if window_seconds not in rolling_windows:  # The alerts of a pair watching the same duration share the same window
+        rolling_windows[window_seconds] = [max(1, window_seconds // ROLLING_WINDOW_MAX_BUCKETS), deque(), deque(), None, [], [], set()]
+
+    rolling_window = rolling_windows[window_seconds]
+
+    if alert_type in (MOVE_ALERT_TYPE, RISE_ALERT_TYPE):
+        bisect.insort(rolling_window[ROLLING_WINDOW_RISE_ALERTS_INDEX], (alert_fraction, alert_id))
+    if alert_type in (MOVE_ALERT_TYPE, DROP_ALERT_TYPE):
+        bisect.insort(rolling_window[ROLLING_WINDOW_DROP_ALERTS_INDEX], (alert_fraction, alert_id))
+    if alert_type == BREAKOUT_ALERT_TYPE:
+        rolling_window[ROLLING_WINDOW_BREAKOUT_ALERTS_INDEX].add(alert_id)
+
+
+def is_rolling_window_empty(rolling_window: list) -> bool:
+    return not (rolling_window[ROLLING_WINDOW_RISE_ALERTS_INDEX] or rolling_window[ROLLING_WINDOW_DROP_ALERTS_INDEX] or rolling_window[ROLLING_WINDOW_BREAKOUT_ALERTS_INDEX])
+
+
+def remove_empty_rolling_alerts(pair_name: str):
+    pair_rolling_alerts = pairs_rolling_alerts[pair_name]
+    rolling_windows = pair_rolling_alerts[PAIR_ROLLING_WINDOWS_INDEX]
+
+    for window_seconds in [window_seconds for window_seconds, rolling_window in rolling_windows.items() if is_rolling_window_empty(rolling_window)]:
+        del rolling_windows[window_seconds]
+
+    pair_rolling_alerts[PAIR_TRAILING_STOP_GROUPS_INDEX][:] = [trailing_stop_group for trailing_stop_group in pair_rolling_alerts[PAIR_TRAILING_STOP_GROUPS_INDEX]
+                                                               if trailing_stop_group[TRAILING_STOP_GROUP_ALERTS_INDEX]]
+    update_highest_stop_price(pair_rolling_alerts)
+
+    if not rolling_windows and not pair_rolling_alerts[PAIR_TRAILING_STOP_GROUPS_INDEX]:
+        del pairs_rolling_alerts[pair_name]
+
+
+def remove_rolling_alert_from_cache(pair_name: str, alert_id: int, alert_type: str, window_seconds: int):
+    if pair_name not in pairs_rolling_alerts:
+        return
+
+    pair_rolling_alerts = pairs_rolling_alerts[pair_name]
+
+    if alert_type == TRAILING_STOP_ALERT_TYPE:
+        for trailing_stop_group in pair_rolling_alerts[PAIR_TRAILING_STOP_GROUPS_INDEX]:
+            trailing_stop_group[TRAILING_STOP_GROUP_ALERTS_INDEX][:] = [trailing_stop for trailing_stop in trailing_stop_group[TRAILING_STOP_GROUP_ALERTS_INDEX] if trailing_stop[1] != alert_id]
+
+    elif window_seconds in pair_rolling_alerts[PAIR_ROLLING_WINDOWS_INDEX]:
+        rolling_window = pair_rolling_alerts[PAIR_ROLLING_WINDOWS_INDEX][window_seconds]
+        for alerts_index in (ROLLING_WINDOW_RISE_ALERTS_INDEX, ROLLING_WINDOW_DROP_ALERTS_INDEX):
+            rolling_window[alerts_index][:] = [rolling_alert for rolling_alert in rolling_window[alerts_index] if rolling_alert[1] != alert_id]
+        rolling_window[ROLLING_WINDOW_BREAKOUT_ALERTS_INDEX].discard(alert_id)
+
+    remove_empty_rolling_alerts(pair_name)
+
+
+def update_highest_stop_price(pair_rolling_alerts: list):
+    # A tick below this price is the only one that can trigger a trailing stop, so the other ticks cost a single comparison
+    pair_rolling_alerts[PAIR_HIGHEST_STOP_PRICE_INDEX] = max(
+        (anchor_price * (1 - trailing_stops[0][0]) for anchor_price, trailing_stops in pair_rolling_alerts[PAIR_TRAILING_STOP_GROUPS_INDEX] if trailing_stops),
+        default=-math.inf
+    )
+
+
+def raise_trailing_stops_anchor(pair_name: str, pair_rolling_alerts: list, current_ask_price: float):
+    # Every group whose anchor is below the new price now shares this anchor: they are merged (monotonic stack, amortized O(1) per tick)
+    trailing_stop_groups = pair_rolling_alerts[PAIR_TRAILING_STOP_GROUPS_INDEX]
+    raised_trailing_stops_pairs.add(pair_name)  # Saved later, rather than at each new highest price
+
+    merged_trailing_stops = []
+    while trailing_stop_groups and trailing_stop_groups[-1][TRAILING_STOP_GROUP_ANCHOR_INDEX] <= current_ask_price:
+        merged_trailing_stops.extend(trailing_stop_groups.pop()[TRAILING_STOP_GROUP_ALERTS_INDEX])
+
+    merged_trailing_stops.sort()
+    trailing_stop_groups.append([current_ask_price, merged_trailing_stops])
+    update_highest_stop_price(pair_rolling_alerts)
+
+
+def pop_raised_trailing_stops_anchors() -> list:
+    # Returns the (anchor, alert ID) of every trailing stop of the pairs whose anchors rose since the last call
+    raised_trailing_stops_anchors = [
+        (anchor_price, alert_id)
+        for pair_name in raised_trailing_stops_pairs if pair_name in pairs_rolling_alerts
+        for anchor_price, trailing_stops in pairs_rolling_alerts[pair_name][PAIR_TRAILING_STOP_GROUPS_INDEX] if anchor_price
+        for _, alert_id in trailing_stops
+    ]
+    raised_trailing_stops_pairs.clear()
+    return raised_trailing_stops_anchors
+
+
+async def trailing_stops_anchors_loop():
+    while True:
+        await asyncio.sleep(TRAILING_STOPS_ANCHORS_SAVING_SECONDS)
+
+        raised_trailing_stops_anchors = pop_raised_trailing_stops_anchors()
+        if not raised_trailing_stops_anchors:
+            continue
+
+        if feed_worker_id is not None:  # Only the coordinator process talks to the database
+            feed_workers_events_queue.put((TRAILING_STOPS_ANCHORS_FEED_EVENT, feed_worker_id, raised_trailing_stops_anchors))
+        else:
+            schedule_trailing_stops_anchors_saving(raised_trailing_stops_anchors)
+
+
+def push_rolling_window_price(rolling_prices: deque, price_bucket: int, current_ask_price: float, is_highest: bool):
+    # Monotonic deque: the prices that can no longer be the highest (or lowest) of the window are dropped, so the first one is always the extremum
+    if is_highest:
+        while rolling_prices and rolling_prices[-1][1] <= current_ask_price:
+            rolling_prices.pop()
+    else:
+        while rolling_prices and rolling_prices[-1][1] >= current_ask_price:
+            rolling_prices.pop()
+
+    if not rolling_prices or rolling_prices[-1][0] != price_bucket:  # Otherwise, the bucket already holds a better price
+        rolling_prices.append((price_bucket, current_ask_price))
+
+
+def process_rolling_alerts(pair_name: str, current_ask_price: float, tick_time: float) -> list:
+    # Returns the IDs of the triggered rolling alerts with their direction, the alerts being already removed from "pairs_rolling_alerts"
+    pair_rolling_alerts = pairs_rolling_alerts[pair_name]
+    triggered_rolling_alerts = []
+
+    for window_seconds, rolling_window in pair_rolling_alerts[PAIR_ROLLING_WINDOWS_INDEX].items():
+        bucket_seconds = rolling_window[ROLLING_WINDOW_BUCKET_SECONDS_INDEX]
+        highest_prices = rolling_window[ROLLING_WINDOW_HIGHEST_PRICES_INDEX]
+        lowest_prices = rolling_window[ROLLING_WINDOW_LOWEST_PRICES_INDEX]
+
+        price_bucket = int(tick_time // bucket_seconds)
+        oldest_kept_bucket = price_bucket - window_seconds // bucket_seconds
+        while highest_prices and highest_prices[0][0] < oldest_kept_bucket:
+            highest_prices.popleft()
+        while lowest_prices and lowest_prices[0][0] < oldest_kept_bucket:
+            lowest_prices.popleft()
+
+        if rolling_window[ROLLING_WINDOW_START_TIME_INDEX] is None:
+            rolling_window[ROLLING_WINDOW_START_TIME_INDEX] = tick_time
+
+        breakout_alert_ids = rolling_window[ROLLING_WINDOW_BREAKOUT_ALERTS_INDEX]
+        # A breakout compares the price to the window before it, so it is only checked once the whole window has been observed
+        if breakout_alert_ids and highest_prices and tick_time - rolling_window[ROLLING_WINDOW_START_TIME_INDEX] >= window_seconds:
+            if current_ask_price > highest_prices[0][1] or current_ask_price < lowest_prices[0][1]:
+                emoji_direction = CROSS_UP_EMOJI if current_ask_price > highest_prices[0][1] else CROSS_DOWN_EMOJI
+                triggered_rolling_alerts.extend((alert_id, emoji_direction) for alert_id in breakout_alert_ids)
+                breakout_alert_ids.clear()
+
+        push_rolling_window_price(highest_prices, price_bucket, current_ask_price, True)
+        push_rolling_window_price(lowest_prices, price_bucket, current_ask_price, False)
+
+        rise_alerts = rolling_window[ROLLING_WINDOW_RISE_ALERTS_INDEX]
+        if rise_alerts and current_ask_price >= lowest_prices[0][1] * (1 + rise_alerts[0][0]):
+            triggered_index = bisect.bisect_right(rise_alerts, (current_ask_price / lowest_prices[0][1] - 1, math.inf))
+            triggered_rolling_alerts.extend((alert_id, CROSS_UP_EMOJI) for _, alert_id in rise_alerts[:triggered_index])
+            del rise_alerts[:triggered_index]
+
+        drop_alerts = rolling_window[ROLLING_WINDOW_DROP_ALERTS_INDEX]
+        if drop_alerts and current_ask_price <= highest_prices[0][1] * (1 - drop_alerts[0][0]):
+            triggered_index = bisect.bisect_right(drop_alerts, (1 - current_ask_price / highest_prices[0][1], math.inf))
+            triggered_rolling_alerts.extend((alert_id, CROSS_DOWN_EMOJI) for _, alert_id in drop_alerts[:triggered_index])
+            del drop_alerts[:triggered_index]
+
+    trailing_stop_groups = pair_rolling_alerts[PAIR_TRAILING_STOP_GROUPS_INDEX]
+
+    if trailing_stop_groups and current_ask_price > trailing_stop_groups[-1][TRAILING_STOP_GROUP_ANCHOR_INDEX]:
+        raise_trailing_stops_anchor(pair_name, pair_rolling_alerts, current_ask_price)
+
+    if current_ask_price <= pair_rolling_alerts[PAIR_HIGHEST_STOP_PRICE_INDEX]:
+        for anchor_price, trailing_stops in trailing_stop_groups:
+            if trailing_stops and current_ask_price <= anchor_price * (1 - trailing_stops[0][0]):
+                triggered_index = bisect.bisect_right(trailing_stops, (1 - current_ask_price / anchor_price, math.inf))
+                triggered_rolling_alerts.extend((alert_id, CROSS_DOWN_EMOJI) for _, alert_id in trailing_stops[:triggered_index])
+                del trailing_stops[:triggered_index]
+
+    if triggered_rolling_alerts:
+        remove_empty_rolling_alerts(pair_name)
+
+    return triggered_rolling_alerts
+
+
+def trigger_rolling_alerts(pair_name: str, current_ask_price: float, tick_time: float) -> list:
+    triggered_alerts = []
+
+    for alert_id, emoji_direction in process_rolling_alerts(pair_name, current_ask_price, tick_time):
+        alert_infos = forget_alert(alert_id)
+        if alert_infos is None:  # A "move" alert is in both the rise and the drop lists, and can be reached by both at once
+            continue
+
+        user_id, base_currency, quote_currency, _, alert_type, alert_percent, window_seconds = alert_infos
+
+        if alert_type == MOVE_ALERT_TYPE:  # Still waiting in the list of the other direction
+            remove_rolling_alert_from_cache(pair_name, alert_id, alert_type, window_seconds)
+
+        triggered_alerts.append([alert_id, user_id, base_currency, quote_currency, current_ask_price, emoji_direction, get_alert_condition_text(alert_type, alert_percent, window_seconds)])
+
+    return triggered_alerts
+
+
+def register_alert(alert_id: int, user_id: int, base_currency: str, quote_currency: str, alert_price: float,
+                   alert_type: str = PRICE_ALERT_TYPE, alert_percent: float = None, window_seconds: int = None):
+    pair_name = sys.intern(f"{base_currency}{quote_currency}")  # Same object as the pair names decoded from the Binance messages
+
+    alerts_infos_by_id[alert_id] = [user_id, base_currency, quote_currency, alert_price, alert_type, alert_percent, window_seconds]
+    users_alert_ids.setdefault(user_id, set()).add(alert_id)
+
+    pair_subscribers = pairs_subscribers.setdefault(pair_name, {})
+    pair_subscribers[user_id] = pair_subscribers.get(user_id, 0) + 1
+
+    if feed_workers_commands_queues:  # Sharded mode: the sorted prices and the WebSocket of the pair live in the feed worker which owns it
+        feed_workers_commands_queues[get_pair_feed_worker_id(pair_name)].put((REGISTER_ALERT_FEED_COMMAND, alert_id, user_id, base_currency, quote_currency, alert_price,
+                                                                               alert_type, alert_percent, window_seconds))
+    elif alert_type == PRICE_ALERT_TYPE:
+        add_alert_to_cache(pair_name, alert_id, alert_price)
+    else:
+        active_alerts_cache.setdefault(pair_name, [array("d"), array("q"), 0])  # Every followed pair has sorted prices, even when empty
+        add_rolling_alert_to_cache(pair_name, alert_id, alert_type, alert_percent, window_seconds, alert_price)  # The price of a trailing stop is its saved anchor
+
+    if pair_name not in pairs_metadata:
+        if pair_name in synthetic_pairs:
+            forget_unused_synthetic_legs_prices()  # The legs that were no longer followed have outdated prices
+        pairs_metadata[pair_name] = [base_currency, quote_currency]
+        request_websocket_subscriptions_update()
+
+
+def forget_alert(alert_id: int):
+    # Removes the alert from every index except the sorted prices of its pair, which are handled by the callers
+    alert_infos = alerts_infos_by_id.pop(alert_id, None)
+
+    if alert_infos is not None:
+        user_id, base_currency, quote_currency = alert_infos[:3]
+        pair_name = f"{base_currency}{quote_currency}"
+
+        user_alert_ids = users_alert_ids.get(user_id)
+        if user_alert_ids is not None:
+            user_alert_ids.discard(alert_id)
+
+        pair_subscribers = pairs_subscribers.get(pair_name)
+        if pair_subscribers is not None:
+            pair_subscribers[user_id] -= 1
+            if pair_subscribers[user_id] == 0:
+                del pair_subscribers[user_id]
+            if not pair_subscribers:  # Nobody follows this pair anymore
+                del pairs_subscribers[pair_name]
+
+    return alert_infos
+
+
+def unregister_alert(alert_id: int):
+    alert_infos = forget_alert(alert_id)
+
+    if alert_infos is not None:
+        _, base_currency, quote_currency, alert_price, alert_type, _, window_seconds = alert_infos
+        pair_name = f"{base_currency}{quote_currency}"
+
+        if feed_workers_commands_queues:
+            feed_workers_commands_queues[get_pair_feed_worker_id(pair_name)].put((UNREGISTER_ALERT_FEED_COMMAND, alert_id))
+        elif alert_type == PRICE_ALERT_TYPE:
+            remove_alert_from_cache(pair_name, alert_id, alert_price)
+        else:
+            remove_rolling_alert_from_cache(pair_name, alert_id, alert_type, window_seconds)
+
+    return alert_infos  # None if the alert has already been removed
+
+
+async def load_pairs_metadata_from_database():
+    # The alerts are streamed by batches rather than loaded all at once, and come sorted by price,
+    # so that each one is appended at the end of the arrays of its pair instead of being inserted in the middle
+    alerts_cursor = await run_in_database_thread(open_all_alerts_cursor)
+
+    while alerts_batch := await run_in_database_thread(fetch_alerts_batch, alerts_cursor):
+        for alert_id, *alert_infos in alerts_batch:
+            register_alert(alert_id, *alert_infos)
+
+    for user_id, notification_chat_id in await run_in_database_thread(fetch_all_users_from_database):
+        users_notification_chat_ids[user_id] = notification_chat_id
+
+
+def clean_pair_metadata_if_needed(base_currency: str, quote_currency: str):  # If the deleted alert was the last one in a certain pair, we need to delete that pair from the dictionaries.
+    pair_name = f"{base_currency}{quote_currency}"
+    
+    if pair_name not in pairs_subscribers:  # No user has an alert on this pair anymore
+        pairs_metadata.pop(pair_name, None)
+        last_known_prices.pop(pair_name, None)
+        active_alerts_cache.pop(pair_name, None)
+        pairs_rolling_alerts.pop(pair_name, None)
+        pairs_last_update_ids.pop(pair_name, None)
+        release_pair_feed_worker(pair_name)
+
+        request_websocket_subscriptions_update()  # Allows to stop following pairs that are no longer useful
+
+
+def set_synthetic_pairs(synthetic_pairs_rows: list):
+    # Replaces the definitions of the synthetic pairs by the (base currency, quote currency, expression) rows
+    synthetic_pairs.clear()
+    legs_synthetic_pairs.clear()
+
+    for base_currency, quote_currency, synthetic_expression in synthetic_pairs_rows:
+        pair_name = sys.intern(f"{base_currency}{quote_currency}")
+        constant_factor, synthetic_legs = parse_synthetic_expression(synthetic_expression)
+        synthetic_pairs[pair_name] = [base_currency, quote_currency, synthetic_expression, constant_factor, synthetic_legs]
+
+        for leg_pair_name, _ in synthetic_legs:
+            leg_synthetic_pairs = legs_synthetic_pairs.setdefault(leg_pair_name, [])
+            if pair_name not in leg_synthetic_pairs:  # A leg can appear several times in an expression
+                leg_synthetic_pairs.append(pair_name)
+
+    forget_unused_synthetic_legs_prices()
+    request_websocket_subscriptions_update()
+
+    for commands_queue in feed_workers_commands_queues:  # Sharded mode: every feed worker may own synthetic pairs
+        commands_queue.put((SET_SYNTHETIC_PAIRS_FEED_COMMAND, synthetic_pairs_rows))
+
+
+def forget_unused_synthetic_legs_prices():
+    followed_legs = {
+        leg_pair_name
+        for pair_name in pairs_metadata if pair_name in synthetic_pairs
+        for leg_pair_name, _ in synthetic_pairs[pair_name][SYNTHETIC_PAIR_LEGS_INDEX]
+    }
+
+    for leg_pair_name in list(synthetic_legs_prices):
+        if leg_pair_name not in followed_legs:
+            del synthetic_legs_prices[leg_pair_name]
+
+    for pair_name in list(pairs_last_update_ids):  # The legs only followed for synthetic pairs are not cleaned by "clean_pair_metadata_if_needed"
+        if pair_name not in pairs_metadata and pair_name not in followed_legs:
+            del pairs_last_update_ids[pair_name]
+
+
+def get_synthetic_pair_price(pair_name: str):
+    # Returns None until every leg has received a price
+    _, _, _, synthetic_price, synthetic_legs = synthetic_pairs[pair_name]
+
+    for leg_pair_name, is_leg_divided in synthetic_legs:
+        leg_price = synthetic_legs_prices.get(leg_pair_name)
+        if leg_price is None:
+            return None
+        synthetic_price = synthetic_price / leg_price if is_leg_divided else synthetic_price * leg_price
+
+    return synthetic_price
+
+
+def process_synthetic_legs_tick(leg_pair_name: str, leg_ask_price: float, tick_time: float = None):
+    # Only recomputes the synthetic pairs using this leg, whose new prices then go through the same path as the ticks of real pairs
+    synthetic_legs_prices[leg_pair_name] = leg_ask_price
+    synthetic_triggered_alerts = None
+
+    for pair_name in legs_synthetic_pairs[leg_pair_name]:
+        if pair_name not in pairs_metadata:  # Defined, but without alerts (or owned by another feed worker)
+            continue
+
+        synthetic_ask_price = get_synthetic_pair_price(pair_name)
+        if synthetic_ask_price is None:
+            continue
+
+        if IS_TICK_CONFLATION_ENABLED:
+            conflate_price_tick(pair_name, synthetic_ask_price)
+            continue
+
+        synthetic_triggered_alerts = merge_triggered_alerts(synthetic_triggered_alerts, process_price_tick(pair_name, synthetic_ask_price, tick_time))
+
+    return synthetic_triggered_alerts
+
+
+def process_price_tick(pair_name: str, current_ask_price: float, tick_time: float = None):
+    # Returns the alerts crossed by this price update (already removed from the cache), or None when nothing has been crossed
+    if pair_name not in pairs_metadata: 
+        # Important to check, because if the user manually deletes an alert (and therefore it is no longer present in "pairs_metadata"),
+        # but a message is sent at the same time for this pair, then this could cause a KeyError (accessing a key that is not present in the dictionary).
+        return None
+
+    rolling_triggered_alerts = None
+    if pair_name in pairs_rolling_alerts:  # Only the pairs having rolling-window or trailing stop alerts pay for them
+        rolling_triggered_alerts = trigger_rolling_alerts(pair_name, current_ask_price, tick_time or time.time())
+
+    if pair_name not in last_known_prices:  # When we receive a price for the first time for this specific pair
+        last_known_prices[pair_name] = current_ask_price
+        return finish_rolling_triggered_alerts(pair_name, rolling_triggered_alerts)
+
+    previous_ask_price = last_known_prices[pair_name]
+    last_known_prices[pair_name] = current_ask_price
+
+    start_index, end_index = get_crossed_alerts_bounds(pair_name, previous_ask_price, current_ask_price)
+
+    if start_index == end_index:  # Most ticks do not cross any alert, so nothing is allocated for them
+        return finish_rolling_triggered_alerts(pair_name, rolling_triggered_alerts)
+
+    return merge_triggered_alerts(rolling_triggered_alerts, trigger_crossed_alerts(pair_name, start_index, end_index, previous_ask_price, current_ask_price))
+
+
+def process_price_window(pair_name: str, current_ask_price: float, lowest_ask_price: float, highest_ask_price: float, tick_time: float = None,
+                         is_highest_last: bool = False):
+    # Same as "process_price_tick", for all the ticks received during a conflation window at once: since the price went
+    # from the previous one to the current one through the lowest and the highest ones, every alert between them has been crossed
+    if pair_name not in pairs_metadata:
+        return None
+
+    rolling_triggered_alerts = None
+    if pair_name in pairs_rolling_alerts:
+        # The extremes are replayed in the order in which they were reached, so that the rolling windows and the trailing stops
+        # only see moves that really happened (e.g. a drop from the highest price when the lowest one came after it)
+        rolling_triggered_alerts = []
+        window_extremes = (lowest_ask_price, highest_ask_price) if is_highest_last else (highest_ask_price, lowest_ask_price)
+        for window_ask_price in (*window_extremes, current_ask_price):
+            if pair_name in pairs_rolling_alerts:
+                rolling_triggered_alerts.extend(trigger_rolling_alerts(pair_name, window_ask_price, tick_time or time.time()))
+
+    if pair_name not in last_known_prices:
+        last_known_prices[pair_name] = current_ask_price
+        return finish_rolling_triggered_alerts(pair_name, rolling_triggered_alerts)
+
+    previous_ask_price = last_known_prices[pair_name]
+    last_known_prices[pair_name] = current_ask_price
+
+    start_index, end_index = get_crossed_alerts_bounds(pair_name, min(previous_ask_price, lowest_ask_price), max(previous_ask_price, highest_ask_price))
+
+    if start_index == end_index:
+        return finish_rolling_triggered_alerts(pair_name, rolling_triggered_alerts)
+
+    return merge_triggered_alerts(rolling_triggered_alerts, trigger_crossed_alerts(pair_name, start_index, end_index, previous_ask_price, current_ask_price))
+
+
+def finish_rolling_triggered_alerts(pair_name: str, rolling_triggered_alerts: list):
+    if not rolling_triggered_alerts:
+        return None
+
+    clean_pair_metadata_if_needed(*pairs_metadata[pair_name])  # Done by "trigger_crossed_alerts" when price alerts are crossed as well
+    return rolling_triggered_alerts
+
+
+def merge_triggered_alerts(rolling_triggered_alerts: list, crossed_triggered_alerts: list):
+    if not rolling_triggered_alerts:
+        return crossed_triggered_alerts
+
+    return rolling_triggered_alerts + (crossed_triggered_alerts or [])
+
+
+def trigger_crossed_alerts(pair_name: str, start_index: int, end_index: int, previous_ask_price: float, current_ask_price: float):
+    base_currency, quote_currency = pairs_metadata[pair_name]
+    pair_alerts_cache = active_alerts_cache[pair_name]
+    sorted_alert_prices, sorted_alert_ids, _ = pair_alerts_cache
+
+    crossed_alert_prices = sorted_alert_prices[start_index:end_index]
+    crossed_alerts = list(zip(crossed_alert_prices, sorted_alert_ids[start_index:end_index]))
+
+    # All the alerts of the range are triggered, so the whole range is removed at once (tombstones included)
+    del sorted_alert_prices[start_index:end_index]
+    del sorted_alert_ids[start_index:end_index]
+
+    # The alerts above the previous price were reached while going up, the ones below while going down (an alert exactly at the
+    # previous price takes the direction of the current one). Alerts are notified in the order in which the price reached them.
+    is_price_crossed_up = previous_ask_price <= current_ask_price
+    if is_price_crossed_up:
+        direction_split_index = bisect.bisect_left(crossed_alert_prices, previous_ask_price)
+    else:
+        direction_split_index = bisect.bisect_right(crossed_alert_prices, previous_ask_price)
+
+    crossed_down_alerts = (crossed_alerts[:direction_split_index][::-1], CROSS_DOWN_EMOJI)
+    crossed_up_alerts = (crossed_alerts[direction_split_index:], CROSS_UP_EMOJI)
+
+    triggered_alerts = []
+    for directed_crossed_alerts, emoji_direction in ((crossed_down_alerts, crossed_up_alerts) if is_price_crossed_up else (crossed_up_alerts, crossed_down_alerts)):
+        for float_alert_price, alert_id in directed_crossed_alerts:
+            if alert_id == TOMBSTONE_ALERT_ID:  # Alert already removed manually
+                pair_alerts_cache[ACTIVE_ALERTS_CACHE_TOMBSTONES_INDEX] -= 1
+                continue
+
+            alert_infos = forget_alert(alert_id)
+            if alert_infos is None:
+                continue
+
+            triggered_alerts.append([alert_id, alert_infos[0], base_currency, quote_currency, float_alert_price, emoji_direction, ""])
+
+    clean_pair_metadata_if_needed(base_currency, quote_currency)
+
+    return triggered_alerts or None  # None when only tombstones were crossed
+
+
+async def dispatch_triggered_alerts(triggered_alerts: list):
+    if feed_worker_id is not None:  # Only the coordinator process talks to Telegram and to the database
+        feed_workers_events_queue.put((TRIGGERED_ALERTS_FEED_EVENT, feed_worker_id, triggered_alerts))
+    else:
+        for triggered_alert in triggered_alerts:
+            # Telegram and the database are handled by the notification workers, so that the reading of the prices is never slowed down
+            await notification_queue.put(triggered_alert)
+
+
+def conflate_price_tick(pair_name: str, current_ask_price: float):
+    conflated_price_tick = conflated_price_ticks.get(pair_name)
+
+    if conflated_price_tick is None:
+        conflated_price_ticks[pair_name] = [current_ask_price, current_ask_price, current_ask_price, False]
+
+        if pair_name not in last_known_prices and pair_name in pairs_metadata:  # The very first tick is the reference, as in "process_price_tick"
+            last_known_prices[pair_name] = current_ask_price
+    else:
+        conflated_price_tick[CONFLATED_CURRENT_PRICE_INDEX] = current_ask_price
+        if current_ask_price < conflated_price_tick[CONFLATED_LOWEST_PRICE_INDEX]:
+            conflated_price_tick[CONFLATED_LOWEST_PRICE_INDEX] = current_ask_price
+            conflated_price_tick[CONFLATED_IS_HIGHEST_LAST_INDEX] = False
+        elif current_ask_price > conflated_price_tick[CONFLATED_HIGHEST_PRICE_INDEX]:
+            conflated_price_tick[CONFLATED_HIGHEST_PRICE_INDEX] = current_ask_price
+            conflated_price_tick[CONFLATED_IS_HIGHEST_LAST_INDEX] = True
+
+
+def process_conflated_price_ticks(window_price_ticks: dict, tick_time: float = None) -> list:
+    window_triggered_alerts = []
+
+    for pair_name, (current_ask_price, lowest_ask_price, highest_ask_price, is_highest_last) in window_price_ticks.items():
+        triggered_alerts = process_price_window(pair_name, current_ask_price, lowest_ask_price, highest_ask_price, tick_time, is_highest_last)
+        if triggered_alerts:
+            window_triggered_alerts.extend(triggered_alerts)
+
+    return window_triggered_alerts
+
+
+async def flush_conflated_price_ticks():
+    global conflated_price_ticks
+
+    await asyncio.sleep(TICK_CONFLATION_SECONDS)  # "0" only waits for the messages already received by this event loop iteration
+
+    window_price_ticks = conflated_price_ticks
+    conflated_price_ticks = {}  # The ticks received from now on belong to the next window
+
+    if METRICS_ENABLED:
+        crossing_check_start_time = time.perf_counter()
+
+    triggered_alerts = process_conflated_price_ticks(window_price_ticks)
+
+    if METRICS_ENABLED:
+        observe_metric(CROSSING_CHECK_METRIC, time.perf_counter() - crossing_check_start_time)
+        if triggered_alerts:
+            increment_metric(ALERTS_TRIGGERED_METRIC, amount=len(triggered_alerts))
+
+    if triggered_alerts:
+        await dispatch_triggered_alerts(triggered_alerts)
+
+
+async def read_websocket_frames(websocket):
+    global is_websocket_dead
+
+    async for pair_websocket_message in websocket:
+        is_websocket_dead = False
+
+        if METRICS_ENABLED:
+            frame_start_time = time.perf_counter()
+
+        decoded_frame = decode_binance_frame(pair_websocket_message)
+        if decoded_frame is None:  # Binance can send messages that do not contain prices (e.g. answers to control messages)
+            if ERROR_KEY_DICT in pair_websocket_message:
+                logging.warning(f"Binance rejected a control message: {pair_websocket_message}")
+            continue
+
+        pair_name, current_ask_price, update_id = decoded_frame
+
+        if update_id:  # Always sent by Binance, but 0 when the message has none
+            if update_id <= pairs_last_update_ids.get(pair_name, 0):  # Already received on another connection (redundant mode, or replacement of a connection)
+                if METRICS_ENABLED:
+                    increment_metric(DUPLICATE_FRAMES_METRIC)
+                continue
+            pairs_last_update_ids[pair_name] = update_id
+
+        if METRICS_ENABLED:
+            crossing_check_start_time = time.perf_counter()
+            observe_metric(FRAME_DECODING_METRIC, crossing_check_start_time - frame_start_time)
+            increment_metric(FRAMES_RECEIVED_METRIC, pair_name)
+
+        if FRAMES_RECORDING_FILENAME:
+            record_frame(pair_websocket_message, time.time())
+
+        if IS_TICK_CONFLATION_ENABLED:
+            if not conflated_price_ticks:  # First tick of a new window
+                asyncio.create_task(flush_conflated_price_ticks())
+
+            conflate_price_tick(pair_name, current_ask_price)  # The crossings are checked by "flush_conflated_price_ticks"
+            if pair_name in legs_synthetic_pairs:
+                process_synthetic_legs_tick(pair_name, current_ask_price)  # Their prices are conflated as well
+            continue
+
+        triggered_alerts = process_price_tick(pair_name, current_ask_price)
+        if pair_name in legs_synthetic_pairs:
+            triggered_alerts = merge_triggered_alerts(triggered_alerts, process_synthetic_legs_tick(pair_name, current_ask_price))
+
+        if METRICS_ENABLED:
+            observe_metric(CROSSING_CHECK_METRIC, time.perf_counter() - crossing_check_start_time)
+            if triggered_alerts:
+                increment_metric(ALERTS_TRIGGERED_METRIC, amount=len(triggered_alerts))
+
+        if triggered_alerts:
+            await dispatch_triggered_alerts(triggered_alerts)
+
+
+def get_reconnection_delay(reconnection_attempts: int) -> float:
+    # Exponential backoff with "full jitter", so that the connections (and the other clients of Binance) do not all retry at the same time
+    return random.uniform(0, min(RECONNECTION_MAX_SECONDS, RECONNECTION_BASE_SECONDS * 2 ** reconnection_attempts))
+
+
+async def hand_over_websocket_connection(shard_id: int, leg_id: int, websocket, frames_task: asyncio.Task):
+    # Make-before-break: the successor connects and subscribes while this connection is still read, the ticks received on both being deduplicated
+    connection_key = (shard_id, leg_id)
+    websocket_shards_tasks[connection_key] = asyncio.create_task(run_websocket_listener(shard_id, leg_id))
+
+    handover_deadline = time.monotonic() + HANDOVER_MAX_SECONDS
+    while time.monotonic() < handover_deadline and not frames_task.done():
+        successor_websocket = websocket_shards_connections.get(connection_key)
+        if successor_websocket is not None and successor_websocket is not websocket and \
+           websocket_shards_subscribed_streams.get(connection_key, set()) >= websocket_shards_streams.get(shard_id, set()):
+            await asyncio.wait({frames_task}, timeout=HANDOVER_OVERLAP_SECONDS)  # Gives Binance the time to start sending the ticks on the successor
+            break
+
+        await asyncio.wait({frames_task}, timeout=HANDOVER_POLL_SECONDS)
+
+    await websocket.close()
+    await asyncio.gather(frames_task, return_exceptions=True)
+
+
+async def run_websocket_listener(shard_id: int, leg_id: int):
+    global is_websocket_dead
+
+    connection_key = (shard_id, leg_id)
+    reconnection_attempts = 0
+
+    while True:
+        websocket = None
+        frames_task = None
+        reconnection_delay = 0
+
+        try:
+            websocket = await websockets.connect(BINANCE_STREAMS_WEBSOCKET_URLS[leg_id], ping_interval=PING_SECONDS_DELAY, ping_timeout=PONG_SECONDS_TIMEOUT)
+            reconnection_attempts = 0
+
+            websocket_shards_connections[connection_key] = websocket
+            websocket_shards_subscribed_streams[connection_key] = set()  # A new connection does not follow any stream yet
+            request_websocket_subscriptions_update()
+
+            frames_task = asyncio.create_task(read_websocket_frames(websocket))
+            await asyncio.wait({frames_task}, timeout=PLANNED_RECONNECTION_SECONDS * (1 - random.uniform(0, PLANNED_RECONNECTION_JITTER)))
+
+            if not frames_task.done():  # Planned reconnection, this listener is replaced by a new one
+                await hand_over_websocket_connection(shard_id, leg_id, websocket, frames_task)
+                break
+
+            frames_task.result()  # Raises the error which closed the connection, if any
+        
+        except asyncio.CancelledError:  # Thrown when the connection is no longer useful (i.e. all its pairs no longer have alerts)
+            break
+
+        except Exception:
+            # In redundant mode, the other leg of the shard still receives the ticks
+            is_websocket_dead = not any((shard_id, other_leg_id) in websocket_shards_connections for other_leg_id in range(len(BINANCE_STREAMS_WEBSOCKET_URLS)) if other_leg_id != leg_id)
+
+            if METRICS_ENABLED:
+                increment_metric(WEBSOCKET_RECONNECTIONS_METRIC)
+
+            await send_inbox_message(traceback.format_exc(), level="ERROR")
+            reconnection_delay = get_reconnection_delay(reconnection_attempts)
+            reconnection_attempts += 1
+
+        finally:
+            if frames_task is not None and not frames_task.done():
+                frames_task.cancel()
+            if websocket is not None:
+                await websocket.close()
+            if websocket_shards_connections.get(connection_key) is websocket:  # Not the connection of a successor
+                websocket_shards_connections.pop(connection_key)
+
+        await asyncio.sleep(reconnection_delay)
+
+
+def get_all_last_known_prices() -> dict:
+    all_last_known_prices = last_known_prices.copy()
+    for worker_last_known_prices in feed_workers_last_known_prices.values():  # Sharded mode: the prices are received by the feed workers
+        all_last_known_prices.update(worker_last_known_prices)
+
+    return all_last_known_prices
+
+
+def get_prices_snapshot() -> bytes:
+    snapshot_time = time.time()
+    all_last_known_prices = get_all_last_known_prices()
+
+    snapshot_entries = {}
+    snapshot_bytes = bytearray(PRICES_SNAPSHOT_HEADER.pack(snapshot_time, len(all_last_known_prices)))
+
+    for pair_name, last_price in all_last_known_prices.items():
+        previous_snapshot_entry = prices_snapshot_entries.get(pair_name)
+        # A price keeps the time of the snapshot where it appeared, so that the time of each price is known without timing every tick
+        price_time = previous_snapshot_entry[1] if previous_snapshot_entry is not None and previous_snapshot_entry[0] == last_price else snapshot_time
+        snapshot_entries[pair_name] = [last_price, price_time]
+
+        encoded_pair_name = pair_name.encode()
+        snapshot_bytes.extend(PRICES_SNAPSHOT_ENTRY.pack(last_price, price_time, len(encoded_pair_name)))
+        snapshot_bytes.extend(encoded_pair_name)
+
+    prices_snapshot_entries.clear()
+    prices_snapshot_entries.update(snapshot_entries)
+
+    return bytes(snapshot_bytes)
+
+
+def write_prices_snapshot(snapshot_bytes: bytes):
+    temporary_filename = f"{PRICES_SNAPSHOT_FILENAME}.tmp"
+    with open(temporary_filename, "wb") as snapshot_file:
+        snapshot_file.write(snapshot_bytes)
+
+    os.replace(temporary_filename, PRICES_SNAPSHOT_FILENAME)  # Atomic, so that a crash while writing never leaves a truncated snapshot
+
+
+async def prices_snapshot_loop():
+    while True:
+        await asyncio.sleep(PRICES_SNAPSHOT_SECONDS)
+        disk_io_executor.submit(write_prices_snapshot, get_prices_snapshot())
+
+
+def parse_prices_snapshot(snapshot_bytes: bytes) -> tuple:
+    # Returns the time of the snapshot and its entries (pair name -> [price, price time]), or raises "struct.error" or "UnicodeDecodeError" if it is corrupt
+    snapshot_time, entries_number = PRICES_SNAPSHOT_HEADER.unpack_from(snapshot_bytes)
+    entry_offset = PRICES_SNAPSHOT_HEADER.size
+    snapshot_entries = {}
+
+    for _ in range(entries_number):
+        last_price, price_time, pair_name_length = PRICES_SNAPSHOT_ENTRY.unpack_from(snapshot_bytes, entry_offset)
+        entry_offset += PRICES_SNAPSHOT_ENTRY.size
+
+        pair_name = sys.intern(snapshot_bytes[entry_offset:entry_offset + pair_name_length].decode())
+        entry_offset += pair_name_length
+        snapshot_entries[pair_name] = [last_price, price_time]
+
+    if entry_offset != len(snapshot_bytes):  # A truncated pair name, or trailing bytes
+        raise struct.error(f"the snapshot holds {len(snapshot_bytes)} bytes, {entry_offset} were expected")
+
+    return snapshot_time, snapshot_entries
+
+
+async def load_prices_snapshot():
+    # Must be called once the alerts are loaded, because only the prices of the followed pairs are kept
+    global is_prices_snapshot_loaded
+    is_prices_snapshot_loaded = True
+
+    try:
+        snapshot_bytes = await asyncio.get_running_loop().run_in_executor(disk_io_executor, read_file_bytes, PRICES_SNAPSHOT_FILENAME)
+    except FileNotFoundError:
+        return
+
+    try:
+        snapshot_time, snapshot_entries = parse_prices_snapshot(snapshot_bytes)
+    except (struct.error, UnicodeDecodeError) as snapshot_error:  # The bot starts without the prices, as if there were no snapshot
+        logging.warning(f"The prices snapshot \"{PRICES_SNAPSHOT_FILENAME}\" is corrupt and has been ignored: {snapshot_error}")
+        return
+
+    if time.time() - snapshot_time > PRICES_SNAPSHOT_MAX_AGE_SECONDS:  # The age of the snapshot, a price which did not change for long being still valid
+        return
+
+    for pair_name, snapshot_entry in snapshot_entries.items():
+        if pair_name in pairs_metadata:
+            last_known_prices[pair_name] = snapshot_entry[0]
+            prices_snapshot_entries[pair_name] = snapshot_entry
+
+    if feed_workers_commands_queues:  # Sharded mode: each feed worker compares the first prices it receives to these ones
+        workers_last_prices = {}
+        for pair_name, last_price in last_known_prices.items():
+            workers_last_prices.setdefault(get_pair_feed_worker_id(pair_name), {})[pair_name] = last_price
+
+        for worker_id, worker_last_prices in workers_last_prices.items():
+            feed_workers_commands_queues[worker_id].put((SET_LAST_PRICES_FEED_COMMAND, worker_last_prices))
+
+
+def map_price_history_file(slots_number: int) -> mmap.mmap:
+    # Runs in "disk_io_executor": the file is created (or recreated) if needed, and extended to hold at least this number of slots.
+    # A regular file object (rather than "os.pread" and "os.pwrite", which only exist on Unix), the memory map keeping its own reference to the file.
+    history_file_mode = "r+b" if os.path.exists(PRICE_HISTORY_FILENAME) else "w+b"
+    with open(PRICE_HISTORY_FILENAME, history_file_mode) as history_file:
+        file_header = PRICE_HISTORY_FILE_HEADER.pack(PRICE_HISTORY_FILE_MAGIC, PRICE_HISTORY_SECONDS_BUCKETS, PRICE_HISTORY_MINUTES_BUCKETS)
+        file_size = os.fstat(history_file.fileno()).st_size
+
+        if history_file.read(PRICE_HISTORY_FILE_HEADER.size) != file_header or (file_size - PRICE_HISTORY_FILE_HEADER.size) % PRICE_HISTORY_SLOT_BYTES:
+            # New file, or written with another layout: it is recreated empty
+            history_file.truncate(0)
+            history_file.truncate(PRICE_HISTORY_FILE_HEADER.size + PRICE_HISTORY_GROWTH_SLOTS * PRICE_HISTORY_SLOT_BYTES)
+            history_file.seek(0)
+            history_file.write(file_header)
+            history_file.flush()
+
+        if os.fstat(history_file.fileno()).st_size < PRICE_HISTORY_FILE_HEADER.size + slots_number * PRICE_HISTORY_SLOT_BYTES:
+            history_file.truncate(PRICE_HISTORY_FILE_HEADER.size + slots_number * PRICE_HISTORY_SLOT_BYTES)
+
+        return mmap.mmap(history_file.fileno(), 0)
+
+
+async def open_price_history(slots_number: int = 0):
+    global price_history_memory_map
+    price_history_memory_map = await asyncio.get_running_loop().run_in_executor(disk_io_executor, map_price_history_file, slots_number)
+
+    price_history_slots_pairs.clear()
+    price_history_slots_views.clear()
+
+    slots_number = (len(price_history_memory_map) - PRICE_HISTORY_FILE_HEADER.size) // PRICE_HISTORY_SLOT_BYTES
+    for slot_index in range(slots_number):
+        slot_offset = PRICE_HISTORY_FILE_HEADER.size + slot_index * PRICE_HISTORY_SLOT_BYTES
+        encoded_pair_name = price_history_memory_map[slot_offset:slot_offset + PRICE_HISTORY_PAIR_NAME_BYTES].rstrip(b"\0")
+
+        if encoded_pair_name:
+            pair_name = sys.intern(encoded_pair_name.decode())
+            price_history_slots_pairs.append(pair_name)
+            price_history_slots_views[pair_name] = get_price_history_slot_view(slot_index)
+        else:
+            price_history_slots_pairs.append(None)
+
+
+def get_price_history_slot_view(slot_index: int) -> memoryview:
+    slot_offset = PRICE_HISTORY_FILE_HEADER.size + slot_index * PRICE_HISTORY_SLOT_BYTES
+    return memoryview(price_history_memory_map)[slot_offset:slot_offset + PRICE_HISTORY_SLOT_BYTES].cast("d")  # Reads and writes go straight to the mapped file, without any Python object per sample
+
+
+def close_price_history():
+    global price_history_memory_map
+
+    for slot_view in price_history_slots_views.values():  # The memory map cannot be closed while views on it exist
+        slot_view.release()
+    price_history_slots_views.clear()
+
+    price_history_memory_map.close()
+    price_history_memory_map = None
+
+
+def get_free_price_history_slot_index():
+    current_time = time.time()
+
+    for slot_index, slot_pair_name in enumerate(price_history_slots_pairs):
+        if slot_pair_name is None:
+            return slot_index
+
+        slot_view = price_history_slots_views[slot_pair_name]
+        if slot_pair_name not in pairs_metadata and current_time - slot_view[PRICE_HISTORY_LAST_SAMPLE_TIME_INDEX] > PRICE_HISTORY_UNUSED_SLOT_SECONDS:
+            slot_view.release()
+            price_history_slots_views.pop(slot_pair_name)
+            return slot_index
+
+    return None
+
+
+async def grow_price_history(missing_slots_number: int):
+    # The file is extended and mapped again by the disk I/O thread, the history being unavailable (and not recorded) meanwhile
+    slots_number = len(price_history_slots_pairs) + max(PRICE_HISTORY_GROWTH_SLOTS, missing_slots_number)
+    close_price_history()
+    await open_price_history(slots_number)
+
+
+def add_price_history_slot(pair_name: str):
+    # Returns the view on the new slot of the pair, or None if the file is full
+    slot_index = get_free_price_history_slot_index()
+    if slot_index is None:
+        return None
+
+    encoded_pair_name = pair_name.encode()
+    slot_offset = PRICE_HISTORY_FILE_HEADER.size + slot_index * PRICE_HISTORY_SLOT_BYTES
+    price_history_memory_map[slot_offset:slot_offset + PRICE_HISTORY_SLOT_BYTES] = bytes(PRICE_HISTORY_SLOT_BYTES)  # Clears the history of a reused slot
+    price_history_memory_map[slot_offset:slot_offset + len(encoded_pair_name)] = encoded_pair_name
+
+    price_history_slots_pairs[slot_index] = pair_name
+    price_history_slots_views[pair_name] = get_price_history_slot_view(slot_index)
+    return price_history_slots_views[pair_name]
+
+
+def record_price_history_sample(pair_name: str, sample_time: float, price: float) -> bool:
+    # Returns False if the pair has no slot yet and the file is full
+    slot_view = price_history_slots_views.get(pair_name)
+    if slot_view is None:
+        if len(pair_name.encode()) > PRICE_HISTORY_PAIR_NAME_BYTES:  # Never recorded
+            return True
+
+        slot_view = add_price_history_slot(pair_name)
+        if slot_view is None:
+            return False
+
+    sample_second = int(sample_time)
+    bucket_index = PRICE_HISTORY_SECONDS_OFFSET + sample_second % PRICE_HISTORY_SECONDS_BUCKETS * PRICE_HISTORY_SECOND_BUCKET_DOUBLES
+    slot_view[bucket_index] = sample_second
+    slot_view[bucket_index + 1] = price
+
+    sample_minute = sample_second // 60
+    bucket_index = PRICE_HISTORY_MINUTES_OFFSET + sample_minute % PRICE_HISTORY_MINUTES_BUCKETS * PRICE_HISTORY_MINUTE_BUCKET_DOUBLES
+    if slot_view[bucket_index] == sample_minute:
+        if price < slot_view[bucket_index + 1]:
+            slot_view[bucket_index + 1] = price
+        if price > slot_view[bucket_index + 2]:
+            slot_view[bucket_index + 2] = price
+    else:  # First sample of this minute, the bucket held the same minute of the previous day (or nothing)
+        slot_view[bucket_index] = sample_minute
+        slot_view[bucket_index + 1] = price
+        slot_view[bucket_index + 2] = price
+    slot_view[bucket_index + 3] = price
+
+    slot_view[PRICE_HISTORY_LAST_SAMPLE_TIME_INDEX] = sample_time
+    return True
+
+
+async def record_price_history_samples(sample_time: float):
+    unrecorded_prices = {}
+    for pair_name, last_price in get_all_last_known_prices().items():
+        if pair_name in pairs_metadata:  # The prices reloaded from the snapshot can belong to pairs that are no longer followed
+            if not record_price_history_sample(pair_name, sample_time, last_price):
+                unrecorded_prices[pair_name] = last_price
+
+    if unrecorded_prices:  # The new pairs did not fit in the file
+        await grow_price_history(len(unrecorded_prices))
+        for pair_name, last_price in unrecorded_prices.items():
+            record_price_history_sample(pair_name, sample_time, last_price)
+
+
+async def price_history_loop():
+    while True:
+        await asyncio.sleep(PRICE_HISTORY_SAMPLING_SECONDS - time.time() % PRICE_HISTORY_SAMPLING_SECONDS)  # Aligned on the buckets
+        await record_price_history_samples(time.time())
+
+
+def get_price_history_minutes(pair_name: str) -> list:
+    # Returns the (minute, lowest, highest, last price) buckets of the last 24 hours, from the oldest one
+    slot_view = price_history_slots_views.get(pair_name)
+    if slot_view is None:
+        return []
+
+    history_minutes = []
+    current_minute = int(time.time()) // 60
+    for history_minute in range(current_minute - PRICE_HISTORY_MINUTES_BUCKETS + 1, current_minute + 1):
+        bucket_index = PRICE_HISTORY_MINUTES_OFFSET + history_minute % PRICE_HISTORY_MINUTES_BUCKETS * PRICE_HISTORY_MINUTE_BUCKET_DOUBLES
+        if slot_view[bucket_index] == history_minute:
+            history_minutes.append((history_minute, slot_view[bucket_index + 1], slot_view[bucket_index + 2], slot_view[bucket_index + 3]))
+
+    return history_minutes
+
+
+def get_price_history_seconds(pair_name: str) -> list:
+    # Returns the (second, price) buckets of the last 15 minutes, from the oldest one
+    slot_view = price_history_slots_views.get(pair_name)
+    if slot_view is None:
+        return []
+
+    history_seconds = []
+    current_second = int(time.time())
+    for history_second in range(current_second - PRICE_HISTORY_SECONDS_BUCKETS + 1, current_second + 1):
+        bucket_index = PRICE_HISTORY_SECONDS_OFFSET + history_second % PRICE_HISTORY_SECONDS_BUCKETS * PRICE_HISTORY_SECOND_BUCKET_DOUBLES
+        if slot_view[bucket_index] == history_second:
+            history_seconds.append((history_second, slot_view[bucket_index + 1]))
+
+    return history_seconds
+
+
+def get_sparkline(prices: list) -> str:
+    lowest_price = min(prices)
+    prices_range = max(prices) - lowest_price
+    if prices_range == 0:
+        return SPARKLINE_CHARACTERS[len(SPARKLINE_CHARACTERS) // 2] * len(prices)
+
+    return "".join(SPARKLINE_CHARACTERS[round((price - lowest_price) / prices_range * (len(SPARKLINE_CHARACTERS) - 1))] for price in prices)
+
+
+def get_price_history_summary(pair_name: str):
+    # Returns the sparkline of the last 24 hours and their lowest and highest prices, or None if the pair has no history
+    current_minute = int(time.time()) // 60
+    cached_summary = price_history_summaries.get(pair_name)
+    if cached_summary is not None and cached_summary[0] == current_minute:
+        return cached_summary[1]
+
+    history_minutes = get_price_history_minutes(pair_name)
+    if not history_minutes:
+        price_history_summary = None
+    else:
+        sparkline_minutes = PRICE_HISTORY_MINUTES_BUCKETS // PRICE_HISTORY_SPARKLINE_LENGTH
+        first_sparkline_minute = current_minute - PRICE_HISTORY_MINUTES_BUCKETS + 1
+
+        sparkline_prices = []
+        for history_minute, _, _, last_price in history_minutes:  # Last price of each period, the periods before the first sample being skipped
+            period_index = (history_minute - first_sparkline_minute) // sparkline_minutes
+            if not sparkline_prices:
+                sparkline_prices.append(last_price)
+                first_period_index = period_index
+            else:
+                while len(sparkline_prices) <= period_index - first_period_index:  # A period without samples keeps the previous price
+                    sparkline_prices.append(sparkline_prices[-1])
+                sparkline_prices[-1] = last_price
+
+        price_history_summary = (
+            get_sparkline(sparkline_prices),
+            min(history_minute[1] for history_minute in history_minutes),
+            max(history_minute[2] for history_minute in history_minutes)
+        )
+
+    price_history_summaries[pair_name] = [current_minute, price_history_summary]
+    return price_history_summary
+
+
+def get_price_history_text(pair_name: str, is_recent_change_included=False) -> str:
+    price_history_summary = get_price_history_summary(pair_name) if price_history_memory_map is not None else None
+    if price_history_summary is None:
+        return ""
+
+    sparkline, lowest_price, highest_price = price_history_summary
+    price_history_text = f"{sparkline} 24h: {format_pair_price(pair_name, lowest_price)} – {format_pair_price(pair_name, highest_price)}"
+
+    if is_recent_change_included:
+        history_seconds = get_price_history_seconds(pair_name)
+        if history_seconds and history_seconds[0][1]:
+            recent_change_percent = (history_seconds[-1][1] / history_seconds[0][1] - 1) * 100
+            price_history_text += f" | 15m: {recent_change_percent:+.2f}%"
+
+    return price_history_text
+
+
+def append_to_frames_recording(recorded_frames: bytes):
+    with open(FRAMES_RECORDING_FILENAME, "ab") as frames_recording_file:
+        frames_recording_file.write(recorded_frames)
+
+
+def flush_frames_recording():
+    if frames_recording_buffer:
+        disk_io_executor.submit(append_to_frames_recording, bytes(frames_recording_buffer))  # The file is written by another thread, to keep disk I/O off the event loop
+        frames_recording_buffer.clear()
+
+
+def record_frame(websocket_message: str, received_at: float):
+    encoded_websocket_message = websocket_message.encode()
+    frames_recording_buffer.extend(RECORDED_FRAME_HEADER.pack(received_at, len(encoded_websocket_message)))
+    frames_recording_buffer.extend(encoded_websocket_message)
+
+    if len(frames_recording_buffer) >= FRAMES_RECORDING_FLUSH_BYTES:
+        flush_frames_recording()
+
+
+async def frames_recording_loop():  # Also writes the recording regularly when few messages are received
+    while True:
+        await asyncio.sleep(FRAMES_RECORDING_FLUSH_SECONDS)
+        flush_frames_recording()
+
+
+def read_frames_recording(recording_filename: str):
+    # The file is memory-mapped, so that recordings bigger than the RAM can be replayed
+    with open(recording_filename, "rb") as frames_recording_file:
+        if os.fstat(frames_recording_file.fileno()).st_size == 0:  # An empty file cannot be memory-mapped
+            return
+
+        with mmap.mmap(frames_recording_file.fileno(), 0, access=mmap.ACCESS_READ) as recording_memory_map:
+            frame_offset = 0
+            while frame_offset + RECORDED_FRAME_HEADER.size <= len(recording_memory_map):
+                received_at, message_length = RECORDED_FRAME_HEADER.unpack_from(recording_memory_map, frame_offset)
+                frame_offset += RECORDED_FRAME_HEADER.size
+
+                yield received_at, recording_memory_map[frame_offset:frame_offset + message_length].decode()
+                frame_offset += message_length
+
+
+async def replay_frames_recording(recording_filename: str, is_realtime: bool) -> list:
+    # Feeds a recording to the same engine as "run_websocket_listener", without sending anything to Telegram nor modifying the database
+    global websocket_subscriptions_event
+    websocket_subscriptions_event = asyncio.Event()
+
+    set_synthetic_pairs(await run_in_database_thread(fetch_all_synthetic_pairs_from_database))
+    await load_pairs_metadata_from_database()
+
+    global conflated_price_ticks
+    replayed_triggered_alerts = []
+    first_received_at = None
+    replay_start_time = time.monotonic()
+    conflation_window_start = None
+
+    def report_triggered_alerts(received_at: float, triggered_alerts: list):
+        for alert_id, user_id, base_currency, quote_currency, float_alert_price, emoji_direction, alert_condition_text in triggered_alerts:
+            replayed_triggered_alerts.append([received_at, alert_id, user_id, base_currency, quote_currency, float_alert_price, emoji_direction, alert_condition_text])
+            print(f"{datetime.datetime.fromtimestamp(received_at).isoformat()}  #{alert_id}  user {user_id}  {base_currency} : {format_alert_price(float_alert_price)} {quote_currency} ({base_currency}/{quote_currency}) {emoji_direction} {alert_condition_text}".rstrip())
+
+    for received_at, websocket_message in read_frames_recording(recording_filename):
+        if is_realtime:
+            if first_received_at is None:
+                first_received_at = received_at
+
+            seconds_to_wait = (received_at - first_received_at) - (time.monotonic() - replay_start_time)
+            if seconds_to_wait > 0:
+                await asyncio.sleep(seconds_to_wait)
+
+        decoded_frame = decode_binance_frame(websocket_message)
+        if decoded_frame is None:
+            continue
+
+        if IS_TICK_CONFLATION_ENABLED:  # The windows follow the recorded receive times
+            if conflated_price_ticks and received_at - conflation_window_start >= TICK_CONFLATION_SECONDS:
+                window_price_ticks, conflated_price_ticks = conflated_price_ticks, {}
+                report_triggered_alerts(received_at, process_conflated_price_ticks(window_price_ticks, received_at))
+
+            if not conflated_price_ticks:
+                conflation_window_start = received_at
+
+            conflate_price_tick(*decoded_frame[:2])
+            if decoded_frame[0] in legs_synthetic_pairs:
+                process_synthetic_legs_tick(*decoded_frame[:2], received_at)
+            continue
+
+        triggered_alerts = process_price_tick(*decoded_frame[:2], received_at)  # The rolling windows follow the recorded receive times as well
+        if decoded_frame[0] in legs_synthetic_pairs:
+            triggered_alerts = merge_triggered_alerts(triggered_alerts, process_synthetic_legs_tick(*decoded_frame[:2], received_at))
+
+        if triggered_alerts:
+            report_triggered_alerts(received_at, triggered_alerts)
+
+    if conflated_price_ticks:  # Last window
+        window_price_ticks, conflated_price_ticks = conflated_price_ticks, {}
+        report_triggered_alerts(received_at, process_conflated_price_ticks(window_price_ticks, received_at))
+
+    return replayed_triggered_alerts
+
+
+def get_message_with_context(alerts_message: str, message_context: str) -> str:
+    if not message_context:
+        return alerts_message
+
+    return f"{alerts_message}\n{message_context}"
+
+
+def get_triggered_alerts_messages(triggered_alerts: list) -> list:
+    if len(triggered_alerts) == 1:
+        messages_header = "<b>An alert has been triggered!</b>\n\n"
+    else:
+        messages_header = f"<b>{len(triggered_alerts)} alerts have been triggered!</b>\n\n"
+
+    triggered_alerts_messages = []
+    current_message = messages_header
+    current_message_context = ""  # Recent history of the pairs of the current message, written after its alerts
+    current_message_pairs = set()
+    pairs_context_lines = {}
+
+    for alert_id, user_id, base_currency, quote_currency, float_alert_price, emoji_direction, alert_condition_text in triggered_alerts:
+        pair_name = f"{base_currency}{quote_currency}"
+
+        alert_line = f"{base_currency} : {format_pair_price(pair_name, float_alert_price)} {quote_currency} ({base_currency}/{quote_currency}) {emoji_direction}"
+        if alert_condition_text:  # Rolling-window and trailing stop alerts also recall their condition, the price being the one that triggered them
+            alert_line += f" {alert_condition_text}"
+        alert_line += "\n"
+        if pair_name not in pairs_context_lines:
+            price_history_text = get_price_history_text(pair_name, is_recent_change_included=True)
+            pairs_context_lines[pair_name] = f"{HISTORY_EMOJI} {base_currency}/{quote_currency} {price_history_text}\n" if price_history_text else ""
+
+        context_line = pairs_context_lines[pair_name] if pair_name not in current_message_pairs else ""
+
+        if len(INBOX_MESSAGE_HEADER) + len(current_message) + len(alert_line) + len(current_message_context) + len(context_line) + 1 > TELEGRAM_MAX_MESSAGE_LENGTH:
+            triggered_alerts_messages.append(get_message_with_context(current_message, current_message_context))
+            current_message = messages_header
+            current_message_context = ""
+            current_message_pairs.clear()
+            context_line = pairs_context_lines[pair_name]
+
+        current_message += alert_line
+        current_message_context += context_line
+        current_message_pairs.add(pair_name)
+
+    triggered_alerts_messages.append(get_message_with_context(current_message, current_message_context))
+
+    return triggered_alerts_messages
+
+
+def get_user_notification_chat_id(user_id: int) -> int:
+    if user_id in users_notification_chat_ids:
+        return users_notification_chat_ids[user_id]
+
+    return LOG_CHANNEL_ID if user_id == MY_USER_ID else user_id  # The other users are notified in their private chat with the bot by default
+
+
+async def send_chat_notifications(chat_id: int):
+    chat_messages = chats_notification_messages[chat_id]
+
+    try:
+        while chat_messages:
+            await send_inbox_message(chat_messages[0], "INFO", chat_id)  # Waits for the rate limit of this chat only
+            chat_messages.popleft()
+
+    finally:  # No "await" since the last check, so no message can have been added in between
+        del chats_notification_messages[chat_id]
+        del chats_notification_tasks[chat_id]
+
+
+def queue_chat_notification(chat_id: int, message: str):
+    # Each chat has its own sender, so that a chat limited by Telegram (e.g. a group, 20 messages per minute) only delays its own alerts
+    chats_notification_messages.setdefault(chat_id, deque()).append(message)
+
+    if chat_id not in chats_notification_tasks:
+        chats_notification_tasks[chat_id] = asyncio.create_task(send_chat_notifications(chat_id))
+
+
+async def notification_worker():
+    while True:
+        triggered_alerts = [await notification_queue.get()]
+
+        try:
+            if NOTIFICATION_COALESCING_SECONDS > 0:
+                await asyncio.sleep(NOTIFICATION_COALESCING_SECONDS)  # Gives the other alerts triggered by the same price movement the time to join this message
+
+            while not notification_queue.empty() and len(triggered_alerts) < MAX_ALERTS_PER_NOTIFICATION:
+                triggered_alerts.append(notification_queue.get_nowait())
+
+            schedule_alerts_deletion([triggered_alert[TRIGGERED_ALERT_ID_INDEX] for triggered_alert in triggered_alerts])
+
+            users_triggered_alerts = {}  # Each user only receives their own alerts
+            for triggered_alert in triggered_alerts:
+                users_triggered_alerts.setdefault(triggered_alert[TRIGGERED_ALERT_USER_ID_INDEX], []).append(triggered_alert)
+
+            for user_id, user_triggered_alerts in users_triggered_alerts.items():
+                for triggered_alerts_message in get_triggered_alerts_messages(user_triggered_alerts):
+                    queue_chat_notification(get_user_notification_chat_id(user_id), triggered_alerts_message)
+
+                request_dashboard_refresh(user_id)
+
+        except Exception:
+            await send_inbox_message(traceback.format_exc(), level="ERROR")
+
+        finally:
+            for _ in triggered_alerts:
+                notification_queue.task_done()
+
+
+def get_pair_feed_worker_id(pair_name: str) -> int:
+    pair_feed_worker_id = pairs_feed_worker_ids.get(pair_name)
+
+    if pair_feed_worker_id is None:  # New pair: given to the feed worker owning the fewest pairs
+        pair_feed_worker_id = feed_workers_pairs_numbers.index(min(feed_workers_pairs_numbers))
+        pairs_feed_worker_ids[pair_name] = pair_feed_worker_id
+        feed_workers_pairs_numbers[pair_feed_worker_id] += 1
+
+    return pair_feed_worker_id
+
+
+def release_pair_feed_worker(pair_name: str):
+    pair_feed_worker_id = pairs_feed_worker_ids.pop(pair_name, None)
+    if pair_feed_worker_id is not None:
+        feed_workers_pairs_numbers[pair_feed_worker_id] -= 1
+
+
+def rebalance_feed_workers():
+    # The pairs leave their feed workers as their last alerts are removed, so the workers can drift apart. The pairs of the busiest worker are then
+    # moved to the idlest one with the same commands as when alerts are added and removed, their last prices following them.
+    moved_pairs_old_worker_ids = {}
+
+    while max(feed_workers_pairs_numbers) - min(feed_workers_pairs_numbers) > FEED_WORKERS_MAX_PAIRS_SPREAD:
+        busiest_worker_id = feed_workers_pairs_numbers.index(max(feed_workers_pairs_numbers))
+        idlest_worker_id = feed_workers_pairs_numbers.index(min(feed_workers_pairs_numbers))
+        moved_pair_name = next(pair_name for pair_name, pair_feed_worker_id in pairs_feed_worker_ids.items()
+                               if pair_feed_worker_id == busiest_worker_id and pair_name not in moved_pairs_old_worker_ids)
+
+        moved_pairs_old_worker_ids[moved_pair_name] = busiest_worker_id
+        pairs_feed_worker_ids[moved_pair_name] = idlest_worker_id
+        feed_workers_pairs_numbers[busiest_worker_id] -= 1
+        feed_workers_pairs_numbers[idlest_worker_id] += 1
+
+    if not moved_pairs_old_worker_ids:
+        return
+
+    for alert_id, alert_infos in alerts_infos_by_id.items():
+        pair_name = f"{alert_infos[1]}{alert_infos[2]}"
+        if pair_name in moved_pairs_old_worker_ids:
+            feed_workers_commands_queues[moved_pairs_old_worker_ids[pair_name]].put((UNREGISTER_ALERT_FEED_COMMAND, alert_id))
+            feed_workers_commands_queues[pairs_feed_worker_ids[pair_name]].put((REGISTER_ALERT_FEED_COMMAND, alert_id, *alert_infos))
+
+    for pair_name, old_worker_id in moved_pairs_old_worker_ids.items():
+        last_price = feed_workers_last_known_prices.get(old_worker_id, {}).get(pair_name)
+        if last_price is not None:
+            feed_workers_commands_queues[pairs_feed_worker_ids[pair_name]].put((SET_LAST_PRICES_FEED_COMMAND, {pair_name: last_price}))
+
+
+def get_queue_items(items_queue) -> list:
+    # Runs in "feed_queues_executor": waits for an item, then also takes the ones already waiting, so that a burst costs a single thread switch
+    try:
+        queue_items = [items_queue.get(timeout=FEED_QUEUES_POLL_SECONDS)]
+    except queue.Empty:
+        return []
+
+    try:
+        while True:
+            queue_items.append(items_queue.get_nowait())
+    except queue.Empty:
+        return queue_items
+
+
+def start_feed_worker(worker_id: int):
+    # "spawn" rather than "fork": a forked process would inherit the threads and the SQLite connection of the coordinator
+    multiprocessing_context = multiprocessing.get_context("spawn")
+    commands_queue = multiprocessing_context.Queue()
+    feed_worker_process = multiprocessing_context.Process(target=run_feed_worker, args=(worker_id, commands_queue, feed_workers_events_queue), daemon=True)
+    feed_worker_process.start()
+
+    if worker_id < len(feed_workers_processes):
+        feed_workers_processes[worker_id] = feed_worker_process
+        feed_workers_commands_queues[worker_id] = commands_queue
+    else:
+        feed_workers_processes.append(feed_worker_process)
+        feed_workers_commands_queues.append(commands_queue)
+
+
+def start_feed_workers():
+    global feed_workers_events_queue
+    feed_workers_events_queue = multiprocessing.get_context("spawn").Queue()
+
+    feed_workers_pairs_numbers[:] = [0] * FEED_WORKERS_NUMBER
+    for worker_id in range(FEED_WORKERS_NUMBER):
+        start_feed_worker(worker_id)
+
+
+async def restart_dead_feed_workers():
+    for worker_id, feed_worker_process in enumerate(feed_workers_processes):
+        if feed_worker_process.is_alive():
+            continue
+
+        await send_inbox_message(f"Feed worker {worker_id} exited with code {feed_worker_process.exitcode}, restarting it.", level="ERROR")
+        start_feed_worker(worker_id)
+        feed_workers_statuses.pop(worker_id, None)
+        worker_last_known_prices = feed_workers_last_known_prices.pop(worker_id, {})
+
+        feed_workers_commands_queues[worker_id].put((SET_SYMBOLS_REGISTRY_FEED_COMMAND, symbols_registry, symbols_registry_updated_at))
+        feed_workers_commands_queues[worker_id].put((SET_SYNTHETIC_PAIRS_FEED_COMMAND, [synthetic_pair[:SYNTHETIC_PAIR_FACTOR_INDEX] for synthetic_pair in synthetic_pairs.values()]))
+        for alert_id, alert_infos in alerts_infos_by_id.items():  # The new process starts without any alert
+            if get_pair_feed_worker_id(f"{alert_infos[1]}{alert_infos[2]}") == worker_id:
+                feed_workers_commands_queues[worker_id].put((REGISTER_ALERT_FEED_COMMAND, alert_id, *alert_infos))
+
+        feed_workers_commands_queues[worker_id].put((SET_LAST_PRICES_FEED_COMMAND, worker_last_known_prices))
+
+
+async def feed_workers_events_loop():  # Coordinator side of the sharded mode
+    global is_websocket_dead
+    event_loop = asyncio.get_running_loop()
+
+    while True:
+        try:
+            for feed_event in await event_loop.run_in_executor(feed_queues_executor, get_queue_items, feed_workers_events_queue):
+                if feed_event[0] == TRIGGERED_ALERTS_FEED_EVENT:
+                    for triggered_alert in feed_event[2]:
+                        alert_infos = forget_alert(triggered_alert[TRIGGERED_ALERT_ID_INDEX])
+                        if alert_infos is None:  # Deleted by its user while the feed worker was triggering it
+                            continue
+
+                        clean_pair_metadata_if_needed(alert_infos[1], alert_infos[2])
+                        await notification_queue.put(triggered_alert)
+
+                elif feed_event[0] == TRAILING_STOPS_ANCHORS_FEED_EVENT:
+                    schedule_trailing_stops_anchors_saving(feed_event[2])
+
+                elif feed_event[0] == INBOX_MESSAGE_FEED_EVENT:
+                    _, worker_id, message, level, chat_id = feed_event
+                    asyncio.create_task(send_inbox_message(f"Feed worker {worker_id}: {message}", level, chat_id))  # Without delaying the triggered alerts
+
+                else:
+                    _, worker_id, worker_is_websocket_dead, connections_number, worker_metrics_counters, worker_metrics_histograms, worker_last_known_prices = feed_event
+                    feed_workers_statuses[worker_id] = [worker_is_websocket_dead, connections_number]
+                    feed_workers_last_known_prices[worker_id] = worker_last_known_prices
+                    merge_metrics(worker_metrics_counters, worker_metrics_histograms)
+
+            is_websocket_dead = any(worker_is_websocket_dead for worker_is_websocket_dead, _ in feed_workers_statuses.values())
+            await restart_dead_feed_workers()
+            rebalance_feed_workers()
+
+        except Exception:
+            await send_inbox_message(traceback.format_exc(), level="ERROR")
+
+
+async def feed_worker_status_loop():
+    while True:
+        await asyncio.sleep(FEED_WORKER_STATUS_SECONDS)
+
+        if not multiprocessing.parent_process().is_alive():  # The coordinator has been killed without being able to stop its workers
+            flush_frames_recording()
+            os._exit(0)
+
+        # The metrics are sent as increments, so that the coordinator only has to add them to its own ones
+        feed_workers_events_queue.put((FEED_WORKER_STATUS_FEED_EVENT, feed_worker_id, is_websocket_dead, len(websocket_shards_connections),
+                                       dict(metrics_counters), dict(metrics_histograms), last_known_prices.copy()))
+        metrics_counters.clear()
+        metrics_histograms.clear()
+
+
+async def feed_worker_main(commands_queue):
+    global websocket_subscriptions_event
+    websocket_subscriptions_event = asyncio.Event()
+
+    asyncio.create_task(websocket_subscriptions_manager())
+    asyncio.create_task(feed_worker_status_loop())
+    asyncio.create_task(trailing_stops_anchors_loop())
+
+    if FRAMES_RECORDING_FILENAME:
+        asyncio.create_task(frames_recording_loop())
+
+    if METRICS_ENABLED:
+        asyncio.create_task(event_loop_lag_monitor())
+
+    event_loop = asyncio.get_running_loop()
+
+    while True:
+        for feed_command in await event_loop.run_in_executor(feed_queues_executor, get_queue_items, commands_queue):
+            if feed_command[0] == REGISTER_ALERT_FEED_COMMAND:
+                register_alert(*feed_command[1:])
+            elif feed_command[0] == SET_SYNTHETIC_PAIRS_FEED_COMMAND:
+                set_synthetic_pairs(feed_command[1])
+            elif feed_command[0] == SET_SYMBOLS_REGISTRY_FEED_COMMAND:
+                set_symbols_registry(*feed_command[1:])
+            elif feed_command[0] == SET_LAST_PRICES_FEED_COMMAND:
+                for pair_name, last_price in feed_command[1].items():
+                    if pair_name in pairs_metadata:
+                        last_known_prices.setdefault(pair_name, last_price)  # A price received in the meantime is more recent
+            else:
+                alert_infos = unregister_alert(feed_command[1])
+                if alert_infos is not None:
+                    clean_pair_metadata_if_needed(alert_infos[1], alert_infos[2])
+
+
+def run_event_loop(main_coroutine):
+    if uvloop is not None and IS_UVLOOP_ENABLED:
+        return uvloop.run(main_coroutine)
+
+    return asyncio.run(main_coroutine)
+
+
+def run_feed_worker(worker_id: int, commands_queue, events_queue):  # Entry point of a feed worker process
+    global feed_worker_id, feed_workers_events_queue, FRAMES_RECORDING_FILENAME
+    feed_worker_id = worker_id
+    feed_workers_events_queue = events_queue
+
+    if FRAMES_RECORDING_FILENAME:  # Each worker records the messages of its own pairs
+        FRAMES_RECORDING_FILENAME = f"{FRAMES_RECORDING_FILENAME}.{worker_id}"
+
+    try:
+        run_event_loop(feed_worker_main(commands_queue))
+
+    except KeyboardInterrupt:
+        flush_frames_recording()
+        disk_io_executor.shutdown()
+
+
+@message_dispatcher.message(Command(START_BOT_COMMAND_NAME), is_allowed_user_filter)
+async def command_start(user_message: types.Message):
+    await user_message.delete()
+    await refresh_dashboard(user_message.chat.id)
+
+
+def is_pair_name_correct(pair_name: str) -> bool:
+    split_pair_name = pair_name.split(PAIR_ARGS_SEPARATOR)
+    if len(split_pair_name) == 2:
+        return split_pair_name[0] != "" and split_pair_name[1] != ""
+    return False
+
+
+def is_currency_name_correct(currency_name: str) -> bool:
+    return currency_name.isalpha()
+
+
+def is_pair_price_correct(pair_price_string: str) -> bool:
+    try:
+        return float(pair_price_string) > 0
+    except ValueError:
+        return False
+
+
+def parse_alert_percent(alert_percent_string: str) -> float:  # "5%" -> 5.0, raises ValueError if incorrect
+    if not alert_percent_string.endswith(PERCENT_SUFFIX):
+        raise ValueError
+
+    alert_percent = float(alert_percent_string[:-len(PERCENT_SUFFIX)])
+    if not 0 < alert_percent < 100:
+        raise ValueError
+
+    return alert_percent
+
+
+def parse_window_duration(window_duration_string: str) -> int:  # "15m" -> 900, raises ValueError if incorrect
+    window_duration_string = window_duration_string.lower()
+    if window_duration_string[-1:] not in DURATION_UNITS_SECONDS:
+        raise ValueError
+
+    window_seconds = int(window_duration_string[:-1]) * DURATION_UNITS_SECONDS[window_duration_string[-1]]
+    if not 0 < window_seconds <= MAX_ROLLING_WINDOW_SECONDS:
+        raise ValueError
+
+    return window_seconds
+
+
+def parse_synthetic_expression(synthetic_expression: str) -> tuple:
+    # "SOLUSDT/ETHUSDT" -> (1.0, [("SOLUSDT", False), ("ETHUSDT", True)]): the constant factor, then the legs and whether they divide, raises ValueError if incorrect
+    expression_tokens = synthetic_expression.upper().replace(SYNTHETIC_MULTIPLY_OPERATOR, f" {SYNTHETIC_MULTIPLY_OPERATOR} ").replace(SYNTHETIC_DIVIDE_OPERATOR, f" {SYNTHETIC_DIVIDE_OPERATOR} ").split()
+    if len(expression_tokens) % 2 == 0:  # Operands and operators must alternate
+        raise ValueError
+
+    constant_factor = 1.0
+    synthetic_legs = []
+
+    for token_index in range(0, len(expression_tokens), 2):
+        expression_operand = expression_tokens[token_index]
+        expression_operator = expression_tokens[token_index - 1] if token_index else SYNTHETIC_MULTIPLY_OPERATOR
+        if expression_operator not in (SYNTHETIC_MULTIPLY_OPERATOR, SYNTHETIC_DIVIDE_OPERATOR) or not expression_operand.replace(".", "").isalnum():
+            raise ValueError
+
+        is_operand_divided = expression_operator == SYNTHETIC_DIVIDE_OPERATOR
+
+        if expression_operand.replace(".", "", 1).isdigit():  # Constant, e.g. to convert a price per 1000 units
+            constant_value = float(expression_operand)
+            if constant_value == 0:
+                raise ValueError
+            constant_factor = constant_factor / constant_value if is_operand_divided else constant_factor * constant_value
+        elif expression_operand.isalnum():  # Binance symbol, e.g. "1000SATSUSDT"
+            synthetic_legs.append((sys.intern(expression_operand), is_operand_divided))
+        else:
+            raise ValueError
+
+    if not 0 < len(synthetic_legs) <= SYNTHETIC_MAX_LEGS:
+        raise ValueError
+
+    return constant_factor, synthetic_legs
+
+
+class UnlistedPairError(ValueError):  # The arguments are correct, but the pair does not exist
+    pass
+
+
+def parse_pair_arg(pair_arg: str) -> tuple:  # "btc/usdt" (or "BTCUSDT" once the registry is loaded) -> ("BTC", "USDT"), raises ValueError if incorrect
+    raw_pair = pair_arg.upper()
+
+    if raw_pair in symbols_registry:
+        symbol_infos = symbols_registry[raw_pair]
+        return symbol_infos[SYMBOLS_REGISTRY_BASE_CURRENCY_INDEX], symbol_infos[SYMBOLS_REGISTRY_QUOTE_CURRENCY_INDEX]
+
+    if not is_pair_name_correct(raw_pair):
+        raise ValueError
+
+    base_currency, quote_currency = raw_pair.split(PAIR_ARGS_SEPARATOR)
+
+    if f"{base_currency}{quote_currency}" in symbols_registry:  # Also accepts the currencies having digits, e.g. "1000SATS"
+        return base_currency, quote_currency
+
+    if not is_currency_name_correct(base_currency) or not is_currency_name_correct(quote_currency):
+        raise ValueError
+
+    return base_currency, quote_currency
+
+
+def parse_alert_args(alert_args: list) -> tuple:
+    # Returns the base currency, quote currency, type, price, percentage and window of the alert described by the arguments of "/add", raises ValueError if incorrect
+    if len(alert_args) not in (2, 3): raise ValueError
+
+    base_currency, quote_currency = parse_pair_arg(alert_args[0])
+    alert_condition = parse_alert_condition(alert_args[1:])
+
+    pair_name = f"{base_currency}{quote_currency}"
+    if not is_pair_listed(pair_name) and pair_name not in synthetic_pairs:  # Checked before the pair reaches the subscriptions
+        raise UnlistedPairError(f"{base_currency}{PAIR_ARGS_SEPARATOR}{quote_currency}")
+
+    return (base_currency, quote_currency) + alert_condition
+
+
+def get_alert_command_args(base_currency: str, quote_currency: str, alert_price: float, alert_type: str, alert_percent: float, window_seconds: int) -> list:
+    # Inverse of "parse_alert_args", used by the exports so that they can be imported again
+    pair_arg = f"{base_currency}{PAIR_ARGS_SEPARATOR}{quote_currency}"
+
+    if alert_type == PRICE_ALERT_TYPE:
+        return [pair_arg, repr(alert_price)]
+    if alert_type == BREAKOUT_ALERT_TYPE:
+        return [pair_arg, BREAKOUT_ALERT_KEYWORD, format_window_duration(window_seconds)]
+    if alert_type == TRAILING_STOP_ALERT_TYPE:
+        return [pair_arg, TRAILING_STOP_ALERT_KEYWORD, f"{alert_percent!r}{PERCENT_SUFFIX}"]
+
+    percent_sign = {RISE_ALERT_TYPE: "+", DROP_ALERT_TYPE: "-"}.get(alert_type, "")
+    return [pair_arg, f"{percent_sign}{alert_percent!r}{PERCENT_SUFFIX}", format_window_duration(window_seconds)]
+
+
+def parse_imported_alerts(imported_text: str) -> tuple:
+    # Every line is validated before anything is imported: returns the parsed alerts and the numbers of the incorrect lines
+    imported_alerts = []
+    incorrect_line_numbers = []
+
+    for line_number, imported_line in enumerate(imported_text.splitlines(), 1):
+        alert_args = imported_line.replace(",", " ").split()
+        if not alert_args or alert_args[0].startswith("#"):  # Empty lines and comments
+            continue
+
+        try:
+            imported_alerts.append(parse_alert_args(alert_args))
+        except ValueError:
+            incorrect_line_numbers.append(line_number)
+
+    return imported_alerts, incorrect_line_numbers
+
+
+def parse_alert_condition(condition_args: list) -> tuple:
+    # Returns the type, price, percentage and window of the alert described by the arguments following the pair, raises ValueError if incorrect
+    if len(condition_args) == 1:  # PRICE
+        if not is_pair_price_correct(condition_args[0]):
+            raise ValueError
+        return PRICE_ALERT_TYPE, float(condition_args[0]), None, None
+
+    if len(condition_args) != 2:
+        raise ValueError
+
+    condition_keyword, condition_value = condition_args[0].lower(), condition_args[1]
+
+    if condition_keyword == BREAKOUT_ALERT_KEYWORD:  # breakout DURATION
+        return BREAKOUT_ALERT_TYPE, 0.0, None, parse_window_duration(condition_value)
+
+    if condition_keyword == TRAILING_STOP_ALERT_KEYWORD:  # trail P%
+        return TRAILING_STOP_ALERT_TYPE, 0.0, parse_alert_percent(condition_value), None
+
+    # [+|-]P% DURATION
+    alert_type = {"+": RISE_ALERT_TYPE, "-": DROP_ALERT_TYPE}.get(condition_keyword[0], MOVE_ALERT_TYPE)
+    alert_percent = parse_alert_percent(condition_keyword if alert_type == MOVE_ALERT_TYPE else condition_keyword[1:])
+
+    return alert_type, 0.0, alert_percent, parse_window_duration(condition_value)
+
+
+@message_dispatcher.message(Command(ADD_ALERT_COMMAND_NAME), is_allowed_user_filter)
+async def command_add(user_message: types.Message):
+    try:
+        base_currency, quote_currency, alert_type, float_alert_price, alert_percent, window_seconds = parse_alert_args(user_message.text.split()[1:])
+
+        user_id = user_message.from_user.id
+        new_alert_id = await run_in_database_thread(insert_alert_into_database, user_id, base_currency, quote_currency, float_alert_price,
+                                                    alert_type, alert_percent, window_seconds)
+        register_alert(new_alert_id, user_id, base_currency, quote_currency, float_alert_price, alert_type, alert_percent, window_seconds)
+
+        await user_message.delete()
+        request_dashboard_refresh(user_message.chat.id)
+
+    except ValueError as parsing_error:
+        bot_answer = await user_message.answer(UNLISTED_PAIR_MESSAGE.format(parsing_error) if isinstance(parsing_error, UnlistedPairError) else SYNTAX_MESSAGE, parse_mode="Markdown")
+        await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
+        try:
+            await user_message.delete()
+            await bot_answer.delete()
+        except:
+            pass
+
+
+@message_dispatcher.callback_query(F.data.startswith(ASK_ALERT_DELETION_PREFIX_CALLBACK), is_allowed_user_filter)
+async def callback_ask_delete(callback: types.CallbackQuery):
+    alert_id = int(callback.data.split(ALERT_CALLBACK_SEPARATOR)[ALERT_ID_INDEX])
+    alert_infos = alerts_infos_by_id.get(alert_id)
+    
+    if not alert_infos or alert_infos[0] != callback.from_user.id:  # Users can only see the alerts they own
+        await callback.answer(ALERT_ALREADY_REMOVED_MESSAGE)
+        await refresh_dashboard(callback.message.chat.id)
+        return
+
+    _, base_currency, quote_currency, alert_price, alert_type, alert_percent, window_seconds = alert_infos
+    if alert_type == PRICE_ALERT_TYPE:
+        confirm_deletion_text = f"{TRASH_EMOJI} Are you sure you want to remove the alert for {base_currency} at {format_pair_price(f'{base_currency}{quote_currency}', alert_price)} {quote_currency} ? ({base_currency}/{quote_currency})"
+    else:
+        confirm_deletion_text = f"{TRASH_EMOJI} Are you sure you want to remove the {get_alert_condition_text(alert_type, alert_percent, window_seconds)} alert for {base_currency} ? ({base_currency}/{quote_currency})"
+    
+    confirm_alert_deletion_layout = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text=CANCEL_TEXT_BUTTON, callback_data=BACK_TO_DASHBOARD_CALLBACK),
+            InlineKeyboardButton(text=CONFIRM_TEXT_BUTTON, callback_data=f"{CONFIRM_ALERT_DELETION_PREFIX_CALLBACK}{alert_id}"),
+        ]
+    ])
+    
+    await callback.message.edit_text(confirm_deletion_text, reply_markup=confirm_alert_deletion_layout)
+    dashboard_contents_hashes.pop(callback.message.chat.id, None)  # The dashboard message no longer displays the alerts, so the next refresh must edit it
+    await callback.answer()
+
+
+@message_dispatcher.callback_query(F.data == BACK_TO_DASHBOARD_CALLBACK, is_allowed_user_filter)
 async def cancel_deletion_callback(callback: types.CallbackQuery):
     await refresh_dashboard(callback.message.chat.id)
     await callback.answer()
 
 
-@message_dispatcher.callback_query(F.data.startswith(CONFIRM_ALERT_DELETION_PREFIX_CALLBACK), is_owner_filter)
+@message_dispatcher.callback_query(F.data.startswith(CONFIRM_ALERT_DELETION_PREFIX_CALLBACK), is_allowed_user_filter)
 async def confirm_deletion_callback(callback: types.CallbackQuery):
     alert_id = int(callback.data.split(ALERT_CALLBACK_SEPARATOR)[ALERT_ID_INDEX])
-    
-    pair_name_list_query_result = database_cursor.execute(f"""
-        SELECT {BASE_CURRENCY_DATABASE_FIELD}, {QUOTE_CURRENCY_DATABASE_FIELD}
-        FROM {DATABASE_NAME}
-        WHERE {ALERT_ID_DATABASE_FIELD} = ?
-    """, (alert_id,))
-    pair_name_list = pair_name_list_query_result.fetchone()
-
-    if not pair_name_list:
+
+    alert_infos = alerts_infos_by_id.get(alert_id)
+    if alert_infos and alert_infos[0] == callback.from_user.id:  # Users can only delete the alerts they own
+        alert_infos = unregister_alert(alert_id)
+    else:
+        alert_infos = None
+
+    if not alert_infos:
         await callback.answer(ALERT_ALREADY_REMOVED_MESSAGE)
         await refresh_dashboard(callback.message.chat.id)
         return
     
-    database_cursor.execute(f"""
-        DELETE FROM {DATABASE_NAME}
-        WHERE {ALERT_ID_DATABASE_FIELD} = ?
-    """, (alert_id,))
-    database_connection.commit()
+    schedule_alerts_deletion([alert_id])
     
     await callback.answer("Alert deleted.")
     
-    base_currency, quote_currency = pair_name_list
+    base_currency, quote_currency = alert_infos[1:3]
+
+    clean_pair_metadata_if_needed(base_currency, quote_currency)
+    await refresh_dashboard(callback.message.chat.id)
+
+
+@message_dispatcher.message(Command(TARGET_COMMAND_NAME), is_allowed_user_filter)
+async def command_target(user_message: types.Message):
+    # Chooses the chat (e.g. a group or a channel where the bot is admin) where the triggered alerts of the user are sent
+    command_args = user_message.text.split()[1:]
+    await user_message.delete()
+
+    try:
+        if len(command_args) > 1: raise ValueError
+        notification_chat_id = int(command_args[0]) if command_args else user_message.chat.id
+
+    except ValueError:
+        bot_answer = await user_message.answer(TARGET_SYNTAX_MESSAGE, parse_mode="Markdown")
+        await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
+        try:
+            await bot_answer.delete()
+        except:
+            pass
+        return
+
+    user_id = user_message.from_user.id
+
+    try:  # The bot must be able to reach the chat, and the user must be part of it (so that alerts cannot be sent to anyone else's chat)
+        chat_member = await send_telegram_request(bot.get_chat_member, notification_chat_id, user_id=user_id)
+        is_target_reachable = chat_member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED)
+    except TelegramAPIError:
+        is_target_reachable = False
+
+    if is_target_reachable:
+        await run_in_database_thread(save_user_notification_chat_id, user_id, notification_chat_id)
+        users_notification_chat_ids[user_id] = notification_chat_id
+        answer_text = f"🎯 Your alerts will now be sent to <code>{notification_chat_id}</code>."
+    else:
+        answer_text = TARGET_UNREACHABLE_MESSAGE.format(notification_chat_id)
+
+    bot_answer = await user_message.answer(answer_text, parse_mode="HTML")
+    await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
+    try:
+        await bot_answer.delete()
+    except:
+        pass
+
+
+def get_synthetic_pairs_text() -> str:
+    if not synthetic_pairs:
+        return "🧮 No synthetic pair is defined yet."
+
+    synthetic_pairs_lines = [
+        f"<code>{base_currency}/{quote_currency}</code>  =  <code>{synthetic_expression}</code>"
+        for base_currency, quote_currency, synthetic_expression, _, _ in sorted(synthetic_pairs.values())
+    ]
+    return "🧮  <b>Synthetic pairs</b>\n\n" + "\n".join(synthetic_pairs_lines)
+
+
+@message_dispatcher.message(Command(SYNTHETIC_COMMAND_NAME), is_allowed_user_filter)
+async def command_synthetic(user_message: types.Message):
+    # Defines a pair computed from the prices of other pairs (e.g. SOL/ETH from SOLUSDT and ETHUSDT), on which alerts are then added like on any pair
+    command_args = user_message.text.split()[1:]
+    await user_message.delete()
+
+    if not command_args:
+        await user_message.answer(get_synthetic_pairs_text(), parse_mode="HTML")
+        return
+
+    try:
+        base_currency, quote_currency = parse_pair_arg(command_args[0])
+        synthetic_expression = "".join(command_args[1:]).upper()
+        synthetic_legs = parse_synthetic_expression(synthetic_expression)[1] if synthetic_expression else []
+
+    except ValueError:
+        bot_answer = await user_message.answer(SYNTHETIC_SYNTAX_MESSAGE, parse_mode="Markdown")
+        await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
+        try:
+            await bot_answer.delete()
+        except:
+            pass
+        return
+
     pair_name = f"{base_currency}{quote_currency}"
 
-    if pair_name in active_alerts_cache:
-        active_alerts_cache[pair_name] = [
-            alert_infos for alert_infos in active_alerts_cache[pair_name] 
-            if alert_infos[ACTIVE_ALERTS_CACHE_ALERT_ID_INDEX] != alert_id
-        ]
+    if pair_name in pairs_subscribers:  # Its alerts were set on the previous prices of the pair
+        answer_text = f"❌ <b>{base_currency}/{quote_currency}</b> has alerts, they must be deleted before changing the pair."
+    elif synthetic_expression and pair_name in symbols_registry:  # Its ticks from Binance would be mixed with the computed prices
+        answer_text = f"❌ <b>{base_currency}/{quote_currency}</b> is listed on Binance, it cannot be a synthetic pair."
+    elif pair_name in legs_synthetic_pairs or any(leg_pair_name == pair_name or leg_pair_name in synthetic_pairs for leg_pair_name, _ in synthetic_legs):
+        answer_text = "❌ A synthetic pair cannot be computed from another synthetic pair."
+    elif any(not is_pair_listed(leg_pair_name) for leg_pair_name, _ in synthetic_legs):
+        unlisted_leg_names = ", ".join(leg_pair_name for leg_pair_name, _ in synthetic_legs if not is_pair_listed(leg_pair_name))
+        answer_text = f"❌ Not listed on Binance:  <code>{unlisted_leg_names}</code>"
+    elif not synthetic_expression and pair_name not in synthetic_pairs:
+        answer_text = f"❌ <b>{base_currency}/{quote_currency}</b> is not a synthetic pair."
+    else:
+        synthetic_pairs_rows = {synthetic_pair_name: synthetic_pair[:SYNTHETIC_PAIR_FACTOR_INDEX] for synthetic_pair_name, synthetic_pair in synthetic_pairs.items()}
 
-    await clean_pair_metadata_if_needed(base_currency, quote_currency)
-    await refresh_dashboard(callback.message.chat.id)
+        if synthetic_expression:
+            await run_in_database_thread(save_synthetic_pair, base_currency, quote_currency, synthetic_expression)
+            synthetic_pairs_rows[pair_name] = [base_currency, quote_currency, synthetic_expression]
+            answer_text = f"🧮 <b>{base_currency}/{quote_currency}</b> is now computed as <code>{synthetic_expression}</code>."
+        else:
+            await run_in_database_thread(delete_synthetic_pair_from_database, base_currency, quote_currency)
+            synthetic_pairs_rows.pop(pair_name)
+            answer_text = f"🗑 <b>{base_currency}/{quote_currency}</b> is no longer a synthetic pair."
+
+        set_synthetic_pairs(list(synthetic_pairs_rows.values()))
+
+    bot_answer = await user_message.answer(answer_text, parse_mode="HTML")
+    await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
+    try:
+        await bot_answer.delete()
+    except:
+        pass
+
+
+@message_dispatcher.message(Command(IMPORT_COMMAND_NAME), is_allowed_user_filter)
+async def command_import(user_message: types.Message):
+    # Adds many alerts at once: the alerts follow the command (one per line), or are in a file sent with "/import" as caption
+    if user_message.document is not None and user_message.document.file_size > MAX_IMPORT_FILE_BYTES:
+        imported_text = None  # Not even downloaded
+    elif user_message.document is not None:
+        imported_file = await bot.download(user_message.document)
+        imported_text = imported_file.read().decode("utf-8-sig", errors="replace")
+    else:
+        command_text_parts = (user_message.text or "").split(maxsplit=1)  # The alerts can start on the line of the command
+        imported_text = command_text_parts[1] if len(command_text_parts) == 2 else ""
+
+    await user_message.delete()
+
+    imported_alerts, incorrect_line_numbers = parse_imported_alerts(imported_text or "")
+
+    if imported_text is None:
+        answer_text = IMPORT_FILE_TOO_LARGE_MESSAGE
+
+    elif incorrect_line_numbers:  # Nothing is imported, so that the file can simply be fixed and sent again
+        incorrect_lines_text = ", ".join(str(line_number) for line_number in incorrect_line_numbers[:MAX_REPORTED_IMPORT_ERRORS])
+        if len(incorrect_line_numbers) > MAX_REPORTED_IMPORT_ERRORS:
+            incorrect_lines_text += f"… ({len(incorrect_line_numbers)} lines)"
+        answer_text = f"❌ Nothing has been imported, the following lines are incorrect:  <code>{incorrect_lines_text}</code>"
+
+    elif not imported_alerts:
+        answer_text = None
+
+    else:
+        imported_alerts.sort(key=lambda imported_alert: imported_alert[3])  # Sorted by price, so that they are mostly appended at the end of the arrays of their pair
+
+        user_id = user_message.from_user.id
+        new_alert_ids = await run_in_database_thread(insert_alerts_into_database, user_id, imported_alerts)
+
+        # Registered without yielding to the event loop: the new pairs are subscribed with a single update of the WebSocket subscriptions
+        for new_alert_id, (base_currency, quote_currency, alert_type, float_alert_price, alert_percent, window_seconds) in zip(new_alert_ids, imported_alerts):
+            register_alert(new_alert_id, user_id, base_currency, quote_currency, float_alert_price, alert_type, alert_percent, window_seconds)
+
+        request_dashboard_refresh(user_message.chat.id)
+        answer_text = f"📥 <code>{len(new_alert_ids)}</code> alerts imported."
+
+    if answer_text is None:
+        bot_answer = await user_message.answer(IMPORT_SYNTAX_MESSAGE, parse_mode="Markdown")
+    else:
+        bot_answer = await user_message.answer(answer_text, parse_mode="HTML")
+
+    await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
+    try:
+        await bot_answer.delete()
+    except:
+        pass
+
+
+@message_dispatcher.message(Command(EXPORT_COMMAND_NAME), is_allowed_user_filter)
+async def command_export(user_message: types.Message):
+    # Sends the alerts of the user as a CSV file, in the format read by "/import"
+    await user_message.delete()
+
+    export_file_descriptor, export_filename = tempfile.mkstemp(suffix=".csv")
+    os.close(export_file_descriptor)
+
+    try:
+        await wait_for_alerts_group_commit()  # Otherwise the alerts triggered during the last group commit window would be exported
+        exported_alerts_number = await run_in_database_thread(write_user_alerts_export, user_message.from_user.id, export_filename)
+
+        if exported_alerts_number == 0:
+            bot_answer = await user_message.answer(NO_ACTIVE_ALERTS_TEXT)
+            await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
+            try:
+                await bot_answer.delete()
+            except:
+                pass
+            return
+
+        await send_telegram_request(
+            bot.send_document,
+            user_message.chat.id,
+            document=FSInputFile(export_filename, filename=ALERTS_EXPORT_FILENAME),
+            caption=f"📤 <code>{exported_alerts_number}</code> alerts exported.",
+            parse_mode="HTML"
+        )
+
+    finally:
+        os.remove(export_filename)
+
+
+def get_stats_text() -> str:
+    uptime_seconds = time.time() - metrics_start_time
+    frames_number = get_metric_total(FRAMES_RECEIVED_METRIC)
+
+    frames_per_pair = sorted(((metric_value, label) for (metric_name, label), metric_value in metrics_counters.items() if metric_name == FRAMES_RECEIVED_METRIC), reverse=True)
+    busiest_pairs_text = "\n".join(f"  <code>{pair_name}</code>  {pair_frames_number / uptime_seconds:.1f}/s" for pair_frames_number, pair_name in frames_per_pair[:5])
+
+    stats_lines = [
+        f"📊  <b>Statistics</b>  (for the last <code>{int(uptime_seconds // 3600)}h{int(uptime_seconds % 3600 // 60):02d}</code>)\n",
+        f"📥  Frames:  <code>{frames_number}</code>  ({frames_number / uptime_seconds:.1f}/s)",
+        busiest_pairs_text,
+        f"🔔  Triggered alerts:  <code>{get_metric_total(ALERTS_TRIGGERED_METRIC)}</code>",
+        f"🔌  Reconnections:  <code>{get_metric_total(WEBSOCKET_RECONNECTIONS_METRIC)}</code>",
+        f"⚠️  Telegram errors:  <code>{get_metric_total(TELEGRAM_ERRORS_METRIC)}</code>\n",
+    ]
+
+    for gauge_name, gauge_value in get_gauges().items():
+        stats_lines.append(f"{gauge_name.replace('_', ' ').capitalize()}:  <code>{gauge_value}</code>")
+
+    stats_lines.append("\n<i>Latencies (p50 / p99, upper bounds)</i>")
+    for metric_name in (FRAME_DECODING_METRIC, CROSSING_CHECK_METRIC, DATABASE_QUERY_METRIC, TELEGRAM_REQUEST_METRIC, EVENT_LOOP_LAG_METRIC):
+        metric_label = metric_name.rsplit("_", 1)[0].replace("_", " ").capitalize()
+        stats_lines.append(f"{metric_label}:  <code>{format_duration(get_histogram_quantile(metric_name, 0.5))}</code> / <code>{format_duration(get_histogram_quantile(metric_name, 0.99))}</code>")
+
+    return "\n".join(line for line in stats_lines if line)
+
+
+@message_dispatcher.message(Command(STATS_COMMAND_NAME), is_owner_filter)
+async def command_stats(user_message: types.Message):
+    await user_message.delete()
+
+    if not METRICS_ENABLED:
+        await user_message.answer("📊 Metrics are disabled. Set <code>METRICS_ENABLED=1</code> to enable them.", parse_mode="HTML")
+        return
+
+    await user_message.answer(get_stats_text(), parse_mode="HTML")
+
+
+def record_profile_sample(signal_number: int, interrupted_frame):
+    # Timer signal handler, run by the main thread (the event loop) between two bytecodes. A sampling thread would instead only see
+    # the event loop when it releases the GIL, i.e. when it is idle. The other threads are sampled at the same time (SQLite releases the GIL)
+    global profile_samples_number
+    main_thread_id = threading.get_ident()
+
+    for thread_id, thread_frame in sys._current_frames().items():
+        if thread_id == main_thread_id:
+            thread_frame = interrupted_frame  # Rather than the frame of this handler
+
+        if thread_id not in profiled_threads_names:  # Threads can be started during the profile
+            profiled_threads_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+
+        thread_stack = []
+        while thread_frame is not None:
+            thread_stack.append(thread_frame.f_code)
+            thread_frame = thread_frame.f_back
+
+        stack_key = (profiled_threads_names.get(thread_id, str(thread_id)), tuple(thread_stack))
+        profile_stacks_samples[stack_key] = profile_stacks_samples.get(stack_key, 0) + 1
+
+    profile_samples_number += 1
+
+
+async def sample_threads_stacks(profile_seconds: float) -> tuple:
+    # Returns {(thread name, stack from the innermost frame): number of samples} and the number of samples
+    global profile_stacks_samples, profile_samples_number
+    profile_stacks_samples = {}
+    profile_samples_number = 0
+
+    previous_signal_handler = signal.signal(signal.SIGALRM, record_profile_sample)
+    signal.setitimer(signal.ITIMER_REAL, PROFILER_SAMPLING_SECONDS, PROFILER_SAMPLING_SECONDS)
+    try:
+        await asyncio.sleep(profile_seconds)
+    finally:  # Nothing is left running once the profile is over
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_signal_handler)
+
+    stacks_samples, profile_stacks_samples = profile_stacks_samples, None
+    return stacks_samples, profile_samples_number
+
+
+def get_code_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def get_sample_category(thread_name: str, thread_stack: tuple) -> str:
+    if (os.path.basename(thread_stack[0].co_filename), thread_stack[0].co_name) in PROFILE_IDLE_FUNCTIONS:
+        return PROFILE_IDLE_CATEGORY
+
+    if thread_name.startswith(DATABASE_THREAD_NAME_PREFIX):
+        return PROFILE_SQLITE_CATEGORY
+
+    stack_functions_names = {code.co_name for code in thread_stack}
+    for category_name, category_functions_names in PROFILE_CATEGORIES_FUNCTIONS.items():
+        if not stack_functions_names.isdisjoint(category_functions_names):
+            return category_name
+
+    for category_name, category_packages in PROFILE_CATEGORIES_PACKAGES.items():
+        for code in thread_stack:
+            if any(f"{os.sep}{package_name}{os.sep}" in code.co_filename for package_name in category_packages):
+                return category_name
+
+    return PROFILE_OTHER_CATEGORY
+
+
+def get_profile_reports(stacks_samples: dict, samples_number: int, profile_seconds: float) -> tuple:
+    # Returns the text report (time per category and per thread, then the top functions) and the collapsed stacks
+    threads_categories_samples = {}
+    self_samples = {}
+    total_samples = {}
+    collapsed_stacks_lines = []
+    busy_samples_number = 0
+
+    for (thread_name, thread_stack), stack_samples_number in stacks_samples.items():
+        collapsed_stacks_lines.append(f"{thread_name};{';'.join(get_code_name(code) for code in reversed(thread_stack))} {stack_samples_number}")
+
+        sample_category = get_sample_category(thread_name, thread_stack)
+        thread_categories_samples = threads_categories_samples.setdefault(thread_name, {})
+        thread_categories_samples[sample_category] = thread_categories_samples.get(sample_category, 0) + stack_samples_number
+
+        if sample_category == PROFILE_IDLE_CATEGORY:
+            continue
+
+        busy_samples_number += stack_samples_number
+        self_samples[get_code_name(thread_stack[0])] = self_samples.get(get_code_name(thread_stack[0]), 0) + stack_samples_number
+        for code_name in {get_code_name(code) for code in thread_stack}:  # Recursive functions are only counted once per sample
+            total_samples[code_name] = total_samples.get(code_name, 0) + stack_samples_number
+
+    event_loop_name = type(asyncio.get_running_loop()).__module__.split(".")[0]
+    report_lines = [
+        f"Profile of {profile_seconds:g} s, {samples_number} samples every {PROFILER_SAMPLING_SECONDS * 1000:g} ms, {event_loop_name} event loop",
+        f"The feed worker processes are not profiled ({FEED_WORKERS_NUMBER} running)\n" if FEED_WORKERS_NUMBER else "",
+        "Time per thread and category (% of the samples):",
+    ]
+
+    for thread_name, thread_categories_samples in sorted(threads_categories_samples.items()):
+        report_lines.append(f"  {thread_name}")
+        for category_name, category_samples_number in sorted(thread_categories_samples.items(), key=lambda category: -category[1]):
+            report_lines.append(f"    {category_name:<20} {category_samples_number / samples_number:>7.1%}")
+
+    for title, functions_samples in (("Self time", self_samples), ("Total time", total_samples)):
+        report_lines.append(f"\nTop functions by {title.lower()} (% of the busy samples):")
+        for code_name, function_samples_number in sorted(functions_samples.items(), key=lambda function: -function[1])[:PROFILE_TOP_FUNCTIONS_NUMBER]:
+            report_lines.append(f"  {function_samples_number / max(busy_samples_number, 1):>7.1%}  {code_name}")
+
+    return "\n".join(line for line in report_lines if line), "\n".join(collapsed_stacks_lines) + "\n"
+
+
+@message_dispatcher.message(Command(PROFILE_COMMAND_NAME), is_owner_filter)
+async def command_profile(user_message: types.Message):
+    # Samples the stacks of the running bot (without restarting it) and sends the report to the log channel
+    command_args = user_message.text.split()[1:]
+    await user_message.delete()
+
+    try:
+        if len(command_args) > 1 or not hasattr(signal, "setitimer"): raise ValueError  # The timer signals are not available on Windows
+        profile_seconds = float(command_args[0]) if command_args else PROFILE_DEFAULT_SECONDS
+        if not 0 < profile_seconds <= PROFILE_MAX_SECONDS: raise ValueError
+
+    except ValueError:
+        bot_answer = await user_message.answer(PROFILE_SYNTAX_MESSAGE, parse_mode="Markdown")
+        await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
+        try:
+            await bot_answer.delete()
+        except:
+            pass
+        return
+
+    if profile_stacks_samples is not None:
+        bot_answer = await user_message.answer("🔬 A profile is already running.")
+        await asyncio.sleep(MESSAGE_SECONDS_TIMEOUT)
+        try:
+            await bot_answer.delete()
+        except:
+            pass
+        return
+
+    stacks_samples, samples_number = await sample_threads_stacks(profile_seconds)
+    profile_report, collapsed_stacks = get_profile_reports(stacks_samples, samples_number, profile_seconds)
+
+    await send_telegram_request(
+        bot.send_document,
+        LOG_CHANNEL_ID,
+        document=BufferedInputFile(profile_report.encode(), filename=PROFILE_REPORT_FILENAME),
+        caption=f"🔬 Profile of {profile_seconds:g} seconds"
+    )
+    await send_telegram_request(
+        bot.send_document,
+        LOG_CHANNEL_ID,
+        document=BufferedInputFile(collapsed_stacks.encode(), filename=PROFILE_STACKS_FILENAME)
+    )
+
+
+async def refresh_all_dashboards():
+    for user_id in {MY_USER_ID} | users_alert_ids.keys() | pinned_dashboard_ids.keys():
+        try:
+            await refresh_dashboard(user_id)
+        except Exception as e:  # A user who blocked the bot must not prevent the other dashboards from being refreshed
+            print(f"Error while refreshing the dashboard of {user_id}: {e}")
 
 
 async def heartbeat_loop():
@@ -501,7 +3622,7 @@ async def heartbeat_loop():
             # while the system clock moves to 16:10:00.001, which means that "seconds_to_sleep" variable can have a negative value
             # - "+ 0.5" ensures that we are at the next minute (and not at 16:39:59.999, for example)
             
-            await refresh_dashboard(MY_USER_ID)
+            await refresh_all_dashboards()
 
         except Exception as e:
             print(f"Error in heartbeat: {e}")
@@ -510,23 +3631,78 @@ async def heartbeat_loop():
 
 async def main():
     print("=== Bot started ===")
+
+    global websocket_subscriptions_event, notification_queue
+    websocket_subscriptions_event = asyncio.Event()
+    notification_queue = asyncio.Queue(maxsize=NOTIFICATION_QUEUE_MAX_SIZE)
+
+    if FEED_WORKERS_NUMBER:  # Started first, so that the alerts loaded from the database can be sent to them
+        start_feed_workers()
+        asyncio.create_task(feed_workers_events_loop())
     
+    await load_symbols_registry()  # Before the alerts, so that the unlisted pairs are never subscribed
+    asyncio.create_task(symbols_registry_loop())
+
+    set_synthetic_pairs(await run_in_database_thread(fetch_all_synthetic_pairs_from_database))  # Before the alerts, so that the synthetic pairs are followed through their legs
     await load_pairs_metadata_from_database()
+    await report_unlisted_pairs()
+
+    if PRICES_SNAPSHOT_FILENAME:
+        await load_prices_snapshot()
+        asyncio.create_task(prices_snapshot_loop())
+
+    if PRICE_HISTORY_FILENAME:
+        await open_price_history()
+        asyncio.create_task(price_history_loop())
+
+    await refresh_all_dashboards()
 
-    await refresh_dashboard(MY_USER_ID)
+    for _ in range(NOTIFICATION_WORKERS_NUMBER):
+        asyncio.create_task(notification_worker())
 
-    global websocket_task
-    websocket_task = asyncio.create_task(run_websocket_listener())
+    if not FEED_WORKERS_NUMBER:
+        asyncio.create_task(websocket_subscriptions_manager())
+        asyncio.create_task(trailing_stops_anchors_loop())
+        request_websocket_subscriptions_update()
     
     asyncio.create_task(heartbeat_loop())
 
+    if FRAMES_RECORDING_FILENAME and not FEED_WORKERS_NUMBER:  # Otherwise, each feed worker records its own messages
+        asyncio.create_task(frames_recording_loop())
+
+    if METRICS_ENABLED:
+        asyncio.create_task(event_loop_lag_monitor())
+
+        if METRICS_HTTP_PORT:
+            await asyncio.start_server(handle_metrics_http_request, "127.0.0.1", METRICS_HTTP_PORT)
+
     await bot.delete_webhook(drop_pending_updates=True)
     await message_dispatcher.start_polling(bot)
 
 
 if __name__ == "__main__":
+    if is_replay_mode:  # Works on a temporary copy of the database, so that the database of the bot is never modified by it
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as replay_database_directory:
+            open_alerts_database(copy_alerts_database(ALERTS_DATABASE_FILENAME, replay_database_directory))
+            asyncio.run(replay_frames_recording(command_line_arguments.replay, command_line_arguments.realtime))
+            database_connection.close()
+        sys.exit()
+
+    open_alerts_database(ALERTS_DATABASE_FILENAME)
+
     try:
-        asyncio.run(main())
+        run_event_loop(main())
 
     except KeyboardInterrupt:
+        flush_frames_recording()
+        disk_io_executor.shutdown()
+
+        if is_prices_snapshot_loaded:
+            write_prices_snapshot(get_prices_snapshot())
+
+        if price_history_memory_map is not None:
+            price_history_memory_map.flush()
+
+        database_executor.shutdown()
+        delete_alerts_from_database(pending_deleted_alert_ids, pending_trailing_stops_anchors)  # Changes that were waiting for the next group commit
         database_connection.close()
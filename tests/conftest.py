@@ -0,0 +1,39 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+
+# The bot reads its configuration when it is imported, and its database is opened in the working directory, so both are pointed to a temporary directory first
+os.environ.setdefault("BOT_TOKEN", "123456789:TestsTestsTestsTestsTestsTestsTests")
+os.environ.setdefault("MY_USER_ID", "1")
+os.environ.setdefault("LOG_CHANNEL_ID", "-1001")
+os.environ["PRICES_SNAPSHOT_FILENAME"] = ""
+os.chdir(tempfile.mkdtemp(prefix="crypto_alerts_bot_tests_"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crypto_alerts_bot  # noqa: E402
+
+crypto_alerts_bot.open_alerts_database(crypto_alerts_bot.ALERTS_DATABASE_FILENAME)  # In the temporary working directory
+
+
+ALERTS_STATE_NAMES = [
+    "active_alerts_cache", "alerts_infos_by_id", "pairs_rolling_alerts", "users_alert_ids", "pairs_subscribers", "users_notification_chat_ids", "pairs_metadata",
+    "last_known_prices", "conflated_price_ticks", "pairs_last_update_ids", "synthetic_pairs", "legs_synthetic_pairs", "synthetic_legs_prices",
+    "symbols_registry", "reported_unlisted_pair_names", "prices_snapshot_entries", "raised_trailing_stops_pairs", "pending_trailing_stops_anchors",
+]
+
+
+def reset_bot_state():
+    for state_name in ALERTS_STATE_NAMES:
+        getattr(crypto_alerts_bot, state_name).clear()
+    crypto_alerts_bot.websocket_subscriptions_event = asyncio.Event()
+
+
+@pytest.fixture
+def bot():
+    # Every test starts without any alert nor price
+    reset_bot_state()
+    return crypto_alerts_bot
@@ -0,0 +1,42 @@
+import asyncio
+
+EXPORT_USER_ID = 1_000_001  # Own user, the database being shared by the tests
+
+
+def test_export_is_imported_back_identically(bot, tmp_path):
+    imported_alerts, incorrect_line_numbers = bot.parse_imported_alerts("\n".join([
+        "BTC/USDT 100000.5",
+        "PEPE/USDT 0.00001234",
+        "ETH/USDT breakout 4h",
+        "SOL/USDT trail 2.5%",
+        "BTC/USDT +3% 15m",
+        "BTC/USDT -1.5% 1h",
+        "ETH/USDT 4% 30m",
+    ]))
+    assert not incorrect_line_numbers
+
+    alert_ids = bot.insert_alerts_into_database(EXPORT_USER_ID, imported_alerts)
+    try:
+        export_filename = str(tmp_path / "alerts.csv")
+        assert bot.write_user_alerts_export(EXPORT_USER_ID, export_filename) == len(imported_alerts)
+        with open(export_filename) as export_file:
+            exported_alerts, incorrect_line_numbers = bot.parse_imported_alerts(export_file.read())
+
+        assert not incorrect_line_numbers
+        assert sorted(exported_alerts, key=repr) == sorted(imported_alerts, key=repr)
+    finally:
+        bot.delete_alerts_from_database(alert_ids)
+
+
+def test_export_waits_for_the_pending_deletions(bot, tmp_path):
+    alert_ids = bot.insert_alerts_into_database(EXPORT_USER_ID, bot.parse_imported_alerts("BTC/USDT 1\nBTC/USDT 2")[0])
+
+    async def trigger_and_export() -> int:
+        bot.schedule_alerts_deletion(alert_ids[:1])  # As when the alert has just been triggered
+        await bot.wait_for_alerts_group_commit()
+        return await bot.run_in_database_thread(bot.write_user_alerts_export, EXPORT_USER_ID, str(tmp_path / "alerts.csv"))
+
+    try:
+        assert asyncio.run(trigger_and_export()) == 1
+    finally:
+        bot.delete_alerts_from_database(alert_ids)
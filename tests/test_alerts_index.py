@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+
+PAIR_NAME = "BTCUSDT"
+FAR_ALERT_ID = 0  # Never crossed, so that the pair keeps being followed while its other alerts come and go
+
+
+@pytest.mark.parametrize("random_seed", range(5))
+def test_sorted_index_against_brute_force(bot, random_seed):
+    random_generator = random.Random(random_seed)
+    bot.register_alert(FAR_ALERT_ID, 2, "BTC", "USDT", 1e9)
+
+    naive_alerts = {}  # Alert ID -> alert price
+    next_alert_id = 1
+    previous_price = None
+    current_price = 100.0
+
+    for _ in range(5_000):
+        for _ in range(random_generator.choice([0, 0, 1, 5])):  # Prices with one decimal, so that some alerts share their price or equal a tick
+            alert_price = round(current_price + random_generator.uniform(-5, 5), 1)
+            bot.register_alert(next_alert_id, random_generator.choice([1, 2]), "BTC", "USDT", alert_price)
+            naive_alerts[next_alert_id] = alert_price
+            next_alert_id += 1
+
+        if naive_alerts and random_generator.random() < 0.2:  # Removed alerts stay in the sorted prices as tombstones until the pair is compacted
+            removed_alert_id = random_generator.choice(list(naive_alerts))
+            bot.unregister_alert(removed_alert_id)
+            del naive_alerts[removed_alert_id]
+
+        current_price = round(current_price + random_generator.gauss(0, 0.5), 1)
+
+        expected_alert_ids = set()
+        if previous_price is not None:
+            expected_alert_ids = {alert_id for alert_id, alert_price in naive_alerts.items()
+                                  if previous_price >= alert_price >= current_price or previous_price <= alert_price <= current_price}
+        previous_price = current_price
+
+        triggered_alerts = bot.process_price_tick(PAIR_NAME, current_price) or []
+        assert {triggered_alert[0] for triggered_alert in triggered_alerts} == expected_alert_ids
+        assert all(triggered_alert[4] == naive_alerts[triggered_alert[0]] for triggered_alert in triggered_alerts)
+
+        for alert_id in expected_alert_ids:
+            del naive_alerts[alert_id]
+
+    assert set(bot.alerts_infos_by_id) == set(naive_alerts) | {FAR_ALERT_ID}
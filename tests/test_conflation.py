@@ -0,0 +1,57 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from conftest import reset_bot_state
+
+
+PAIRS_NAMES = ["AAAUSDT", "BBBUSDT", "CCCUSDT"]
+ALERTS_PER_PAIR = 300
+TICKS_NUMBER = 20_000
+
+
+@pytest.fixture
+def replayed_recording(bot, tmp_path):
+    # Random walks of several pairs, recorded as the bot records the Binance messages, and price alerts stored in the database
+    random_generator = random.Random(0)
+    prices = dict.fromkeys(PAIRS_NAMES, 100.0)
+
+    bot.database_cursor.executemany(bot.INSERT_ALERT_QUERY, [(pair_name[:-4], "USDT", round(random_generator.uniform(95, 105), 2), "", random_generator.choice([1, 2]),
+                                                              bot.PRICE_ALERT_TYPE, None, None) for pair_name in PAIRS_NAMES for _ in range(ALERTS_PER_PAIR)])
+    bot.database_connection.commit()
+
+    bot.FRAMES_RECORDING_FILENAME = str(tmp_path / "recording.bin")
+    received_at = 1_700_000_000.0
+    for update_id in range(TICKS_NUMBER):
+        pair_name = random_generator.choice(PAIRS_NAMES)
+        prices[pair_name] += random_generator.gauss(0, 0.05)
+        received_at += random_generator.expovariate(2_000)
+        bot.record_frame(json.dumps({"stream": f"{pair_name.lower()}@bookTicker", "data": {"u": update_id, "s": pair_name, "a": f"{prices[pair_name]:.4f}"}}), received_at)
+    bot.flush_frames_recording()
+    bot.disk_io_executor.submit(int).result()  # The recording is written by this single thread
+
+    yield bot.FRAMES_RECORDING_FILENAME
+
+    bot.database_cursor.execute(f"DELETE FROM {bot.DATABASE_NAME}")
+    bot.database_connection.commit()
+
+
+def replay_triggered_alerts(bot, recording_filename: str) -> dict:
+    reset_bot_state()
+    replayed_triggered_alerts = asyncio.run(bot.replay_frames_recording(recording_filename, False))
+    return {replayed_triggered_alert[1]: replayed_triggered_alert[0] for replayed_triggered_alert in replayed_triggered_alerts}  # Alert ID -> time
+
+
+@pytest.mark.parametrize("tick_conflation_seconds", [0, 0.01, 0.1, 1])
+def test_conflation_loses_no_crossing(bot, replayed_recording, monkeypatch, tick_conflation_seconds):
+    expected_triggering_times = replay_triggered_alerts(bot, replayed_recording)
+    assert expected_triggering_times
+
+    monkeypatch.setattr(bot, "IS_TICK_CONFLATION_ENABLED", True)
+    monkeypatch.setattr(bot, "TICK_CONFLATION_SECONDS", tick_conflation_seconds)
+    conflated_triggering_times = replay_triggered_alerts(bot, replayed_recording)
+
+    assert set(conflated_triggering_times) == set(expected_triggering_times)
+    assert all(conflated_triggering_times[alert_id] >= expected_triggering_time for alert_id, expected_triggering_time in expected_triggering_times.items())  # Only delayed
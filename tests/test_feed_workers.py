@@ -0,0 +1,72 @@
+import asyncio
+import queue
+
+
+def drain_queue(items_queue: queue.Queue) -> list:
+    queue_items = []
+    while not items_queue.empty():
+        queue_items.append(items_queue.get_nowait())
+    return queue_items
+
+
+def use_fake_feed_workers(bot, monkeypatch, workers_number: int) -> list:
+    commands_queues = [queue.Queue() for _ in range(workers_number)]
+    monkeypatch.setattr(bot, "feed_workers_commands_queues", commands_queues)
+    monkeypatch.setattr(bot, "feed_workers_pairs_numbers", [0] * workers_number)
+    monkeypatch.setattr(bot, "pairs_feed_worker_ids", {})
+    monkeypatch.setattr(bot, "feed_workers_last_known_prices", {})
+    return commands_queues
+
+
+def test_new_pairs_go_to_the_least_loaded_worker(bot, monkeypatch):
+    use_fake_feed_workers(bot, monkeypatch, 3)
+
+    for alert_id, base_currency in enumerate(["BTC", "ETH", "SOL", "BTC", "XRP"], start=1):
+        bot.register_alert(alert_id, 1, base_currency, "USDT", 1.0)
+
+    assert bot.pairs_feed_worker_ids == {"BTCUSDT": 0, "ETHUSDT": 1, "SOLUSDT": 2, "XRPUSDT": 0}
+    assert bot.feed_workers_pairs_numbers == [2, 1, 1]
+
+    bot.clean_pair_metadata_if_needed(*bot.unregister_alert(2)[1:3])  # Last alert of ETHUSDT
+    bot.register_alert(6, 1, "DOGE", "USDT", 1.0)
+
+    assert bot.pairs_feed_worker_ids["DOGEUSDT"] == 1
+
+
+def test_pairs_are_moved_when_the_workers_drift_apart(bot, monkeypatch):
+    commands_queues = use_fake_feed_workers(bot, monkeypatch, 2)
+    pairs_number = 2 * (bot.FEED_WORKERS_MAX_PAIRS_SPREAD + 2)
+    for alert_id in range(1, pairs_number + 1):
+        bot.register_alert(alert_id, 1, f"COIN{alert_id}", "USDT", 1.0)
+    bot.feed_workers_last_known_prices[0] = {f"COIN{alert_id}USDT": float(alert_id) for alert_id in range(1, pairs_number + 1, 2)}
+
+    for alert_id in range(2, pairs_number + 1, 2):  # Every pair of the worker 1 is removed
+        bot.clean_pair_metadata_if_needed(*bot.unregister_alert(alert_id)[1:3])
+    for commands_queue in commands_queues:
+        drain_queue(commands_queue)
+
+    bot.rebalance_feed_workers()
+
+    assert max(bot.feed_workers_pairs_numbers) - min(bot.feed_workers_pairs_numbers) <= bot.FEED_WORKERS_MAX_PAIRS_SPREAD
+    moved_pair_names = {pair_name for pair_name, pair_feed_worker_id in bot.pairs_feed_worker_ids.items() if pair_feed_worker_id == 1}
+    moved_alert_ids = {alert_id for alert_id, alert_infos in bot.alerts_infos_by_id.items() if f"{alert_infos[1]}{alert_infos[2]}" in moved_pair_names}
+    assert moved_pair_names
+
+    assert drain_queue(commands_queues[0]) == [(bot.UNREGISTER_ALERT_FEED_COMMAND, alert_id) for alert_id in sorted(moved_alert_ids)]
+    worker_commands = drain_queue(commands_queues[1])
+    assert {feed_command[1] for feed_command in worker_commands if feed_command[0] == bot.REGISTER_ALERT_FEED_COMMAND} == moved_alert_ids
+    assert {pair_name for feed_command in worker_commands if feed_command[0] == bot.SET_LAST_PRICES_FEED_COMMAND for pair_name in feed_command[1]} == moved_pair_names
+
+
+def test_worker_errors_are_sent_by_the_coordinator(bot, monkeypatch):
+    events_queue = queue.Queue()
+    monkeypatch.setattr(bot, "feed_worker_id", 1)
+    monkeypatch.setattr(bot, "feed_workers_events_queue", events_queue)
+
+    async def failing_send_telegram_request(*_, **__):
+        raise AssertionError("A feed worker called Telegram")
+
+    monkeypatch.setattr(bot, "send_telegram_request", failing_send_telegram_request)
+    asyncio.run(bot.send_inbox_message("Connection lost", level="ERROR"))
+
+    assert drain_queue(events_queue) == [(bot.INBOX_MESSAGE_FEED_EVENT, 1, "Connection lost", "ERROR", bot.LOG_CHANNEL_ID)]
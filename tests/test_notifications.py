@@ -0,0 +1,63 @@
+import asyncio
+import types
+
+
+def test_slow_chat_does_not_delay_other_chats(bot, monkeypatch):
+    sent_messages = []
+    slow_chat_released = asyncio.Event()
+
+    async def fake_send_inbox_message(message: str, level="INFO", chat_id: int = None):
+        if chat_id == -100:  # A group which reached its rate limit
+            await slow_chat_released.wait()
+        sent_messages.append((chat_id, message))
+
+    monkeypatch.setattr(bot, "send_inbox_message", fake_send_inbox_message)
+
+    async def notify():
+        for message_number in range(3):
+            bot.queue_chat_notification(-100, f"group {message_number}")
+        bot.queue_chat_notification(2, "private")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        assert sent_messages == [(2, "private")]
+        assert set(bot.chats_notification_tasks) == {-100}
+
+        slow_chat_released.set()
+        await bot.chats_notification_tasks[-100]
+
+    asyncio.run(notify())
+
+    assert sent_messages[1:] == [(-100, "group 0"), (-100, "group 1"), (-100, "group 2")]
+    assert not bot.chats_notification_messages and not bot.chats_notification_tasks
+
+
+class FakeUserMessage:
+    def __init__(self, text: str, user_id: int, chat_id: int):
+        self.text = text
+        self.from_user = types.SimpleNamespace(id=user_id)
+        self.chat = types.SimpleNamespace(id=chat_id)
+        self.answers = []
+
+    async def delete(self):
+        pass
+
+    async def answer(self, text: str, **_):
+        self.answers.append(text)
+        return self
+
+
+def test_target_is_only_saved_for_a_chat_of_the_user(bot, monkeypatch):
+    monkeypatch.setattr(bot, "MESSAGE_SECONDS_TIMEOUT", 0)
+    chats_members = {(-100, 2): "member", (-200, 2): "left"}
+
+    async def fake_get_chat_member(chat_id: int, user_id: int):
+        if (chat_id, user_id) not in chats_members:
+            raise bot.TelegramAPIError(method=None, message="Bad Request: chat not found")
+        return types.SimpleNamespace(status=chats_members[chat_id, user_id])
+
+    monkeypatch.setattr(bot.bot, "get_chat_member", fake_get_chat_member)
+
+    for target_chat_id in (-200, -300, -100):
+        asyncio.run(bot.command_target(FakeUserMessage(f"/target {target_chat_id}", 2, 2)))
+        assert bot.users_notification_chat_ids.get(2) == (-100 if target_chat_id == -100 else None)
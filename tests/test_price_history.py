@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+
+def test_full_price_history_grows_and_keeps_the_samples(bot, tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "PRICE_HISTORY_FILENAME", str(tmp_path / "price_history.bin"))
+    pairs_number = bot.PRICE_HISTORY_GROWTH_SLOTS * 2 + 3  # More new pairs at once than a single growth
+    for alert_id in range(1, pairs_number + 1):
+        bot.register_alert(alert_id, 1, f"COIN{alert_id}", "USDT", 1.0)
+        bot.last_known_prices[f"COIN{alert_id}USDT"] = float(alert_id)
+
+    async def record_and_reopen():
+        await bot.open_price_history()
+        await bot.record_price_history_samples(time.time())
+        bot.close_price_history()
+        await bot.open_price_history()  # As after a restart
+
+    asyncio.run(record_and_reopen())
+    try:
+        assert len(bot.price_history_slots_views) == pairs_number
+        for alert_id in range(1, pairs_number + 1):
+            assert bot.get_price_history_minutes(f"COIN{alert_id}USDT")[-1][-1] == float(alert_id)
+    finally:
+        bot.close_price_history()
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import time
+
+
+def write_snapshot(bot, tmp_path, monkeypatch, snapshot_bytes: bytes):
+    snapshot_filename = str(tmp_path / "prices_snapshot.bin")
+    with open(snapshot_filename, "wb") as snapshot_file:
+        snapshot_file.write(snapshot_bytes)
+    monkeypatch.setattr(bot, "PRICES_SNAPSHOT_FILENAME", snapshot_filename)
+
+
+def test_unchanged_price_of_a_recent_snapshot_is_loaded(bot, tmp_path, monkeypatch):
+    bot.register_alert(1, 1, "BTC", "USDT", 100_000.0)
+    bot.register_alert(2, 1, "ETH", "USDT", 5_000.0)
+
+    # BTCUSDT did not change for two days, but the snapshot was written just before the restart
+    bot.last_known_prices.update({"BTCUSDT": 99_000.0, "ETHUSDT": 4_000.0})
+    bot.prices_snapshot_entries["BTCUSDT"] = [99_000.0, time.time() - 2 * 86400]
+    snapshot_bytes = bot.get_prices_snapshot()
+
+    bot.last_known_prices.clear()
+    bot.prices_snapshot_entries.clear()
+    write_snapshot(bot, tmp_path, monkeypatch, snapshot_bytes)
+    asyncio.run(bot.load_prices_snapshot())
+
+    assert bot.last_known_prices == {"BTCUSDT": 99_000.0, "ETHUSDT": 4_000.0}
+
+
+def test_old_snapshot_is_ignored(bot, tmp_path, monkeypatch):
+    bot.register_alert(1, 1, "BTC", "USDT", 100_000.0)
+    bot.last_known_prices["BTCUSDT"] = 99_000.0
+    snapshot_bytes = bytearray(bot.get_prices_snapshot())
+    bot.PRICES_SNAPSHOT_HEADER.pack_into(snapshot_bytes, 0, time.time() - bot.PRICES_SNAPSHOT_MAX_AGE_SECONDS - 1, 1)
+
+    bot.last_known_prices.clear()
+    write_snapshot(bot, tmp_path, monkeypatch, bytes(snapshot_bytes))
+    asyncio.run(bot.load_prices_snapshot())
+
+    assert not bot.last_known_prices
+
+
+def test_corrupt_snapshot_is_ignored(bot, tmp_path, monkeypatch, caplog):
+    bot.register_alert(1, 1, "BTC", "USDT", 100_000.0)
+    bot.last_known_prices["BTCUSDT"] = 99_000.0
+    snapshot_bytes = bot.get_prices_snapshot()
+
+    for corrupt_snapshot_bytes in (snapshot_bytes[:-2], snapshot_bytes[:5], snapshot_bytes[:-7] + b"\xff" * 7):
+        bot.last_known_prices.clear()
+        write_snapshot(bot, tmp_path, monkeypatch, corrupt_snapshot_bytes)
+        with caplog.at_level(logging.WARNING):
+            asyncio.run(bot.load_prices_snapshot())
+
+        assert not bot.last_known_prices
+        assert "corrupt" in caplog.text
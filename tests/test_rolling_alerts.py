@@ -0,0 +1,149 @@
+import asyncio
+import math
+import random
+
+import pytest
+
+from conftest import reset_bot_state
+
+
+PAIR_NAME = "BTCUSDT"
+WINDOW_SECONDS = 60
+START_TIME = 1_000.0
+
+
+def register_rise_and_drop_alerts(bot, alert_percent: float):
+    bot.register_alert(1, 1, "BTC", "USDT", 0.0, bot.RISE_ALERT_TYPE, alert_percent, WINDOW_SECONDS)
+    bot.register_alert(2, 1, "BTC", "USDT", 0.0, bot.DROP_ALERT_TYPE, alert_percent, WINDOW_SECONDS)
+
+
+def process_conflated_window(bot, window_prices: list, tick_time: float) -> set:
+    for window_price in window_prices:
+        bot.conflate_price_tick(PAIR_NAME, window_price)
+
+    triggered_alerts = bot.process_conflated_price_ticks(bot.conflated_price_ticks, tick_time)
+    bot.conflated_price_ticks.clear()
+    return {triggered_alert[0] for triggered_alert in triggered_alerts}
+
+
+def test_conflated_window_low_after_high(bot):
+    # 100 -> 110 -> 95 -> 100: the price fell by 13.6% from 110, but never rose by 12% (95 was reached after 110)
+    register_rise_and_drop_alerts(bot, 12)
+    bot.process_price_tick(PAIR_NAME, 100.0, START_TIME)
+
+    assert process_conflated_window(bot, [110.0, 95.0, 100.0], START_TIME + 1) == {2}
+    assert set(bot.alerts_infos_by_id) == {1}
+
+
+def test_conflated_window_high_after_low(bot):
+    # 100 -> 90 -> 105 -> 100: the price rose by 16.7% from 90, but never fell by 12% (90 was reached before 105)
+    register_rise_and_drop_alerts(bot, 12)
+    bot.process_price_tick(PAIR_NAME, 100.0, START_TIME)
+
+    assert process_conflated_window(bot, [90.0, 105.0, 100.0], START_TIME + 1) == {1}
+    assert set(bot.alerts_infos_by_id) == {2}
+
+
+def get_naive_triggered_alert_ids(naive_alerts: dict, past_ticks: list, windows_start_times: dict, current_ask_price: float, tick_time: float) -> set:
+    # Rescans every past tick of the window of each alert, the buckets being of 1 second for windows of less than 1440 seconds
+    triggered_alert_ids = set()
+    for alert_id, (alert_type, alert_fraction, window_seconds) in naive_alerts.items():
+        if alert_type == "trail":
+            continue
+
+        if windows_start_times[window_seconds] is None:
+            windows_start_times[window_seconds] = tick_time
+        window_prices = [past_price for past_time, past_price in past_ticks if int(past_time) >= int(tick_time) - window_seconds]
+
+        if alert_type == "breakout":
+            if window_prices and tick_time - windows_start_times[window_seconds] >= window_seconds:
+                if current_ask_price > max(window_prices) or current_ask_price < min(window_prices):
+                    triggered_alert_ids.add(alert_id)
+            continue
+
+        window_prices.append(current_ask_price)
+        has_risen = current_ask_price >= min(window_prices) * (1 + alert_fraction)
+        has_dropped = current_ask_price <= max(window_prices) * (1 - alert_fraction)
+        if (alert_type in ("move", "rise") and has_risen) or (alert_type in ("move", "drop") and has_dropped):
+            triggered_alert_ids.add(alert_id)
+
+    return triggered_alert_ids
+
+
+@pytest.mark.parametrize("random_seed", range(5))
+def test_rolling_alerts_against_naive_rescan(bot, random_seed):
+    random_generator = random.Random(random_seed)
+    naive_alerts = {}  # Alert ID -> [alert type, alert fraction, window seconds]
+    trailing_stops_anchors = {}  # Alert ID -> highest price since the alert was added
+    windows_start_times = dict.fromkeys((5, 20, 60))
+    past_ticks = []
+
+    def add_alert(alert_id: int, alert_type: str):
+        window_seconds = None if alert_type == "trail" else random_generator.choice(list(windows_start_times))
+        alert_percent = None if alert_type == "breakout" else round(random_generator.uniform(0.1, 4), 2)
+        bot.register_alert(alert_id, random_generator.choice([1, 2]), "BTC", "USDT", 0.0, alert_type, alert_percent, window_seconds)
+        naive_alerts[alert_id] = [alert_type, (alert_percent or 0) / 100, window_seconds]
+        if alert_type == "trail":
+            trailing_stops_anchors[alert_id] = bot.last_known_prices.get(PAIR_NAME, 0.0)
+
+    for alert_id in range(200):
+        add_alert(alert_id, random_generator.choice(["move", "rise", "drop", "breakout", "trail"]))
+
+    current_ask_price = 100.0
+    tick_time = START_TIME
+    next_alert_id = len(naive_alerts)
+    for _ in range(2_000):
+        tick_time += random_generator.choice([0.1, 0.3, 0.7, 1.5])
+        current_ask_price *= math.exp(random_generator.gauss(0, 0.003))
+
+        if random_generator.random() < 0.05:  # Trailing stops are also added while the price moves, each one with its own anchor
+            add_alert(next_alert_id, "trail")
+            next_alert_id += 1
+        if random_generator.random() < 0.02 and naive_alerts:
+            removed_alert_id = random_generator.choice(list(naive_alerts))
+            bot.unregister_alert(removed_alert_id)
+            del naive_alerts[removed_alert_id]
+
+        expected_alert_ids = get_naive_triggered_alert_ids(naive_alerts, past_ticks, windows_start_times, current_ask_price, tick_time)
+        for alert_id, anchor_price in trailing_stops_anchors.items():
+            trailing_stops_anchors[alert_id] = max(anchor_price, current_ask_price)
+            if alert_id in naive_alerts and current_ask_price <= trailing_stops_anchors[alert_id] * (1 - naive_alerts[alert_id][1]):
+                expected_alert_ids.add(alert_id)
+        past_ticks.append((tick_time, current_ask_price))
+
+        triggered_alerts = bot.process_price_tick(PAIR_NAME, current_ask_price, tick_time) or []
+        assert {triggered_alert[0] for triggered_alert in triggered_alerts} == expected_alert_ids
+
+        for alert_id in expected_alert_ids:
+            del naive_alerts[alert_id]
+        if not naive_alerts:
+            break
+
+
+def test_trailing_stop_anchor_survives_a_restart(bot):
+    anchors_user_id = 1_000_002  # Own user, the database being shared by the tests
+    alert_ids = bot.insert_alerts_into_database(anchors_user_id, [("BTC", "USDT", bot.TRAILING_STOP_ALERT_TYPE, 0.0, 10.0, None),
+                                                                  ("BTC", "USDT", bot.TRAILING_STOP_ALERT_TYPE, 0.0, 10.0, None)])
+    try:
+        bot.register_alert(alert_ids[0], anchors_user_id, "BTC", "USDT", 0.0, bot.TRAILING_STOP_ALERT_TYPE, 10.0, None)
+        for tick_index, tick_price in enumerate([100.0, 120.0, 110.0]):  # The first alert now trails 120
+            bot.process_price_tick(PAIR_NAME, tick_price, START_TIME + tick_index)
+        bot.register_alert(alert_ids[1], anchors_user_id, "BTC", "USDT", 0.0, bot.TRAILING_STOP_ALERT_TYPE, 10.0, None)  # Trails 110
+        bot.process_price_tick(PAIR_NAME, 115.0, START_TIME + 3)  # And now 115
+
+        # Saved by the group commit, then loaded again as after a restart
+        async def save_anchors():
+            bot.schedule_trailing_stops_anchors_saving(bot.pop_raised_trailing_stops_anchors())
+            await bot.wait_for_alerts_group_commit()
+
+        asyncio.run(save_anchors())
+        restored_alerts = [alert_row for alert_row in bot.open_all_alerts_cursor().fetchall() if alert_row[0] in alert_ids]
+        reset_bot_state()
+        for alert_id, *alert_infos in restored_alerts:
+            bot.register_alert(alert_id, *alert_infos)
+
+        assert bot.pairs_rolling_alerts[PAIR_NAME][bot.PAIR_TRAILING_STOP_GROUPS_INDEX] == [[120.0, [(0.1, alert_ids[0])]], [115.0, [(0.1, alert_ids[1])]]]
+        triggered_alerts = bot.process_price_tick(PAIR_NAME, 105.0, START_TIME + 10)  # 12.5% below 120, 8.7% below 115
+        assert [triggered_alert[0] for triggered_alert in triggered_alerts] == [alert_ids[0]]
+    finally:
+        bot.delete_alerts_from_database(alert_ids)
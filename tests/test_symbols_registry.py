@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+
+EXCHANGE_INFO = {"symbols": [
+    {"symbol": "BTCUSDT", "status": "TRADING", "baseAsset": "BTC", "quoteAsset": "USDT", "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.01000000"}]},
+    {"symbol": "ETHUSDT", "status": "TRADING", "baseAsset": "ETH", "quoteAsset": "USDT", "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.01000000"}]},
+    {"symbol": "LUNAUSDT", "status": "BREAK", "baseAsset": "LUNA", "quoteAsset": "USDT", "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.00010000"}]},
+]}
+
+
+@pytest.fixture
+def exchange_info_file(bot, tmp_path, monkeypatch):
+    # Local stand-in of the Binance endpoint, and a cache of the registry that does not exist yet
+    exchange_info_filename = tmp_path / "exchangeInfo.json"
+    exchange_info_filename.write_text(json.dumps(EXCHANGE_INFO))
+    monkeypatch.setattr(bot, "BINANCE_EXCHANGE_INFO_URL", str(exchange_info_filename))
+    monkeypatch.setattr(bot, "SYMBOLS_REGISTRY_FILENAME", str(tmp_path / "symbols_registry.json"))
+    return exchange_info_filename
+
+
+def test_format_pair_price_keeps_tick_decimals(bot):
+    bot.symbols_registry.update(bot.parse_exchange_info(b'{"symbols": [{"symbol": "BTCUSDT", "status": "TRADING", "baseAsset": "BTC", "quoteAsset": "USDT", '
+                                                        b'"filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.01000000"}]}]}'))
+
+    assert bot.format_pair_price("BTCUSDT", 100000.12) == "100000.12"
+    assert bot.format_pair_price("BTCUSDT", 100000.123) == "100000.12"
+    assert bot.format_pair_price("BTCUSDT", 100000) == "100000.00"
+    assert bot.format_pair_price("ETHBTC", 100000.12) == bot.format_alert_price(100000.12)  # Not in the registry
+
+
+def test_symbols_not_trading_are_dropped(bot):
+    assert set(bot.parse_exchange_info(json.dumps(EXCHANGE_INFO).encode())) == {"BTCUSDT", "ETHUSDT"}
+
+
+def test_alerts_on_unlisted_pairs_are_rejected(bot):
+    bot.symbols_registry.update(bot.parse_exchange_info(json.dumps(EXCHANGE_INFO).encode()))
+
+    assert bot.parse_alert_args(["BTC/USDT", "100000"])[:2] == ("BTC", "USDT")
+    with pytest.raises(bot.UnlistedPairError):
+        bot.parse_alert_args(["LUNA/USDT", "1"])  # Listed, but not trading
+    with pytest.raises(bot.UnlistedPairError):
+        bot.parse_alert_args(["FAKE/USDT", "1"])
+
+
+def test_exchange_info_is_read_from_a_local_file(bot, exchange_info_file):
+    assert asyncio.run(bot.download_exchange_info()) == exchange_info_file.read_bytes()
+
+
+def test_unlisted_pairs_are_reported_when_the_registry_is_loaded(bot, exchange_info_file, monkeypatch):
+    sent_messages = []
+
+    async def fake_send_inbox_message(message: str, level="INFO", chat_id: int = None):
+        sent_messages.append((level, message))
+
+    monkeypatch.setattr(bot, "send_inbox_message", fake_send_inbox_message)
+    bot.register_alert(1, 1, "BTC", "USDT", 100_000.0)
+    bot.register_alert(2, 1, "LUNA", "USDT", 1.0)  # Added before the registry existed
+
+    asyncio.run(bot.load_symbols_registry())
+    bot.disk_io_executor.submit(int).result()  # The cache is written by the disk I/O thread
+
+    assert sent_messages == [("ERROR", "These pairs are not listed on Binance, so they are not followed: LUNAUSDT")]
@@ -0,0 +1,38 @@
+import asyncio
+
+
+class FakeMessage:
+    def __init__(self, text: str):
+        self.text = text
+        self.answers = []
+
+    async def delete(self):
+        pass
+
+    async def answer(self, text: str, **_):
+        self.answers.append(text)
+        return self
+
+
+def test_listed_pair_cannot_be_synthetic(bot, monkeypatch):
+    monkeypatch.setattr(bot, "MESSAGE_SECONDS_TIMEOUT", 0)
+    bot.symbols_registry.update(bot.parse_exchange_info(b'{"symbols": [{"symbol": "SOLETH", "status": "TRADING", "baseAsset": "SOL", "quoteAsset": "ETH", "filters": []}, '
+                                                        b'{"symbol": "SOLUSDT", "status": "TRADING", "baseAsset": "SOL", "quoteAsset": "USDT", "filters": []}, '
+                                                        b'{"symbol": "ETHUSDT", "status": "TRADING", "baseAsset": "ETH", "quoteAsset": "USDT", "filters": []}]}'))
+
+    user_message = FakeMessage("/synthetic SOL/ETH SOLUSDT/ETHUSDT")
+    asyncio.run(bot.command_synthetic(user_message))
+
+    assert "listed on Binance" in user_message.answers[0]
+    assert not bot.synthetic_pairs
+
+
+def test_dropped_leg_only_pair_forgets_its_update_id(bot):
+    bot.set_synthetic_pairs([("SOL", "ETH", "SOLUSDT/ETHUSDT")])
+    bot.register_alert(1, 1, "SOL", "ETH", 0.05)
+    bot.register_alert(2, 1, "ETH", "USDT", 5_000.0)
+    bot.pairs_last_update_ids.update({"SOLUSDT": 10, "ETHUSDT": 11, "SOLETH": 12})
+
+    bot.set_synthetic_pairs([])  # SOLUSDT was only followed as a leg, ETHUSDT still has an alert
+
+    assert bot.pairs_last_update_ids == {"ETHUSDT": 11, "SOLETH": 12}
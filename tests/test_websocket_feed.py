@@ -0,0 +1,295 @@
+import asyncio
+import json
+import time
+
+import websockets
+
+
+MAX_STREAMS_PER_CONNECTION = 3
+MAX_STREAMS_PER_CONTROL_MESSAGE = 2
+
+
+class FakeBinanceConnection:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.control_messages = []
+        self.subscribed_streams = set()
+        self.is_closed = False
+
+
+async def start_fake_binance(fake_binance_connections: dict):
+    # In-process stand-in for the combined streams endpoint: it answers the control messages and keeps the streams of each connection, by client address
+    async def handle_connection(websocket):
+        fake_binance_connection = fake_binance_connections[websocket.remote_address] = FakeBinanceConnection(websocket)
+        try:
+            async for control_message in websocket:
+                control_message = json.loads(control_message)
+                fake_binance_connection.control_messages.append(control_message)
+                if control_message["method"] == "SUBSCRIBE":
+                    fake_binance_connection.subscribed_streams.update(control_message["params"])
+                else:
+                    fake_binance_connection.subscribed_streams.difference_update(control_message["params"])
+                await websocket.send(json.dumps({"result": None, "id": control_message["id"]}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            fake_binance_connection.is_closed = True
+
+    fake_binance_server = await websockets.serve(handle_connection, "127.0.0.1", 0)
+    return fake_binance_server, f"ws://127.0.0.1:{fake_binance_server.sockets[0].getsockname()[1]}"
+
+
+def use_fake_binance_urls(bot, monkeypatch, fake_binance_urls: list) -> list:
+    monkeypatch.setattr(bot, "BINANCE_STREAMS_WEBSOCKET_URLS", fake_binance_urls)
+    monkeypatch.setattr(bot, "CONTROL_MESSAGES_SECONDS_DELAY", 0)
+    monkeypatch.setattr(bot, "IS_TICK_CONFLATION_ENABLED", False)
+    for state_name in ("websocket_shards_streams", "websocket_shards_subscribed_streams", "websocket_shards_connections", "websocket_shards_tasks"):
+        monkeypatch.setattr(bot, state_name, {})
+    monkeypatch.setattr(bot, "next_websocket_shard_id", 0)
+
+    inbox_messages = []
+
+    async def fake_send_inbox_message(message: str, level="INFO", chat_id: int = None):
+        inbox_messages.append((level, message))
+
+    monkeypatch.setattr(bot, "send_inbox_message", fake_send_inbox_message)
+    return inbox_messages
+
+
+async def stop_websocket_tasks(bot, *other_tasks):
+    websocket_tasks = [*bot.websocket_shards_tasks.values(), *other_tasks]
+    for websocket_task in websocket_tasks:
+        websocket_task.cancel()
+    await asyncio.gather(*websocket_tasks, return_exceptions=True)
+
+
+async def wait_until(condition, seconds_timeout: float = 5):
+    deadline = time.monotonic() + seconds_timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        await asyncio.sleep(0.01)
+
+
+def get_stream_name(base_currency: str) -> str:
+    return f"{base_currency.lower()}usdt@bookTicker"
+
+
+def check_control_messages(control_messages: list) -> set:
+    # Replays the control messages of a connection: each one is a diff (never a stream subscribed twice, nor one unsubscribed which was not subscribed)
+    subscribed_streams = set()
+    for control_message in control_messages:
+        assert 0 < len(control_message["params"]) <= MAX_STREAMS_PER_CONTROL_MESSAGE
+        if control_message["method"] == "SUBSCRIBE":
+            assert subscribed_streams.isdisjoint(control_message["params"])
+            subscribed_streams.update(control_message["params"])
+        else:
+            assert subscribed_streams.issuperset(control_message["params"])
+            subscribed_streams.difference_update(control_message["params"])
+        assert len(subscribed_streams) <= MAX_STREAMS_PER_CONNECTION
+
+    return subscribed_streams
+
+
+def test_subscriptions_follow_the_alerts_within_the_streams_limits(bot, monkeypatch):
+    monkeypatch.setattr(bot, "MAX_STREAMS_PER_WEBSOCKET_CONNECTION", MAX_STREAMS_PER_CONNECTION)
+    monkeypatch.setattr(bot, "MAX_STREAMS_PER_CONTROL_MESSAGE", MAX_STREAMS_PER_CONTROL_MESSAGE)
+    fake_binance_connections = {}
+    alert_ids = {}
+
+    def add_alerts(*base_currencies):
+        for base_currency in base_currencies:
+            alert_ids[base_currency] = len(alert_ids) + 1
+            bot.register_alert(alert_ids[base_currency], 1, base_currency, "USDT", 1.0)
+
+    def remove_alerts(*base_currencies):
+        for base_currency in base_currencies:
+            bot.clean_pair_metadata_if_needed(*bot.unregister_alert(alert_ids[base_currency])[1:3])
+
+    def get_shards_connections() -> dict:
+        # Shard ID -> connection seen by the fake Binance
+        return {shard_id: fake_binance_connections.get(websocket.local_address) for (shard_id, _), websocket in bot.websocket_shards_connections.items()}
+
+    def is_synchronized(streams_number: int) -> bool:
+        shards_connections = get_shards_connections()
+        return sum(map(len, bot.websocket_shards_streams.values())) == streams_number and set(shards_connections) == set(bot.websocket_shards_streams) and \
+            all(shards_connections[shard_id] is not None and shards_connections[shard_id].subscribed_streams == shard_streams
+                for shard_id, shard_streams in bot.websocket_shards_streams.items())
+
+    def get_new_control_messages(shard_id: int, sent_messages_number: int) -> list:
+        return [(control_message["method"], control_message["params"]) for control_message in get_shards_connections()[shard_id].control_messages[sent_messages_number:]]
+
+    async def add_and_remove_pairs():
+        fake_binance_server, fake_binance_url = await start_fake_binance(fake_binance_connections)
+        inbox_messages = use_fake_binance_urls(bot, monkeypatch, [fake_binance_url])
+        subscriptions_manager_task = asyncio.create_task(bot.websocket_subscriptions_manager())
+
+        try:
+            add_alerts("BTC", "ETH", "SOL", "BNB", "XRP")
+            await wait_until(lambda: is_synchronized(5))
+
+            assert sorted(len(shard_streams) for shard_streams in bot.websocket_shards_streams.values()) == [2, 3]
+            full_shard_id, other_shard_id = sorted(bot.websocket_shards_streams, key=lambda shard_id: -len(bot.websocket_shards_streams[shard_id]))
+            assert set().union(*bot.websocket_shards_streams.values()) == {get_stream_name(base_currency) for base_currency in alert_ids}
+            for shard_id, shard_connection in get_shards_connections().items():
+                assert check_control_messages(shard_connection.control_messages) == bot.websocket_shards_streams[shard_id]
+
+            # Only the streams of the removed pairs are unsubscribed, on their own connections
+            shards_sent_messages_numbers = {shard_id: len(shard_connection.control_messages) for shard_id, shard_connection in get_shards_connections().items()}
+            removed_streams = {shard_id: sorted(bot.websocket_shards_streams[shard_id])[0] for shard_id in (full_shard_id, other_shard_id)}
+            remove_alerts(*(removed_stream.split("usdt")[0].upper() for removed_stream in removed_streams.values()))
+            await wait_until(lambda: is_synchronized(3))
+
+            for shard_id, removed_stream in removed_streams.items():
+                assert get_new_control_messages(shard_id, shards_sent_messages_numbers[shard_id]) == [("UNSUBSCRIBE", [removed_stream])]
+
+            # The new pairs fill the free room of the existing connections before any connection is opened
+            add_alerts("ADA", "DOGE")
+            await wait_until(lambda: is_synchronized(5))
+            assert set(bot.websocket_shards_streams) == {full_shard_id, other_shard_id}
+            for shard_id, shard_connection in get_shards_connections().items():
+                assert check_control_messages(shard_connection.control_messages) == bot.websocket_shards_streams[shard_id]
+
+            add_alerts("PEPE", "TRX")
+            await wait_until(lambda: is_synchronized(7))
+            assert sorted(len(shard_streams) for shard_streams in bot.websocket_shards_streams.values()) == [1, 3, 3]
+
+            # A shard whose pairs all lost their alerts closes its connection, without touching the others
+            other_shard_connection = get_shards_connections()[other_shard_id]
+            full_shard_sent_messages_number = len(get_shards_connections()[full_shard_id].control_messages)
+            remove_alerts(*(stream.split("usdt")[0].upper() for stream in bot.websocket_shards_streams[other_shard_id]))
+            await wait_until(lambda: other_shard_connection.is_closed)
+
+            assert other_shard_id not in bot.websocket_shards_streams
+            assert get_new_control_messages(full_shard_id, full_shard_sent_messages_number) == []
+            assert sum(not fake_binance_connection.is_closed for fake_binance_connection in fake_binance_connections.values()) == 2
+            assert inbox_messages == []
+
+        finally:
+            await stop_websocket_tasks(bot, subscriptions_manager_task)
+            fake_binance_server.close()
+            await fake_binance_server.wait_closed()
+
+    asyncio.run(add_and_remove_pairs())
+
+
+async def send_tick(fake_binance_connection: FakeBinanceConnection, pair_name: str, update_id: int):
+    # Compact bookTicker message, as sent by Binance, whose ask price is its update ID
+    await fake_binance_connection.websocket.send(json.dumps({
+        "stream": f"{pair_name.lower()}@bookTicker",
+        "data": {"u": update_id, "s": pair_name, "b": f"{update_id - 1}.0", "B": "1.0", "a": f"{update_id}.0", "A": "1.0"}
+    }, separators=(",", ":")))
+
+
+def record_processed_ticks(bot, monkeypatch) -> list:
+    processed_ticks = []
+
+    def fake_process_price_tick(pair_name: str, current_ask_price: float, tick_time: float = None):
+        processed_ticks.append((pair_name, int(current_ask_price)))
+
+    monkeypatch.setattr(bot, "process_price_tick", fake_process_price_tick)
+    return processed_ticks
+
+
+async def send_ticks_in_order(fake_binance_ticks: list, processed_ticks: list):
+    # A new tick is awaited before the next message is sent. A duplicate is not, but it reached the bot after the tick it repeats, whatever its connection.
+    for fake_binance_connection, pair_name, update_id, is_new_tick in fake_binance_ticks:
+        await send_tick(fake_binance_connection, pair_name, update_id)
+        if is_new_tick:
+            await wait_until(lambda: (pair_name, update_id) in processed_ticks)
+
+
+def test_redundant_legs_process_each_tick_once(bot, monkeypatch):
+    fake_binance_connections = [{}, {}]
+    processed_ticks = record_processed_ticks(bot, monkeypatch)
+
+    async def send_on_both_legs():
+        fake_binance_servers_and_urls = [await start_fake_binance(leg_fake_binance_connections) for leg_fake_binance_connections in fake_binance_connections]
+        inbox_messages = use_fake_binance_urls(bot, monkeypatch, [fake_binance_url for _, fake_binance_url in fake_binance_servers_and_urls])
+        subscriptions_manager_task = asyncio.create_task(bot.websocket_subscriptions_manager())
+
+        try:
+            bot.register_alert(1, 1, "BTC", "USDT", 1.0)
+            bot.register_alert(2, 1, "ETH", "USDT", 1.0)
+            await wait_until(lambda: all(len(leg_fake_binance_connections) == 1 and len(next(iter(leg_fake_binance_connections.values())).subscribed_streams) == 2
+                                         for leg_fake_binance_connections in fake_binance_connections))
+            main_leg, standby_leg = (next(iter(leg_fake_binance_connections.values())) for leg_fake_binance_connections in fake_binance_connections)
+
+            await send_ticks_in_order([
+                (main_leg, "BTCUSDT", 1, True), (main_leg, "BTCUSDT", 2, True), (standby_leg, "BTCUSDT", 1, False), (standby_leg, "BTCUSDT", 2, False),
+                (standby_leg, "BTCUSDT", 3, True),  # The standby leg catches up then gets ahead
+                (main_leg, "BTCUSDT", 3, False), (main_leg, "BTCUSDT", 4, True),
+                (standby_leg, "ETHUSDT", 2, True),  # The update IDs of each pair are compared separately
+                (standby_leg, "BTCUSDT", 5, True),  # Missed by the main leg
+                (main_leg, "ETHUSDT", 2, False), (main_leg, "ETHUSDT", 1, False), (main_leg, "BTCUSDT", 4, False),  # Late, and older than the last tick
+                (main_leg, "BTCUSDT", 6, True), (standby_leg, "BTCUSDT", 6, False), (standby_leg, "ETHUSDT", 3, True), (main_leg, "ETHUSDT", 3, False),
+                (main_leg, "BTCUSDT", 7, True), (standby_leg, "BTCUSDT", 7, False), (standby_leg, "BTCUSDT", 8, True),  # The last duplicates are read before this tick
+            ], processed_ticks)
+            await send_tick(main_leg, "ETHUSDT", 4)
+            await wait_until(lambda: ("ETHUSDT", 4) in processed_ticks)
+
+            assert [update_id for pair_name, update_id in processed_ticks if pair_name == "BTCUSDT"] == [1, 2, 3, 4, 5, 6, 7, 8]
+            assert [update_id for pair_name, update_id in processed_ticks if pair_name == "ETHUSDT"] == [2, 3, 4]
+            assert inbox_messages == []
+
+        finally:
+            await stop_websocket_tasks(bot, subscriptions_manager_task)
+            for fake_binance_server, _ in fake_binance_servers_and_urls:
+                fake_binance_server.close()
+                await fake_binance_server.wait_closed()
+
+    asyncio.run(send_on_both_legs())
+
+
+def test_connection_dropped_during_handover_loses_no_tick(bot, monkeypatch):
+    monkeypatch.setattr(bot, "PLANNED_RECONNECTION_SECONDS", 0.5)
+    monkeypatch.setattr(bot, "HANDOVER_OVERLAP_SECONDS", 60)  # Until the replaced connection drops
+    monkeypatch.setattr(bot, "HANDOVER_MAX_SECONDS", 60)
+    fake_binance_connections = {}
+    processed_ticks = record_processed_ticks(bot, monkeypatch)
+    original_hand_over_websocket_connection = bot.hand_over_websocket_connection
+
+    async def hand_over_websocket_connection_once(*arguments):
+        monkeypatch.setattr(bot, "PLANNED_RECONNECTION_SECONDS", 3600)  # The successor is not replaced in turn
+        await original_hand_over_websocket_connection(*arguments)
+
+    monkeypatch.setattr(bot, "hand_over_websocket_connection", hand_over_websocket_connection_once)
+
+    async def drop_during_handover():
+        fake_binance_server, fake_binance_url = await start_fake_binance(fake_binance_connections)
+        inbox_messages = use_fake_binance_urls(bot, monkeypatch, [fake_binance_url])
+        subscriptions_manager_task = asyncio.create_task(bot.websocket_subscriptions_manager())
+
+        try:
+            bot.register_alert(1, 1, "BTC", "USDT", 1.0)
+            await wait_until(lambda: fake_binance_connections and next(iter(fake_binance_connections.values())).subscribed_streams)
+            replaced_connection = next(iter(fake_binance_connections.values()))
+            await send_ticks_in_order([(replaced_connection, "BTCUSDT", 1, True), (replaced_connection, "BTCUSDT", 2, True)], processed_ticks)
+
+            await wait_until(lambda: len(fake_binance_connections) == 2 and list(fake_binance_connections.values())[1].subscribed_streams)
+            successor_connection = list(fake_binance_connections.values())[1]
+            await asyncio.sleep(3 * bot.HANDOVER_POLL_SECONDS)  # The handover has seen its successor subscribed, and started the overlap
+            assert not replaced_connection.is_closed  # Both connections are read during the overlap
+
+            await send_ticks_in_order([
+                (successor_connection, "BTCUSDT", 2, False), (successor_connection, "BTCUSDT", 3, True),
+                (replaced_connection, "BTCUSDT", 3, False), (replaced_connection, "BTCUSDT", 4, True),
+                (successor_connection, "BTCUSDT", 4, False), (successor_connection, "BTCUSDT", 5, True),
+                (replaced_connection, "BTCUSDT", 6, True),  # Received only by the replaced connection, just before it drops
+            ], processed_ticks)
+            assert not replaced_connection.is_closed
+
+            replaced_connection.websocket.transport.abort()  # No closing handshake, as when the network fails
+            await wait_until(lambda: replaced_connection.is_closed)
+            await send_ticks_in_order([(successor_connection, "BTCUSDT", 6, False), (successor_connection, "BTCUSDT", 7, True)], processed_ticks)
+
+            assert [update_id for _, update_id in processed_ticks] == [1, 2, 3, 4, 5, 6, 7]
+            assert len(fake_binance_connections) == 2  # The drop of the replaced connection did not start a reconnection
+            assert bot.websocket_shards_connections[(0, 0)].local_address == successor_connection.websocket.remote_address
+            assert inbox_messages == []
+
+        finally:
+            await stop_websocket_tasks(bot, subscriptions_manager_task)
+            fake_binance_server.close()
+            await fake_binance_server.wait_closed()
+
+    asyncio.run(drop_during_handover())